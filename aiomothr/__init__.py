@@ -2,5 +2,18 @@
 # Use of this source code is governed by a BSD-style
 # license that can be found in the LICENSE file.
 
-from .client import AsyncMothrClient
+from .client import AsyncMothrClient, default_client
+from .executor import MothrExecutor
+from .instrumentation import Event, MetricsCollector
+from .journal import JobJournal
+from .messages import JobMessage, MessageStream
+from .mirror import JobStateMirror
+from .pipeline import Pipeline, PipelineStep, UpstreamFailedError
+from .poller import BatchStatusPoller
+from .pool import AsyncJobPool
+from .polling import BackoffPolling, PollingStrategy
 from .request import AsyncJobRequest
+from .resilience import CircuitBreaker, CircuitOpenError, RetryBudget, RetryPolicy
+from .results import ResultStore, SQLiteResultBackend
+from .subscriptions import SubscriptionManager
+from .template import JobTemplate, TemplateJobRequest
@@ -0,0 +1,49 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+import base64
+import json
+import re
+from typing import Optional
+
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+
+
+# Messages of errors returned when the access token is missing, invalid or expired
+AUTH_ERROR = re.compile(
+    r"\b401\b|unauthori[sz]ed|unauthenticated|(token|signature) (is )?expired"
+    r"|invalid token|access denied",
+    re.IGNORECASE,
+)
+
+
+def token_expiry(token: Optional[str]) -> Optional[float]:
+    """Get the expiration time of a JSON web token
+
+    The signature is not verified, the claims are only read to know when the
+    token needs to be refreshed.
+
+    Args:
+        token (str): Access token
+
+    Returns:
+        float: Time the token expires, in seconds since the epoch, or None if the
+            token does not include an expiration time
+    """
+    if token is None:
+        return None
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def is_auth_error(error: Exception) -> bool:
+    """Check if a request failed because it was not authenticated"""
+    if not isinstance(error, (TransportQueryError, TransportServerError)):
+        return False
+    return AUTH_ERROR.search(str(error)) is not None
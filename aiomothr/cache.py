@@ -0,0 +1,108 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+from __future__ import annotations
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """In-memory cache with expiring entries and least recently used eviction
+
+    Concurrent requests for a key that is not cached share a single fetch.
+
+    Args:
+        ttl (float, optional): Time, in seconds, entries are kept, default 60
+        maxsize (int, optional): Maximum number of entries, default 1024
+        clock (callable, optional): Function returning the current time in
+            seconds, default ``time.monotonic``
+    """
+
+    def __init__(
+        self,
+        ttl: float = 60.0,
+        maxsize: int = 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self._entries: OrderedDict = OrderedDict()
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._lookup(key) is not None
+
+    def _lookup(self, key: Hashable) -> Optional[Tuple[float, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= self.clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: Hashable, value: Any):
+        """Add a value to the cache"""
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Get a value from the cache, fetching it if it is missing or expired
+
+        Args:
+            key (hashable): Cache key
+            fetch (callable): Coroutine function returning the value to cache
+
+        Returns:
+            The cached value
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry[1]
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._fill(key, fetch))
+            self._pending[key] = pending
+        # Shielded so a cancelled caller does not cancel the fetch for others
+        return await asyncio.shield(pending)
+
+    async def _fill(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        # Registered by get before the fill starts running
+        pending = self._pending[key]
+        try:
+            value = await fetch()
+            # Fetches started before the entry was invalidated are not cached
+            if self._pending.get(key) is pending:
+                self.set(key, value)
+            return value
+        finally:
+            if self._pending.get(key) is pending:
+                del self._pending[key]
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Remove an entry from the cache
+
+        Fetches in progress for the entry still return their value to the callers
+        waiting on them but the value is not cached, later calls to ``get`` fetch
+        the entry again.
+
+        Args:
+            key (hashable, optional): Entry to remove, if not given all entries
+                are removed
+        """
+        if key is None:
+            self._entries.clear()
+            self._pending.clear()
+        else:
+            self._entries.pop(key, None)
+            self._pending.pop(key, None)
@@ -4,20 +4,55 @@
 
 from __future__ import annotations
 import asyncio
+import logging
 import os
-from typing import Dict, List, Optional, Tuple
+import time
+from types import SimpleNamespace
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 from urllib.parse import urlsplit, urlunsplit
 
+import aiohttp
 from gql import Client
+from gql.client import AsyncClientSession
 from gql.dsl import DSLField, DSLSchema, DSLType
-from gql.transport.aiohttp import AIOHTTPTransport
-from gql.transport.websockets import WebsocketsTransport
-
-
-with open(
-    os.path.join(os.path.realpath(os.path.dirname(__file__)), "schema.graphql")
-) as f:
-    schema = f.read()
+from gql.dsl import query as dsl_query
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+from graphql import (
+    DocumentNode,
+    GraphQLSchema,
+    OperationType,
+    get_operation_ast,
+)
+from .auth import is_auth_error, token_expiry
+from .cache import TTLCache
+from .documents import QueryCache, cancel_mutation, query_text, submit_mutation
+from .instrumentation import Instrumentation
+from .journal import JobJournal
+from .jsonstream import iter_list_field
+from .messages import MessageStream
+from .mirror import JobStateMirror
+from .poller import BatchStatusPoller
+from .resilience import CircuitBreaker, RetryBudget, RetryPolicy
+from .results import ResultStore, SQLiteResultBackend, is_final
+from .schema import dsl_schema, load_schema
+from .subscriptions import SubscriptionManager
+from .transport import QueryTextTransport
+
+if TYPE_CHECKING:
+    from .request import AsyncJobRequest
+
+log = logging.getLogger(__name__)
 
 
 USERNAME_VAR = "MOTHR_USERNAME"
@@ -26,7 +61,7 @@ URL_VAR = "MOTHR_ENDPOINT"
 TOKEN_VAR = "MOTHR_ACCESS_TOKEN"
 
 
-class AsyncMothrClient:
+class AsyncMothrClient:  # pylint: disable=too-many-public-methods
     """Asynchronous client for connecting to MOTHR
 
     Args:
@@ -35,12 +70,88 @@ class AsyncMothrClient:
             defaults to ``http://localhost:8080/query``
         token (str, optional): Access token to use for authentication, the library
             also looks for ``MOTHR_ACCESS_TOKEN`` in the environment as a fallback
+        refresh (str, optional): Refresh token used to renew ``token`` when it
+            expires
         username (str, optional): Username for logging in, if not given the library
             will attempt to use ``MOTHR_USERNAME`` environment variable. If neither
             are found the request will be made without authentication.
         password (str, optional): Password for logging in, if not given the library
             will attempt to use the ``MOTHR_PASSWORD`` environment variable. If
             neither are found the request will be made without authentication.
+        pool_size (int, optional): Maximum number of simultaneous connections kept
+            in the HTTP connection pool, default 100. Use 0 for no limit.
+        pool_size_per_host (int, optional): Maximum number of simultaneous
+            connections to a single host, default 0 (no limit)
+        keepalive_timeout (float, optional): Time, in seconds, idle connections are
+            kept alive in the pool, default 15
+        subscription_retries (int, optional): Number of times a subscription is
+            sent again after the websocket connection is dropped, default 3
+        batch_interval (float, optional): Time, in seconds, between status
+            queries sent by the batch poller, default 0.25
+        batch_size (int, optional): Maximum number of jobs included in a single
+            batch status query, default 100
+        query_cache_size (int, optional): Maximum number of compiled query
+            documents kept by the client, default 256
+        service_cache_ttl (float, optional): Time, in seconds, results of
+            ``service`` and ``services`` are cached. By default results are not
+            cached.
+        service_cache_size (int, optional): Maximum number of cached ``service``
+            and ``services`` results, default 1024
+        token_refresh_margin (float, optional): Time, in seconds, before the
+            access token expires that it is renewed in the background, default 60
+        retry_policy (RetryPolicy, optional): Timeouts and retries applied to
+            requests, default ``RetryPolicy()``
+        operation_policies (dict<str, RetryPolicy>, optional): Policies
+            replacing ``retry_policy`` for specific operations, by the name of
+            the operation, e.g., ``{"submitJob": RetryPolicy(timeout=5)}``
+        retry_budget (RetryBudget, optional): Budget limiting the number of
+            retries, default ``RetryBudget()``. None for no limit.
+        circuit_breaker (CircuitBreaker, optional): Circuit breaker failing
+            requests fast while MOTHR is unavailable, default
+            ``CircuitBreaker()``. None to always send requests.
+        hooks (list<callable>, optional): Instrumentation hooks called with each
+            ``Event`` emitted by the client, see ``self.instrumentation``
+        mirror_jobs (bool, optional): Keep the statuses of jobs up to date from
+            the ``subscribeJobs`` events in ``self.mirror``. Statuses are then
+            checked locally and jobs are waited on through the mirror. Default
+            False
+        mirror_reconcile_interval (float, optional): Time, in seconds, between
+            queries correcting the statuses kept by the mirror, default 30
+        result_cache_size (int, optional): Maximum number of records of
+            finished jobs kept in memory by ``self.results``. By default records
+            are not cached.
+        result_cache_bytes (int, optional): Maximum total size, in bytes of
+            JSON, of the records kept in memory. By default only
+            ``result_cache_size`` applies.
+        result_store_path (str, optional): Path of an SQLite database where the
+            records of finished jobs are also stored, so they are served locally
+            after a restart
+        journal_path (str, optional): Path of a JSON lines journal where the
+            jobs submitted through the client are recorded, so they can be
+            resumed after a restart with ``AsyncJobRequest.resume``
+        journal_fsync (bool, optional): Force journal lines to disk when they
+            are written, so submitted jobs are kept if the machine crashes.
+            Default False
+
+    When the client has a refresh token, or logged in with a username and
+    password, the access token is renewed before it expires. Requests failing
+    because the token is no longer valid are sent again once after the token is
+    renewed, and concurrent requests share a single renewal.
+
+    When a username and password are given, the client logs in when it
+    connects, either on first use or through ``create``, ``connect()`` or
+    ``async with``.
+
+    The client holds a single HTTP session, and its connection pool, that is
+    shared by every request made through the client. The session is opened on
+    first use, or explicitly with ``connect()`` or ``async with``, and should be
+    released with ``close()`` when the client is no longer needed. Likewise, all
+    subscriptions share a single websocket connection managed by
+    ``self.subscriptions``, and jobs waiting with ``run_job(batch=True)`` share
+    the status queries sent by ``self.poller``::
+
+        async with AsyncMothrClient() as client:
+            services = await client.services()
     """
 
     def __init__(self, **kwargs):
@@ -51,33 +162,364 @@ class AsyncMothrClient:
         split_url = urlsplit(url)
         ws_url = urlunsplit(split_url._replace(scheme=schemes[split_url.scheme]))
 
-        self.transport = AIOHTTPTransport(url=url, headers=self.headers)
-        self.ws_transport = WebsocketsTransport(url=ws_url)
-        self.schema = schema
-        self.ds = DSLSchema(Client(schema=self.schema))
+        self.pool_size = kwargs.pop("pool_size", 100)
+        self.pool_size_per_host = kwargs.pop("pool_size_per_host", 0)
+        self.keepalive_timeout = kwargs.pop("keepalive_timeout", 15.0)
+        self.instrumentation = Instrumentation(kwargs.pop("hooks", None))
+        self.transport = QueryTextTransport(url=url, headers=self.headers)
+        self._session: Optional[AsyncClientSession] = None
+        self._session_lock: Optional[asyncio.Lock] = None
+        self.subscriptions = SubscriptionManager(
+            ws_url,
+            headers=self.headers,
+            max_retries=kwargs.pop("subscription_retries", 3),
+            instrumentation=self.instrumentation,
+        )
+        self.poller = BatchStatusPoller(
+            self,
+            interval=kwargs.pop("batch_interval", 0.25),
+            chunk_size=kwargs.pop("batch_size", 100),
+        )
+        self.documents = QueryCache(maxsize=kwargs.pop("query_cache_size", 256))
+        self.mirror: Optional[JobStateMirror] = None
+        mirror_reconcile_interval = kwargs.pop("mirror_reconcile_interval", 30.0)
+        if kwargs.pop("mirror_jobs", False):
+            self.mirror = JobStateMirror(
+                self,
+                interval=self.poller.interval,
+                reconcile_interval=mirror_reconcile_interval,
+                chunk_size=self.poller.chunk_size,
+            )
+        self.results, self.journal = _job_stores(kwargs)
+        self._field_map: Optional[Dict[str, Dict[str, DSLType]]] = None
+        service_cache_ttl = kwargs.pop("service_cache_ttl", None)
+        service_cache_size = kwargs.pop("service_cache_size", 1024)
+        self.retry_policy: RetryPolicy = kwargs.pop("retry_policy", RetryPolicy())
+        self.operation_policies: Dict[str, RetryPolicy] = kwargs.pop(
+            "operation_policies", {}
+        )
+        self.retry_budget: Optional[RetryBudget] = kwargs.pop(
+            "retry_budget", RetryBudget()
+        )
+        self.circuit_breaker: Optional[CircuitBreaker] = kwargs.pop(
+            "circuit_breaker", CircuitBreaker()
+        )
+        self.service_cache: Optional[TTLCache] = None
+        if service_cache_ttl is not None:
+            self.service_cache = TTLCache(
+                ttl=service_cache_ttl, maxsize=service_cache_size
+            )
 
+        self.token_refresh_margin = kwargs.pop("token_refresh_margin", 60.0)
+        self.token_expires_at: Optional[float] = None
+        self._renewal: Optional[asyncio.Future] = None
+        self._renewal_timer: Optional[asyncio.Future] = None
+        self.refresh: Optional[str] = kwargs.pop("refresh", None)
         self.token = kwargs.pop("token", os.getenv(TOKEN_VAR))
         username = kwargs.pop("username", os.getenv(USERNAME_VAR))
         password = kwargs.pop("password", os.getenv(PASSWORD_VAR))
+        self._credentials: Optional[Tuple[str, str]] = None
+        if all((username, password)):
+            self._credentials = (username, password)
         if self.token is not None:
-            self.headers = {"Authorization": f"Bearer {self.token}"}
-        elif all((username, password)):
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(self.login(username, password))
-
-        # Mapping for nested fields
-        self.field_map = {
-            "Job": {
-                "outputMetadata": self.ds.Metadata,
-                "parameters": self.ds.Parameter,
-                "user": self.ds.User,
-                "worker": self.ds.Worker,
-            },
-            "Service": {
-                "parameters": self.ds.ServiceParameter,
-                "fileType": self.ds.FileType,
-            },
-        }
+            self._set_token(self.token)
+
+    @classmethod
+    async def create(cls, **kwargs) -> AsyncMothrClient:
+        """Create a client and connect it, logging in if credentials are given
+
+        Example::
+
+            client = await AsyncMothrClient.create(username="user", password="pass")
+
+        Args:
+            kwargs: Arguments passed to ``AsyncMothrClient``
+
+        Returns:
+            AsyncMothrClient: The connected client
+        """
+        client = cls(**kwargs)
+        await client.connect()
+        return client
+
+    @property
+    def schema(self) -> GraphQLSchema:
+        """The MOTHR schema, built once and shared by all clients"""
+        return load_schema()
+
+    @property
+    def ds(self) -> DSLSchema:
+        """DSL for the MOTHR schema, shared by all clients"""
+        return dsl_schema()
+
+    @property
+    def field_map(self) -> Dict[str, Dict[str, DSLType]]:
+        """Mapping for nested fields"""
+        if self._field_map is None:
+            self._field_map = {
+                "Job": {
+                    "outputMetadata": self.ds.Metadata,
+                    "parameters": self.ds.Parameter,
+                    "user": self.ds.User,
+                    "worker": self.ds.Worker,
+                },
+                "Service": {
+                    "parameters": self.ds.ServiceParameter,
+                    "fileType": self.ds.FileType,
+                },
+            }
+        return self._field_map
+
+    async def __aenter__(self) -> AsyncMothrClient:
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def connect(self) -> AsyncClientSession:
+        """Open the pooled HTTP session shared by all requests made by the client
+
+        Calling ``connect`` on a client that is already connected returns the
+        existing session. If the client has a username and password but no
+        access token, it logs in before the session is used.
+
+        Returns:
+            `gql.client.AsyncClientSession`: The session used to execute requests
+        """
+        if self._session_lock is None:
+            self._session_lock = asyncio.Lock()
+        async with self._session_lock:
+            if self._session is None:
+                self.transport.client_session_args = {
+                    "connector": aiohttp.TCPConnector(
+                        limit=self.pool_size,
+                        limit_per_host=self.pool_size_per_host,
+                        keepalive_timeout=self.keepalive_timeout,
+                    )
+                }
+                if self.instrumentation.hooks:
+                    self.transport.client_session_args["trace_configs"] = [
+                        self.instrumentation.trace_config()
+                    ]
+                await self.transport.connect()
+                # Documents are validated once when they are compiled by
+                # self.documents, the session does not validate them again.
+                # Requests are timed out by the retry policies, not by gql.
+                session = AsyncClientSession(
+                    client=Client(transport=self.transport, execute_timeout=None)
+                )
+                if self.token is None and self._credentials is not None:
+                    try:
+                        await self._login(*self._credentials, session=session)
+                    except Exception:
+                        await self.transport.close()
+                        raise
+                # Only published once logged in, so no request is sent without
+                # the token
+                self._session = session
+                self._schedule_renewal()
+        return self._session
+
+    async def close(self):
+        """Close the HTTP session and the subscription websocket, releasing all
+        pooled connections"""
+        if self._renewal_timer is not None:
+            self._renewal_timer.cancel()
+            self._renewal_timer = None
+        await self.poller.close()
+        if self.mirror is not None:
+            await self.mirror.close()
+        await self.subscriptions.close()
+        if self.results is not None:
+            self.results.close()
+        if self.journal is not None:
+            self.journal.close()
+        if self._session is not None:
+            self._session = None
+            await self.transport.close()
+
+    async def get_session(self) -> AsyncClientSession:
+        """Get the shared HTTP session, connecting if necessary"""
+        if self._session is not None:
+            return self._session
+        return await self.connect()
+
+    async def execute(
+        self, document: DocumentNode, variable_values: Optional[Dict[str, Any]] = None
+    ) -> Dict:
+        """Execute a GraphQL document using the shared session
+
+        If the request is rejected because the access token expired, the token
+        is renewed and the request is sent one more time.
+
+        Args:
+            document (`graphql.DocumentNode`): Document to execute
+            variable_values (dict, optional): Variables used by the document
+
+        Returns:
+            dict: The response data
+        """
+        token = self.token
+        try:
+            return await self._execute(document, variable_values)
+        except (TransportQueryError, TransportServerError) as e:
+            if not self.can_renew_token or not is_auth_error(e):
+                raise
+        # Another request may have renewed the token in the meantime
+        if self.token == token:
+            await self.renew_token()
+        return await self._execute(document, variable_values)
+
+    async def _execute(
+        self,
+        document: DocumentNode,
+        variable_values: Optional[Dict[str, Any]] = None,
+        session: Optional[AsyncClientSession] = None,
+    ) -> Dict:
+        policy = self.retry_policy
+        idempotent = False
+        name = None
+        operation = get_operation_ast(document)
+        if operation is not None:
+            idempotent = operation.operation == OperationType.QUERY
+            name = operation.selection_set.selections[0].name.value  # type: ignore
+            policy = self.operation_policies.get(name, policy)
+
+        attempts = 0
+        kwargs: Dict[str, Any] = {"variable_values": variable_values}
+        payload = SimpleNamespace(size=0)
+        if self.instrumentation.hooks:
+            # Body sizes are counted by the trace config of instrumented sessions
+            kwargs["extra_args"] = {"trace_request_ctx": payload}
+
+        async def send() -> Dict:
+            nonlocal session, attempts
+            attempts += 1
+            if session is None:
+                session = await self.get_session()
+            return await session.execute(document, **kwargs)
+
+        with self.instrumentation.span("request", operation=name) as span:
+            try:
+                return await policy.run(
+                    send,
+                    idempotent,
+                    breaker=self.circuit_breaker,
+                    budget=self.retry_budget,
+                )
+            finally:
+                span.set(retries=max(attempts - 1, 0), size=payload.size or None)
+
+    async def execute_operation(
+        self,
+        root: str,
+        operation: str,
+        fields: List[str],
+        variable_values: Optional[Dict[str, Any]] = None,
+    ) -> Dict:
+        """Execute an operation using a compiled document from ``self.documents``
+
+        Args:
+            root (str): Root type of the operation, ``Query`` or ``Mutation``
+            operation (str): Name of the operation, e.g., ``job``
+            fields (list<str>): Fields to return in the response, nested fields
+                are specified using dot notation
+            variable_values (dict, optional): Arguments of the operation
+
+        Returns:
+            dict: The response data
+        """
+        document = self.documents.get(root, operation, tuple(fields))
+        return await self.execute(document, variable_values=variable_values)
+
+    async def query(self, *fields: DSLField) -> Dict:
+        """Execute a query built from DSL fields, see ``execute``
+
+        Args:
+            fields (`gql.dsl.DSLField`): Query fields to execute
+
+        Returns:
+            dict: The query response
+        """
+        return await self.execute(dsl_query(*fields))
+
+    async def mutate(self, *fields: DSLField) -> Dict:
+        """Execute a mutation built from DSL fields, see ``execute``
+
+        Args:
+            fields (`gql.dsl.DSLField`): Mutation fields to execute
+
+        Returns:
+            dict: The mutation response
+        """
+        return await self.execute(dsl_query(*fields, operation="mutation"))
+
+    def _set_token(self, token: str):
+        """Update the access token sent with each request"""
+        self.token = token
+        self.token_expires_at = token_expiry(token)
+        # Updated in place, the dict is shared with the transports
+        self.headers["Authorization"] = f"Bearer {token}"
+        # The HTTP session copies the headers when it is opened
+        if self.transport.session is not None:
+            self.transport.session.headers.update(self.headers)
+        if self._session is not None:
+            self._schedule_renewal()
+
+    @property
+    def can_renew_token(self) -> bool:
+        """Whether the client has a refresh token or credentials to renew the
+        access token with"""
+        return self.refresh is not None or self._credentials is not None
+
+    async def renew_token(self) -> str:
+        """Renew the access token using the refresh token, logging in again if
+        the refresh token is rejected
+
+        Concurrent calls share a single renewal.
+
+        Returns:
+            str: New access token
+        """
+        if self._renewal is None or self._renewal.done():
+            self._renewal = asyncio.ensure_future(self._renew())
+        # Shielded so a cancelled caller does not cancel the renewal for others
+        return await asyncio.shield(self._renewal)
+
+    async def _renew(self) -> str:
+        if self.refresh is not None:
+            try:
+                return await self.refresh_token()
+            except (ValueError, TransportQueryError):
+                if self._credentials is None:
+                    raise
+                log.info("Token refresh failed, logging in again")
+        if self._credentials is None:
+            raise ValueError("No refresh token or credentials to renew the token")
+        token, _ = await self.login(*self._credentials)
+        return token
+
+    def _schedule_renewal(self):
+        """Renew the access token in the background before it expires"""
+        if self._renewal_timer is not None:
+            self._renewal_timer.cancel()
+            self._renewal_timer = None
+        if self.token_expires_at is None or not self.can_renew_token:
+            return
+        remaining = self.token_expires_at - time.time()
+        # Tokens valid for less than the margin are renewed halfway through
+        delay = max(remaining - self.token_refresh_margin, remaining / 2, 1.0)
+        self._renewal_timer = asyncio.ensure_future(self._renew_after(delay))
+
+    async def _renew_after(self, delay: float):
+        await asyncio.sleep(delay)
+        # The timer is replaced when the renewal sets the new token
+        self._renewal_timer = None
+        try:
+            await self.renew_token()
+        except Exception as e:  # pylint: disable=broad-except
+            log.warning("Background token renewal failed: %s", e)
 
     async def login(
         self, username: Optional[str] = None, password: Optional[str] = None
@@ -105,20 +547,22 @@ class AsyncMothrClient:
             raise ValueError("Username not provided")
         if password is None:
             raise ValueError("Password not provided")
+        return await self._login(username, password)
 
+    async def _login(
+        self, username: str, password: str, session: Optional[AsyncClientSession] = None
+    ) -> Tuple[str, Optional[str]]:
         credentials = {"username": username, "password": password}
-        q = self.ds.Mutation.login.args(**credentials).select(
-            self.ds.LoginResponse.token, self.ds.LoginResponse.refresh
-        )
-        async with Client(transport=self.transport, schema=schema) as sess:
-            ds = DSLSchema(sess)
-            resp = await ds.mutate(q)
+        # Sent without retrying on auth errors, which would renew the token
+        document = self.documents.get("Mutation", "login", ("token", "refresh"))
+        with self.instrumentation.span("login"):
+            resp = await self._execute(document, credentials, session)
         tokens = resp["login"]
         if tokens is None:
             raise ValueError("Login failed")
-        self.token = tokens["token"]
         self.refresh = tokens["refresh"]
-        self.headers["Authorization"] = f"Bearer {self.token}"
+        self._credentials = (username, password)
+        self._set_token(tokens["token"])
         return self.token, self.refresh
 
     async def refresh_token(self) -> str:
@@ -127,15 +571,12 @@ class AsyncMothrClient:
         Returns:
             str: New access token
         """
-        q = self.ds.Mutation.refresh.args(token=self.refresh)
-        async with Client(transport=self.transport, schema=schema) as sess:
-            ds = DSLSchema(sess)
-            resp = await ds.mutate(q)
+        document = self.documents.get("Mutation", "refresh", ("token",))
+        resp = await self._execute(document, {"token": self.refresh})
         if resp["refresh"] is None:
             raise ValueError("Token refresh failed")
         token = resp["refresh"]["token"]
-        self.token = token
-        self.headers["Authorization"] = f"Bearer {self.token}"
+        self._set_token(token)
         return token
 
     async def service(
@@ -155,15 +596,13 @@ class AsyncMothrClient:
                 default is `name` and `version`
 
         Returns:
-            list<dict>: Service records matching the query
+            list<dict>: Service records matching the query. If the client caches
+                service queries the records are shared and should not be modified.
         """
         fields = fields if fields is not None else ["name", "version"]
-        fields = [self.resolve_field(self.ds.Service, field) for field in fields]
-        q = self.ds.Query.service.args(name=name, version=version).select(*fields)
-        async with Client(transport=self.transport, schema=schema) as sess:
-            ds = DSLSchema(sess)
-            resp = await ds.query(q)
-        return resp["service"]
+        key = ("service", name, version, tuple(fields))
+        variables = {"name": name, "version": version}
+        return await self._cached_operation(key, "service", fields, variables)
 
     async def services(self, fields: Optional[List[str]] = None) -> List[Dict]:
         """Retrieve all services registered with MOTHR
@@ -173,15 +612,297 @@ class AsyncMothrClient:
                 default is `name` and `version`
 
         Returns:
-            list<dict>: All services registered with MOTHR
+            list<dict>: All services registered with MOTHR. If the client caches
+                service queries the records are shared and should not be modified.
         """
         fields = fields if fields is not None else ["name", "version"]
-        fields = [self.resolve_field(self.ds.Service, field) for field in fields]
-        q = self.ds.Query.services.select(*fields)
-        async with Client(transport=self.transport, schema=schema) as sess:
-            ds = DSLSchema(sess)
-            resp = await ds.query(q)
-        return resp["services"]
+        key = ("services", tuple(fields))
+        return await self._cached_operation(key, "services", fields)
+
+    async def _cached_operation(
+        self,
+        key: Tuple,
+        operation: str,
+        fields: List[str],
+        variable_values: Optional[Dict[str, Any]] = None,
+    ) -> Any:
+        async def fetch():
+            resp = await self.execute_operation(
+                "Query", operation, fields, variable_values
+            )
+            return resp[operation]
+
+        if self.service_cache is None:
+            return await fetch()
+        return await self.service_cache.get(key, fetch)
+
+    async def jobs(
+        self,
+        status: Optional[str] = None,
+        service: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ) -> AsyncIterator[Dict]:
+        """Iterate over jobs known to MOTHR
+
+        The response is parsed as it is received and each job is yielded as soon
+        as it has arrived, so listing a large number of jobs does not hold the
+        whole response in memory. Reading from the connection is paused while
+        the caller is not consuming jobs.
+
+        Example::
+
+            async for job in client.jobs(status="failed", fields=["job_id", "error"]):
+                print(job["jobId"], job["error"])
+
+        Args:
+            status (str, optional): Only return jobs with this status
+            service (str, optional): Only return jobs of this service
+            fields (list<str>, optional): Fields to return for each job, nested
+                fields are specified using dot notation. Default is `jobId`,
+                `service` and `status`
+
+        The request goes through the client's retry policy, circuit breaker and
+        instrumentation like other requests. It is only retried, or sent again
+        with a renewed access token, until the response starts being read, and
+        the retry policy's timeout applies to receiving the response headers.
+
+        Returns:
+            AsyncIterator<dict>: Job records
+
+        Raises:
+            TransportServerError: If the request fails
+            TransportQueryError: If MOTHR returns errors, raised after all jobs
+                in the response have been yielded
+            CircuitOpenError: If the circuit breaker is open
+            asyncio.TimeoutError: If the response headers were not received in
+                time
+        """
+        fields = fields if fields is not None else ["job_id", "service", "status"]
+        document = self.documents.get("Query", "jobs", tuple(fields))
+        variable_values = {"status": status, "service": service}
+        token = self.token
+        for renewed in (False, True):
+            stream = self._stream(document, variable_values, "jobs")
+            received = False
+            try:
+                async for job in stream:
+                    received = True
+                    yield job
+                return
+            except (TransportQueryError, TransportServerError) as e:
+                if renewed or received or not self.can_renew_token:
+                    raise
+                if not is_auth_error(e):
+                    raise
+            finally:
+                # Releases the response when the caller stops early
+                await stream.aclose()
+            # Another request may have renewed the token in the meantime
+            if self.token == token:
+                await self.renew_token()
+
+    async def _stream(
+        self, document: DocumentNode, variable_values: Dict[str, Any], field: str
+    ) -> AsyncGenerator[Any, None]:
+        """Send a query, iterating over the items of a list field of the response
+        as they are received"""
+        payload = {"query": query_text(document), "variables": variable_values}
+        attempts = 0
+        # The request body is counted by the trace config of instrumented sessions
+        counter = SimpleNamespace(size=0)
+
+        async def send() -> aiohttp.ClientResponse:
+            nonlocal attempts
+            attempts += 1
+            await self.get_session()
+            resp = await self.transport.session.post(  # type: ignore
+                self.transport.url,
+                json=payload,
+                ssl=self.transport.ssl,
+                trace_request_ctx=counter,
+            )
+            if resp.status >= 400:
+                resp.release()
+                raise TransportServerError(f"{resp.status}, message='{resp.reason}'")
+            return resp
+
+        async def chunks() -> AsyncIterator[bytes]:
+            async for chunk in resp.content.iter_any():
+                counter.size += len(chunk)
+                yield chunk
+
+        policy = self.operation_policies.get(field, self.retry_policy)
+        # The event is emitted once the response has been read
+        with self.instrumentation.span("request", operation=field) as span:
+            try:
+                resp = await policy.run(
+                    send, breaker=self.circuit_breaker, budget=self.retry_budget
+                )
+            finally:
+                span.set(retries=max(attempts - 1, 0))
+            try:
+                async for item in iter_list_field(chunks(), field):
+                    yield item
+            finally:
+                resp.release()
+                span.set(size=counter.size)
+
+    def messages(
+        self, job_ids: Optional[Iterable[str]] = None, **kwargs
+    ) -> MessageStream:
+        """Stream the messages published by many jobs through a bounded buffer
+
+        Example::
+
+            async with client.messages(job_ids, overflow="coalesce") as stream:
+                async for batch in stream.batches(interval=1):
+                    for job_id, message in batch:
+                        print(job_id, message)
+
+        Args:
+            job_ids (iterable<str>, optional): Jobs to follow
+            kwargs: Arguments of ``MessageStream``, e.g., ``maxsize`` and
+                ``overflow``
+
+        Returns:
+            MessageStream: The stream of messages
+        """
+        return MessageStream(self.subscriptions, job_ids, **kwargs)
+
+    async def watch_service_events(self, event: str):
+        """Clear cached service queries each time a message is published to
+        ``event``, runs until cancelled
+
+        Example::
+
+            watcher = asyncio.ensure_future(client.watch_service_events("services"))
+
+        Args:
+            event (str): Channel notified when services are updated
+        """
+        async for _ in self.subscriptions.events(event):
+            if self.service_cache is not None:
+                self.service_cache.invalidate()
+
+    async def submit_many(
+        self, requests: List[AsyncJobRequest], chunk_size: int = 100
+    ) -> List[Union[str, Exception]]:
+        """Submit many job requests using batched mutations
+
+        Requests are split into chunks of ``chunk_size``, each chunk is submitted
+        with a single aliased ``submitJob`` mutation and chunks are sent
+        concurrently. The ``job_id`` and ``status`` of each request are set as
+        it is submitted.
+
+        Args:
+            requests (list<AsyncJobRequest>): Job requests to submit
+            chunk_size (int, optional): Maximum number of requests submitted in a
+                single mutation, default 100
+
+        Returns:
+            list<str|Exception>: The job ID of each request, in the same order as
+                the requests, or the exception raised if the request failed
+        """
+        chunks = [
+            requests[i : i + chunk_size] for i in range(0, len(requests), chunk_size)
+        ]
+        results = await asyncio.gather(*[self._submit_chunk(c) for c in chunks])
+        return [job_id for chunk in results for job_id in chunk]
+
+    async def _submit_chunk(
+        self, requests: List[AsyncJobRequest]
+    ) -> List[Union[str, Exception]]:
+        variables = {f"r{i}": r.job_request() for i, r in enumerate(requests)}
+        errors: Dict[str, str] = {}
+        default_error = "no job returned"
+        try:
+            resp = await self.execute(
+                submit_mutation(len(requests)), variable_values=variables
+            )
+        except TransportQueryError as e:
+            # Requests that succeeded are still returned alongside the errors
+            resp = e.data or {}
+            default_error = str(e)
+            for error in e.errors or []:
+                path = error.get("path") or [None]
+                errors[path[0]] = error.get("message", default_error)
+        except Exception as e:
+            return [e] * len(requests)
+
+        results: List[Union[str, Exception]] = []
+        for alias, request in zip(variables, requests):
+            submitted = resp.get(alias)
+            if submitted is None or submitted.get("job") is None:
+                message = errors.get(alias, default_error)
+                results.append(ValueError(f"Error submitting job request: {message}"))
+                continue
+            request.job_id = submitted["job"]["jobId"]
+            request.status = submitted["job"]["status"]
+            if self.mirror is not None:
+                self.mirror.track(request.job_id, request.status)
+            if self.journal is not None:
+                self.journal.submitted(request.job_id, request.status, request.req_args)
+            results.append(request.job_id)
+        if self.journal is not None:
+            # Submitted jobs are journaled before they are returned
+            await self.journal.written()
+        return results
+
+    async def cancel_many(
+        self, job_ids: List[str], chunk_size: int = 100
+    ) -> List[Union[Dict[str, str], Exception]]:
+        """Cancel many jobs using batched mutations
+
+        Job IDs are split into chunks of ``chunk_size``, each chunk is cancelled
+        with a single aliased ``cancelJob`` mutation and chunks are sent
+        concurrently.
+
+        Args:
+            job_ids (list<str>): Jobs to cancel
+            chunk_size (int, optional): Maximum number of jobs cancelled in a
+                single mutation, default 100
+
+        Returns:
+            list<dict|Exception>: The ``jobId`` and ``status`` of each job after
+                the cancellation, in the same order as the job IDs, or the
+                exception raised if the job could not be cancelled
+        """
+        chunks = [
+            job_ids[i : i + chunk_size] for i in range(0, len(job_ids), chunk_size)
+        ]
+        results = await asyncio.gather(*[self._cancel_chunk(c) for c in chunks])
+        return [job for chunk in results for job in chunk]
+
+    async def _cancel_chunk(
+        self, job_ids: List[str]
+    ) -> List[Union[Dict[str, str], Exception]]:
+        variables = {f"c{i}": job_id for i, job_id in enumerate(job_ids)}
+        errors: Dict[str, str] = {}
+        default_error = "job not found"
+        try:
+            resp = await self.execute(
+                cancel_mutation(len(job_ids)), variable_values=variables
+            )
+        except TransportQueryError as e:
+            resp = e.data or {}
+            default_error = str(e)
+            for error in e.errors or []:
+                path = error.get("path") or [None]
+                errors[path[0]] = error.get("message", default_error)
+        except Exception as e:
+            return [e] * len(job_ids)
+
+        results: List[Union[Dict[str, str], Exception]] = []
+        for alias, job_id in variables.items():
+            job = resp.get(alias)
+            if job is None:
+                message = errors.get(alias, default_error)
+                results.append(ValueError(f"Error cancelling job {job_id}: {message}"))
+                continue
+            if self.journal is not None and is_final(job["status"]):
+                self.journal.finished(job_id, job["status"])
+            results.append(job)
+        return results
 
     def resolve_field(self, obj: DSLType, field: str) -> DSLField:
         """Resolve paths to nested fields
@@ -214,10 +935,7 @@ class AsyncMothrClient:
 
         Returns: `gql.dsl.DSLField`
         """
-        field_key = str(field_obj)
-        for char in ["{", "}", "\n"]:
-            field_key = field_key.replace(char, "")
-        field_key = field_key.split(" ")[-1]
+        field_key = field_obj.ast_field.name.value
         field_name = field.pop(0)
         if len(field) > 0:
             return field_obj.select(
@@ -226,3 +944,50 @@ class AsyncMothrClient:
                 )
             )
         return field_obj.select(getattr(field_map[field_key], field_name))
+
+
+def _job_stores(
+    kwargs: Dict[str, Any]
+) -> Tuple[Optional[ResultStore], Optional[JobJournal]]:
+    """Create the result store and journal configured by the client options"""
+    results = None
+    result_cache_size = kwargs.pop("result_cache_size", 0)
+    result_cache_bytes = kwargs.pop("result_cache_bytes", None)
+    result_store_path = kwargs.pop("result_store_path", None)
+    if result_cache_size or result_store_path is not None:
+        results = ResultStore(
+            maxsize=result_cache_size,
+            max_bytes=result_cache_bytes,
+            backend=SQLiteResultBackend(result_store_path)
+            if result_store_path is not None
+            else None,
+        )
+    journal = None
+    journal_path = kwargs.pop("journal_path", None)
+    journal_fsync = kwargs.pop("journal_fsync", False)
+    if journal_path is not None:
+        journal = JobJournal(journal_path, fsync=journal_fsync)
+    return results, journal
+
+
+# Clients shared by job requests created without a client, by event loop
+_default_clients: Dict[asyncio.AbstractEventLoop, AsyncMothrClient] = {}
+
+
+def default_client() -> AsyncMothrClient:
+    """Get the client shared by job requests created without a client
+
+    The client is created on first use, configured from the environment. One
+    client is kept for each event loop, since its connections can only be used
+    in the loop they were opened in.
+
+    Returns:
+        AsyncMothrClient: The shared client
+    """
+    loop = asyncio.get_event_loop()
+    client = _default_clients.get(loop)
+    if client is None:
+        for closed in [l for l in _default_clients if l.is_closed()]:
+            del _default_clients[closed]
+        client = _default_clients[loop] = AsyncMothrClient()
+    return client
@@ -0,0 +1,180 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+
+from gql import gql
+from gql.utils import to_camel_case
+from graphql import DocumentNode, GraphQLSchema, print_ast, validate
+from .schema import load_schema
+
+# Fields of the job result, including the statistics reported by MOTHR
+JOB_RESULT_FIELDS = (
+    "jobId service status result error waitTime runTime maxMemory cpuUsage"
+)
+
+
+def parse_query(source: str) -> DocumentNode:
+    """Parse a document, keeping its source as the query text sent to MOTHR
+
+    Documents are reused for many requests, keeping the text they were parsed
+    from saves printing them again for each request, see ``query_text``.
+    """
+    document = gql(source)
+    document.query_text = source  # type: ignore
+    return document
+
+
+def query_text(document: DocumentNode) -> str:
+    """Query text of a document, as kept by ``parse_query`` or printed"""
+    text = getattr(document, "query_text", None)
+    return text if text is not None else print_ast(document)
+
+
+@lru_cache(maxsize=256)
+def status_query(count: int) -> DocumentNode:
+    """Build an aliased query retrieving the status of ``count`` jobs
+
+    Job IDs are passed as the variables ``$j0``, ``$j1``, ... and results are
+    returned under the matching aliases. The result fields are requested with
+    the status, so the query that sees a job finish also returns its result.
+    """
+    variables = ", ".join(f"$j{i}: ID!" for i in range(count))
+    fields = " ".join(
+        f"j{i}: job(jobId: $j{i}) {{ {JOB_RESULT_FIELDS} }}" for i in range(count)
+    )
+    return parse_query(f"query ({variables}) {{ {fields} }}")
+
+
+@lru_cache(maxsize=256)
+def submit_mutation(count: int) -> DocumentNode:
+    """Build an aliased mutation submitting ``count`` jobs
+
+    Job requests are passed as the variables ``$r0``, ``$r1``, ... and the
+    submitted jobs are returned under the matching aliases.
+    """
+    variables = ", ".join(f"$r{i}: JobRequest!" for i in range(count))
+    fields = " ".join(
+        f"r{i}: submitJob(request: $r{i}) {{ job {{ jobId status }} }}"
+        for i in range(count)
+    )
+    return parse_query(f"mutation ({variables}) {{ {fields} }}")
+
+
+@lru_cache(maxsize=256)
+def cancel_mutation(count: int) -> DocumentNode:
+    """Build an aliased mutation cancelling ``count`` jobs
+
+    Job IDs are passed as the variables ``$c0``, ``$c1``, ... and the cancelled
+    jobs are returned under the matching aliases.
+    """
+    variables = ", ".join(f"$c{i}: ID!" for i in range(count))
+    fields = " ".join(
+        f"c{i}: cancelJob(jobId: $c{i}) {{ jobId status }}" for i in range(count)
+    )
+    return parse_query(f"mutation ({variables}) {{ {fields} }}")
+
+
+def selection_set(fields: Iterable[str]) -> str:
+    """Build a selection set from field names, nested fields use dot notation.
+    Field names may be given in snake case.
+
+    Example::
+
+        >>> selection_set(["name", "parameters.name", "parameters.fileType.name"])
+        '{ name parameters { name fileType { name } } }'
+    """
+    tree: Dict = {}
+    for field in fields:
+        node = tree
+        for name in field.split("."):
+            node = node.setdefault(to_camel_case(name), {})
+
+    def render(node: Dict) -> str:
+        selections = [
+            f"{name} {render(sub)}" if sub else name for name, sub in node.items()
+        ]
+        return "{ " + " ".join(selections) + " }"
+
+    return render(tree)
+
+
+class QueryCache:
+    """LRU cache of compiled and validated documents
+
+    Documents are compiled once for each root type, operation and set of fields,
+    every argument of the operation is declared as a variable so the same
+    document can be reused with different arguments. Documents are validated
+    against the schema when they are compiled, and keep the query text they were
+    parsed from, so executing a cached document only requires binding its
+    variables.
+
+    Args:
+        schema (`graphql.GraphQLSchema`, optional): Schema used to compile
+            documents, defaults to the MOTHR schema
+        maxsize (int, optional): Maximum number of documents kept, default 256
+    """
+
+    def __init__(self, schema: Optional[GraphQLSchema] = None, maxsize: int = 256):
+        self._schema = schema
+        self.maxsize = maxsize
+        self._documents: OrderedDict = OrderedDict()
+
+    @property
+    def schema(self) -> GraphQLSchema:
+        """Schema used to compile documents"""
+        if self._schema is None:
+            self._schema = load_schema()
+        return self._schema
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def get(self, root: str, operation: str, fields: Tuple[str, ...]) -> DocumentNode:
+        """Get the compiled document for an operation
+
+        Args:
+            root (str): Root type of the operation, ``Query`` or ``Mutation``
+            operation (str): Name of the operation, e.g., ``job``
+            fields (tuple<str>): Fields to select, nested fields are specified
+                using dot notation
+
+        Returns:
+            `graphql.DocumentNode`: The compiled document
+        """
+        key = (root, operation, fields)
+        document = self._documents.get(key)
+        if document is not None:
+            self._documents.move_to_end(key)
+            return document
+        document = self.compile(root, operation, fields)
+        self._documents[key] = document
+        if len(self._documents) > self.maxsize:
+            self._documents.popitem(last=False)
+        return document
+
+    def compile(
+        self, root: str, operation: str, fields: Tuple[str, ...]
+    ) -> DocumentNode:
+        """Compile and validate a document for an operation
+
+        Raises:
+            GraphQLError: If the document is not valid for the schema
+        """
+        operation = to_camel_case(operation)
+        root_type = self.schema.get_type(root)
+        args = root_type.fields[operation].args  # type: ignore
+        definitions = ", ".join(f"${name}: {arg.type}" for name, arg in args.items())
+        arguments = ", ".join(f"{name}: ${name}" for name in args)
+        keyword = "mutation" if root == "Mutation" else "query"
+        document = parse_query(
+            f"{keyword} ({definitions}) "
+            f"{{ {operation}({arguments}) {selection_set(fields)} }}"
+        )
+        errors = validate(self.schema, document)
+        if errors:
+            raise errors[0]
+        return document
@@ -0,0 +1,205 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""Synchronous access to a client running on a background event loop"""
+
+from __future__ import annotations
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future, wait as wait_futures
+from typing import Any, Awaitable, Deque, Dict, Iterable, Iterator, Optional, Set
+
+from .client import AsyncMothrClient
+from .pool import AsyncJobPool
+from .request import AsyncJobRequest
+
+
+class MothrExecutor:
+    """Runs job requests from synchronous code, on a client running in a
+    background thread
+
+    The executor starts an event loop in a dedicated thread and creates a single
+    ``AsyncMothrClient`` in it. Job requests submitted from any thread are run
+    on that loop, so they share the client's connection pool, websocket
+    connection and batch status queries, and results are returned through
+    ``concurrent.futures.Future``::
+
+        with MothrExecutor(max_jobs=200) as executor:
+            future = executor.submit(executor.request(service="echo"))
+            print(future.result()["result"])
+            requests = (executor.request(service="echo") for _ in range(1000))
+            for result in executor.map(requests):
+                print(result["result"])
+
+    Cancelling a future cancels its job, on MOTHR as well unless
+    ``run_args`` contains ``cancel_abandoned=False``.
+
+    Args:
+        max_jobs (int, optional): Maximum number of jobs running at once, further
+            jobs wait for a slot, default 100
+        run_args (dict, optional): Arguments passed to
+            ``AsyncJobRequest.run_job``, default ``{"batch": True}``
+        kwargs: Arguments used to create the ``AsyncMothrClient``
+    """
+
+    def __init__(self, **kwargs):
+        self.max_jobs: int = kwargs.pop("max_jobs", 100)
+        self.run_args: Dict[str, Any] = kwargs.pop("run_args", {"batch": True})
+        self._shutdown = False
+        self._futures: Set[Future] = set()
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._run_loop, name="MothrExecutor", daemon=True
+        )
+        self._thread.start()
+        # Created in the loop, the objects they hold belong to the loop's thread
+        self.client: AsyncMothrClient = self.run(self._create(AsyncMothrClient, kwargs))
+        self.pool: AsyncJobPool = self.run(
+            self._create(AsyncJobPool, {"max_jobs": self.max_jobs, **self.run_args})
+        )
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    @staticmethod
+    async def _create(factory: Any, kwargs: Dict[str, Any]) -> Any:
+        return factory(**kwargs)
+
+    def __enter__(self) -> MothrExecutor:
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(wait=exc_type is None)
+
+    def _schedule(self, coroutine: Awaitable) -> Future:
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Executor methods can not be called from its own loop")
+        # Registered under the lock so shutdown waits for every scheduled future
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("Cannot schedule new jobs after shutdown")
+            future = asyncio.run_coroutine_threadsafe(
+                coroutine, self._loop  # type: ignore
+            )
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def run(self, coroutine: Awaitable, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the executor's loop and wait for its result, e.g.,
+        ``executor.run(executor.client.services())``
+
+        Args:
+            coroutine (coroutine): Coroutine to run
+            timeout (float, optional): Time, in seconds, to wait for the result.
+                By default waits until the coroutine returns.
+
+        Returns:
+            The result of the coroutine
+
+        Raises:
+            concurrent.futures.TimeoutError: If the coroutine did not return in
+                time, it is cancelled
+        """
+        future = self._schedule(coroutine)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def request(self, **kwargs) -> AsyncJobRequest:
+        """Create a job request using the executor's client
+
+        Args:
+            kwargs: Arguments of ``AsyncJobRequest``
+
+        Returns:
+            AsyncJobRequest: The job request
+        """
+        return AsyncJobRequest(client=self.client, **kwargs)
+
+    def submit(self, request: AsyncJobRequest) -> Future:
+        """Run a job request in the background
+
+        The request is run with the executor's client, replacing the client it
+        was created with, if any, since clients can only be used in their loop.
+
+        Args:
+            request (AsyncJobRequest): Job request to run
+
+        Returns:
+            `concurrent.futures.Future`: Future resolving to the job result, or
+                the exception raised by ``run_job``
+        """
+        request.client = self.client
+        return self._schedule(self._run(request))
+
+    def _done(self, future: Future):
+        with self._lock:
+            self._futures.discard(future)
+
+    async def _run(self, request: AsyncJobRequest) -> Dict[str, str]:
+        job = await self.pool.submit(request)
+        return await job
+
+    def map(
+        self, requests: Iterable[AsyncJobRequest], timeout: Optional[float] = None
+    ) -> Iterator[Dict[str, str]]:
+        """Run job requests in the background, yielding their results in order
+
+        Requests are taken from ``requests`` as the results are consumed, at
+        most ``max_jobs`` ahead of the oldest result not yet yielded, so
+        ``requests`` can be a generator of any length.
+
+        Args:
+            requests (iterable<AsyncJobRequest>): Job requests to run
+            timeout (float, optional): Time, in seconds, to wait for each result.
+                By default waits until the job finishes.
+
+        Returns:
+            Iterator<dict>: The job results, in the order of the requests
+
+        Raises:
+            concurrent.futures.TimeoutError: If a result is not available in time
+            Exception: Raised by ``run_job`` for a failed job, the requests not yet
+                yielded are cancelled
+        """
+        futures: Deque[Future] = deque()
+        try:
+            for request in requests:
+                futures.append(self.submit(request))
+                if len(futures) >= self.max_jobs:
+                    yield futures.popleft().result(timeout)
+            while futures:
+                yield futures.popleft().result(timeout)
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def shutdown(self, wait: bool = True):
+        """Stop the executor, closing the client and the event loop
+
+        Args:
+            wait (bool, optional): Wait for running jobs to finish, otherwise
+                they are cancelled. Default True
+        """
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            futures = list(self._futures)
+        if not wait:
+            for future in futures:
+                future.cancel()
+        wait_futures(futures)
+        # Cancelled jobs are cancelled on MOTHR before the client is closed
+        for coroutine in (self.pool.join(), self.client.close()):
+            asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
@@ -0,0 +1,332 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""Instrumentation of client operations
+
+Operations emit ``Event`` objects to the hooks registered with
+``AsyncMothrClient.instrumentation``. A hook is any callable taking an event,
+``MetricsCollector`` is a hook aggregating events into counters and histograms.
+When no hooks are registered no events are created.
+
+Events emitted:
+
+- ``request``: GraphQL request, including retries, with ``operation``,
+  ``retries`` and the ``size`` of the request and response bodies, only for
+  sessions opened while a hook was registered. Streamed responses, e.g.,
+  ``AsyncMothrClient.jobs``, end and report the size of the response once it
+  has been read.
+- ``connect``: HTTP connection opened, only for sessions opened while a hook
+  was registered
+- ``login``: Login, or renewal of the access token by logging in
+- ``submit``: Job submission, with ``job_id``
+- ``poll``: Status poll, with ``job_id`` and ``status``, or the number of jobs
+  in ``data["jobs"]`` for batch polls
+- ``result``: Job reaching a final status, ``duration`` is the time spent
+  waiting and ``data`` holds the ``waitTime``, ``runTime``, ``maxMemory`` and
+  ``cpuUsage`` reported by MOTHR, returned with the job result
+- ``subscribe``: Subscription sent, ``duration`` is the time spent opening the
+  connection and ``retries`` the number of reconnections
+- ``message``: Message received from a subscription, with ``operation``,
+  ``job_id`` and the ``size`` of the message data serialized as JSON
+"""
+
+from __future__ import annotations
+import bisect
+import logging
+import math
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import aiohttp
+
+
+log = logging.getLogger(__name__)
+
+# Job statistics reported by MOTHR, captured in result events
+JOB_STATS_FIELDS = ["waitTime", "runTime", "maxMemory", "cpuUsage"]
+
+
+class Event:  # pylint: disable=too-few-public-methods
+    """Operation performed by the client
+
+    Attributes:
+        name (str): Kind of operation, e.g., ``submit``
+        duration (float): Time, in seconds, the operation took
+        job_id (str): Job the operation applies to
+        operation (str): Name of the GraphQL operation
+        status (str): Job status
+        size (int): Size, in bytes, of the payload sent and received
+        retries (int): Number of times the operation was retried
+        error (Exception): Exception raised by the operation
+        data (dict): Additional data specific to the event
+    """
+
+    __slots__ = (
+        "name",
+        "duration",
+        "job_id",
+        "operation",
+        "status",
+        "size",
+        "retries",
+        "error",
+        "data",
+    )
+
+    def __init__(self, name: str, **kwargs):
+        self.name = name
+        self.duration: Optional[float] = kwargs.pop("duration", None)
+        self.job_id: Optional[str] = kwargs.pop("job_id", None)
+        self.operation: Optional[str] = kwargs.pop("operation", None)
+        self.status: Optional[str] = kwargs.pop("status", None)
+        self.size: Optional[int] = kwargs.pop("size", None)
+        self.retries: Optional[int] = kwargs.pop("retries", None)
+        self.error: Optional[BaseException] = kwargs.pop("error", None)
+        self.data: Dict[str, Any] = kwargs.pop("data", None) or {}
+
+    def __repr__(self) -> str:
+        fields = ", ".join(
+            f"{name}={getattr(self, name)!r}"
+            for name in self.__slots__[1:]
+            if getattr(self, name) not in (None, {})
+        )
+        return f"Event({self.name!r}, {fields})"
+
+
+class Span:
+    """Times an operation, emitting an event when it ends"""
+
+    __slots__ = ("instrumentation", "name", "fields", "start")
+
+    def __init__(self, instrumentation: Instrumentation, name: str, fields: Dict):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.fields = fields
+        self.start = 0.0
+
+    def __enter__(self) -> Span:
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Streams closed early by their consumer did not fail
+        if exc is not None and not isinstance(exc, GeneratorExit):
+            self.fields["error"] = exc
+        self.instrumentation.emit(
+            self.name, duration=time.perf_counter() - self.start, **self.fields
+        )
+
+    def set(self, **fields):
+        """Set fields of the event"""
+        self.fields.update(fields)
+
+
+class _NullSpan:
+    """Span used when no hooks are registered, does nothing"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> _NullSpan:
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def set(self, **fields):
+        """Ignore fields"""
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Instrumentation:
+    """Dispatches events to registered hooks
+
+    Args:
+        hooks (list<callable>, optional): Hooks called with each ``Event``
+    """
+
+    def __init__(self, hooks: Optional[Iterable[Callable[[Event], Any]]] = None):
+        self.hooks: List[Callable[[Event], Any]] = list(hooks or [])
+
+    def add_hook(self, hook: Callable[[Event], Any]):
+        """Register a hook called with each event"""
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[Event], Any]):
+        """Unregister a hook"""
+        self.hooks.remove(hook)
+
+    def emit(self, name: str, **fields):
+        """Send an event to all hooks, errors raised by hooks are logged"""
+        if not self.hooks:
+            return
+        event = Event(name, **fields)
+        for hook in self.hooks:
+            try:
+                hook(event)
+            except Exception:  # pylint: disable=broad-except
+                log.exception("Instrumentation hook %r failed", hook)
+
+    def span(self, name: str, **fields) -> Any:
+        """Time an operation, used as a context manager::
+
+            with instrumentation.span("submit") as span:
+                job_id = await submit()
+                span.set(job_id=job_id)
+        """
+        if not self.hooks:
+            return NULL_SPAN
+        return Span(self, name, fields)
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """Trace config emitting ``connect`` events for new HTTP connections
+
+        The size of the request and response bodies is also added to the
+        ``size`` attribute of the ``trace_request_ctx`` passed to the request,
+        if any.
+        """
+
+        async def on_start(_session, context: SimpleNamespace, _params):
+            context.connect_start = time.perf_counter()
+
+        async def on_end(_session, context: SimpleNamespace, _params):
+            self.emit("connect", duration=time.perf_counter() - context.connect_start)
+
+        async def on_chunk(_session, context: SimpleNamespace, params):
+            payload = context.trace_request_ctx
+            if payload is not None:
+                payload.size += len(params.chunk)
+
+        config = aiohttp.TraceConfig()
+        config.on_connection_create_start.append(on_start)
+        config.on_connection_create_end.append(on_end)
+        config.on_request_chunk_sent.append(on_chunk)
+        config.on_response_chunk_received.append(on_chunk)
+        return config
+
+
+class Histogram:
+    """Histogram with exponentially growing buckets
+
+    Args:
+        start (float, optional): Upper bound of the first bucket, default 0.001
+        factor (float, optional): Ratio between the bounds of consecutive
+            buckets, default 2
+        buckets (int, optional): Number of buckets, values above the last bound
+            are counted in an overflow bucket, default 24
+    """
+
+    def __init__(self, start: float = 0.001, factor: float = 2.0, buckets: int = 24):
+        self.bounds = [start * factor ** i for i in range(buckets)]
+        self.counts = [0] * (buckets + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        """Record a value"""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self) -> Optional[float]:
+        """Mean of the values, None if empty"""
+        return self.total / self.count if self.count else None
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Estimate a percentile, from 0 to 100, by the upper bound of the
+        bucket containing it. None if empty."""
+        if not self.count:
+            return None
+        rank = math.ceil(self.count * p / 100) or 1
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                bound = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """Count, mean, extremes and main percentiles of the values"""
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min if self.count else None,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max if self.count else None,
+        }
+
+
+class MetricsCollector:
+    """Hook keeping counters and histograms of events in memory
+
+    Example::
+
+        metrics = MetricsCollector()
+        client.instrumentation.add_hook(metrics)
+        ...
+        print(metrics.summary())
+
+    Attributes:
+        counters (dict<str, int>): Number of events by name, failed operations
+            are also counted under ``<name>.error`` and retries under
+            ``<name>.retries``
+        latency (dict<str, Histogram>): Duration, in seconds, of operations by
+            event name
+        sizes (dict<str, Histogram>): Size, in bytes, of payloads by event name
+        job_stats (dict<str, Histogram>): Statistics reported by MOTHR for
+            finished jobs, keyed by field name, e.g., ``runTime``
+    """
+
+    def __init__(self):
+        self.counters: Dict[str, int] = {}
+        self.latency: Dict[str, Histogram] = {}
+        self.sizes: Dict[str, Histogram] = {}
+        self.job_stats: Dict[str, Histogram] = {}
+
+    def _count(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def __call__(self, event: Event):
+        self._count(event.name)
+        if event.error is not None:
+            self._count(f"{event.name}.error")
+        if event.retries:
+            self._count(f"{event.name}.retries", event.retries)
+        if event.duration is not None:
+            if event.name not in self.latency:
+                self.latency[event.name] = Histogram()
+            self.latency[event.name].add(event.duration)
+        if event.size is not None:
+            if event.name not in self.sizes:
+                self.sizes[event.name] = Histogram(start=64.0)
+            self.sizes[event.name].add(event.size)
+        if event.name == "result":
+            for field in JOB_STATS_FIELDS:
+                value = event.data.get(field)
+                if value is None:
+                    continue
+                if field not in self.job_stats:
+                    # Memory and CPU usage are not durations, use wider buckets
+                    start = 0.001 if field.endswith("Time") else 1.0
+                    self.job_stats[field] = Histogram(start=start, buckets=40)
+                self.job_stats[field].add(value)
+
+    def summary(self) -> Dict[str, Any]:
+        """Summarize the collected metrics"""
+        return {
+            "counters": dict(self.counters),
+            "latency": {name: h.summary() for name, h in self.latency.items()},
+            "sizes": {name: h.summary() for name, h in self.sizes.items()},
+            "job_stats": {name: h.summary() for name, h in self.job_stats.items()},
+        }
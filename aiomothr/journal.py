@@ -0,0 +1,145 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""Append-only journal of submitted jobs, used to resume after a restart"""
+
+from __future__ import annotations
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import IO, Any, Dict, List, Optional
+
+from .results import is_final
+from .writer import BackgroundWriter
+
+
+log = logging.getLogger(__name__)
+
+
+class JobJournal:
+    """Append-only JSON lines journal of submitted jobs
+
+    Each submission is recorded with its request arguments, job ID and status,
+    and later lines record the final status of jobs. A line cut short by a crash
+    is skipped when the journal is loaded.
+
+    Lines recorded while an event loop is running are written in a worker
+    thread, those of the same iteration of the loop with a single flush and
+    fsync, so writing does not stall the loop. ``AsyncJobRequest.submit`` and
+    ``AsyncMothrClient.submit_many`` wait for the submissions to be ``written``
+    before returning, so a submitted job survives the process being killed, and
+    with ``fsync`` the machine crashing. Final statuses reach the file shortly
+    after jobs finish, ``close`` writes the lines not written yet.
+
+    Args:
+        path (str): Path of the journal file, created if it does not exist
+        fsync (bool, optional): Force the lines to disk each time they are
+            written, default False
+    """
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        self._file: Optional[IO[str]] = None
+        self._writer = BackgroundWriter(self._write_lines, "aiomothr-journal")
+
+    def _write(self, entry: Dict[str, Any]):
+        self._writer.add(json.dumps(entry) + "\n")
+
+    def _write_lines(self, lines: List[str]):
+        if self._file is None:
+            self._file = open(  # pylint: disable=consider-using-with
+                self.path, "a", encoding="utf-8"
+            )
+        self._file.write("".join(lines))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def submitted(self, job_id: str, status: Optional[str], request: Dict):
+        """Record a submitted job
+
+        Args:
+            job_id (str): ID of the job
+            status (str): Status returned on submission
+            request (dict): Request arguments, ``AsyncJobRequest.req_args``
+        """
+        self._write({"jobId": job_id, "status": status, "request": request})
+
+    def finished(self, job_id: str, status: str):
+        """Record the final status of a job"""
+        self._write({"jobId": job_id, "status": status})
+
+    async def written(self):
+        """Wait until the lines recorded so far are written, and with ``fsync``
+        forced to disk
+
+        Raises:
+            OSError: If the lines could not be written
+        """
+        await self._writer.written()
+
+    def load(self) -> OrderedDict:
+        """Read the journal
+
+        Returns:
+            OrderedDict<str, dict>: Latest status and request arguments of each
+                job, by job ID, in order of submission
+        """
+        self._writer.flush()
+        jobs: OrderedDict = OrderedDict()
+        if not os.path.exists(self.path):
+            return jobs
+        with open(self.path, encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    log.warning("Skipping invalid line %d of %s", number, self.path)
+                    continue
+                job = jobs.setdefault(entry["jobId"], {"jobId": entry["jobId"]})
+                job["status"] = entry.get("status")
+                if "request" in entry:
+                    job["request"] = entry["request"]
+        return jobs
+
+    def pending(self) -> OrderedDict:
+        """Jobs of the journal that were not seen finishing
+
+        Returns:
+            OrderedDict<str, dict>: Journal entries by job ID
+        """
+        return OrderedDict(
+            (job_id, job)
+            for job_id, job in self.load().items()
+            if not is_final(job["status"]) and "request" in job
+        )
+
+    def compact(self) -> OrderedDict:
+        """Rewrite the journal keeping only the jobs that were not seen finishing
+
+        The journal is replaced atomically, so it is never left incomplete.
+
+        Returns:
+            OrderedDict<str, dict>: Kept journal entries by job ID
+        """
+        jobs = self.pending()
+        self.close()
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            for job in jobs.values():
+                f.write(json.dumps(job) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        return jobs
+
+    def close(self):
+        """Write the pending lines and close the journal file, it is opened
+        again when next written"""
+        self._writer.close()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
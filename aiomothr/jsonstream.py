@@ -0,0 +1,176 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""Incremental parsing of GraphQL responses
+
+Large list responses are parsed as they are received, each item of the list is
+decoded once it has fully arrived and handed to the caller, so the response is
+never held in memory as a whole.
+"""
+
+from __future__ import annotations
+import codecs
+import json
+import re
+from typing import Any, AsyncIterator, List, Optional
+
+from gql.transport.exceptions import TransportProtocolError, TransportQueryError
+
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+
+
+class JSONReader:
+    """Pull parser reading JSON values from a stream of byte chunks
+
+    Args:
+        chunks (AsyncIterator<bytes>): Chunks of a UTF-8 encoded JSON document
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    async def _fill(self) -> bool:
+        """Read the next chunk into the buffer, returns False at the end of the
+        stream"""
+        if self._eof:
+            return False
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self._eof = True
+            chunk = b""
+        # Discard everything already parsed
+        self._buffer = self._buffer[self._pos :] + self._text.decode(
+            chunk, final=self._eof
+        )
+        self._pos = 0
+        return True
+
+    async def peek(self) -> str:
+        """Get the next character that is not whitespace without consuming it
+
+        Raises:
+            TransportProtocolError: If the stream ended
+        """
+        while True:
+            self._pos = WHITESPACE.match(self._buffer, self._pos).end()  # type: ignore
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not await self._fill():
+                raise TransportProtocolError("Unexpected end of response")
+
+    async def expect(self, char: str):
+        """Consume the next character, which must be ``char``
+
+        Raises:
+            TransportProtocolError: If the next character is not ``char``
+        """
+        if await self.peek() != char:
+            raise TransportProtocolError(
+                f"Expected {char!r} at position {self._pos} of response"
+            )
+        self._pos += 1
+
+    async def value(self) -> Any:
+        """Decode the next complete value"""
+        await self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                if not await self._fill():
+                    raise TransportProtocolError(f"Invalid response: {e}") from e
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if (
+                isinstance(value, (int, float))
+                and not self._eof
+                and NUMBER_TAIL.match(self._buffer, end).end()  # type: ignore
+                == len(self._buffer)
+            ):
+                await self._fill()
+                continue
+            self._pos = end
+            return value
+
+    async def members(self) -> AsyncIterator[str]:
+        """Iterate over the keys of the next object. The value of each key must
+        be consumed before advancing to the next key."""
+        await self.expect("{")
+        if await self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = await self.value()
+            await self.expect(":")
+            yield key
+            separator = await self.peek()
+            self._pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise TransportProtocolError(
+                    f"Expected ',' or '}}' at position {self._pos - 1} of response"
+                )
+
+    async def items(self) -> AsyncIterator[Any]:
+        """Iterate over the items of the next array, decoding each item"""
+        await self.expect("[")
+        if await self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield await self.value()
+            separator = await self.peek()
+            self._pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise TransportProtocolError(
+                    f"Expected ',' or ']' at position {self._pos - 1} of response"
+                )
+
+
+async def iter_list_field(chunks: AsyncIterator[bytes], field: str) -> AsyncIterator:
+    """Iterate over the items of a list field in a GraphQL response
+
+    Items are yielded as soon as they have been received. Null items are
+    skipped.
+
+    Args:
+        chunks (AsyncIterator<bytes>): Chunks of the response body
+        field (str): Name of the root field, e.g., ``jobs``
+
+    Returns:
+        AsyncIterator: Items of ``data.<field>``
+
+    Raises:
+        TransportQueryError: If the response includes errors, raised once the
+            response has been read
+        TransportProtocolError: If the response is not a GraphQL result
+    """
+    reader = JSONReader(chunks)
+    errors: Optional[List[Any]] = None
+    async for key in reader.members():
+        if key == "data" and await reader.peek() == "{":
+            async for name in reader.members():
+                if name == field and await reader.peek() == "[":
+                    async for item in reader.items():
+                        if item is not None:
+                            yield item
+                else:
+                    await reader.value()
+        elif key == "errors":
+            errors = await reader.value()
+        else:
+            await reader.value()
+    if errors:
+        raise TransportQueryError(str(errors[0]), errors=errors)
@@ -0,0 +1,230 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""Streaming of messages published by many jobs through a bounded buffer"""
+
+from __future__ import annotations
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Iterable, List, NamedTuple, Optional
+
+from .subscriptions import SubscriptionManager
+
+
+BLOCK = "block"
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, COALESCE)
+
+
+class JobMessage(NamedTuple):
+    """Message published by a job"""
+
+    job_id: str
+    message: str
+
+
+class MessageStream:
+    """Messages published by a set of jobs, merged into a bounded buffer
+
+    Each job is followed with a ``subscribeJobMessages`` subscription on the
+    shared websocket connection. Received messages are buffered until the
+    consumer reads them, one at a time by iterating over the stream or in
+    batches with ``batches``. When the buffer is full, the overflow policy
+    decides what happens to new messages:
+
+    - ``drop_oldest``: Discard the oldest buffered message, the default.
+    - ``coalesce``: Keep only the latest buffered message of each job, a new
+      message replaces the one from the same job still waiting in the buffer.
+      Blocks if the buffer is full of messages from different jobs.
+    - ``block``: Wait for the consumer to make room. This does not bound memory
+      use: messages keep being received meanwhile and wait, without limit, in
+      the queue the websocket transport keeps for each subscription.
+
+    Iteration ends once the subscriptions of all jobs have ended, i.e., the jobs
+    have finished, and the buffer is empty::
+
+        async with MessageStream(client.subscriptions, job_ids, maxsize=100,
+                                 overflow="drop_oldest") as stream:
+            async for batch in stream.batches(interval=0.5):
+                for job_id, message in batch:
+                    print(job_id, message)
+
+    Attributes:
+        dropped (int): Number of messages discarded by ``drop_oldest``
+        coalesced (int): Number of messages replaced by ``coalesce``
+
+    Args:
+        subscriptions (SubscriptionManager): Manager of the websocket
+            connection, e.g., ``AsyncMothrClient.subscriptions``
+        job_ids (iterable<str>, optional): Jobs to follow, more can be added
+            with ``add``
+        maxsize (int, optional): Maximum number of buffered messages, default
+            1000
+        overflow (str, optional): Policy applied when the buffer is full, one of
+            ``drop_oldest``, ``coalesce`` or ``block``. Default ``drop_oldest``.
+    """
+
+    def __init__(
+        self,
+        subscriptions: SubscriptionManager,
+        job_ids: Optional[Iterable[str]] = None,
+        **kwargs,
+    ):
+        self.subscriptions = subscriptions
+        self.maxsize: int = kwargs.pop("maxsize", 1000)
+        self.overflow: str = kwargs.pop("overflow", DROP_OLDEST)
+        if self.overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {self.overflow}")
+        self.dropped = 0
+        self.coalesced = 0
+        # Entries are mutable so coalesced messages are replaced in place
+        self._buffer: Deque[List[str]] = deque()
+        self._latest: Dict[str, List[str]] = {}
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._tasks: Dict[str, asyncio.Future] = {}
+        self._error: Optional[BaseException] = None
+        for job_id in job_ids or []:
+            self.add(job_id)
+
+    def __len__(self) -> int:
+        """Number of buffered messages"""
+        return len(self._buffer)
+
+    @property
+    def job_ids(self) -> List[str]:
+        """Jobs whose messages are still being received"""
+        return list(self._tasks)
+
+    def add(self, job_id: str):
+        """Follow the messages of a job"""
+        if job_id not in self._tasks:
+            task = asyncio.ensure_future(self._follow(job_id))
+            self._tasks[job_id] = task
+            task.add_done_callback(lambda _: self._finished(job_id, task))
+
+    def _finished(self, job_id: str, task: asyncio.Future):
+        if self._tasks.get(job_id) is task:
+            del self._tasks[job_id]
+        self._readable.set()
+
+    def remove(self, job_id: str):
+        """Stop following a job, its buffered messages are kept"""
+        task = self._tasks.pop(job_id, None)
+        if task is not None:
+            task.cancel()
+
+    async def close(self):
+        """Stop following all jobs and discard buffered messages"""
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._buffer.clear()
+        self._latest.clear()
+        self._writable.set()
+
+    async def __aenter__(self) -> MessageStream:
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _follow(self, job_id: str):
+        messages = self.subscriptions.job_messages(job_id)
+        try:
+            async for message in messages:
+                await self._put(job_id, message)
+        except asyncio.CancelledError:  # pylint: disable=try-except-raise
+            # Subclass of Exception before Python 3.8
+            raise
+        except Exception as e:  # pylint: disable=broad-except
+            self._error = e
+        finally:
+            # Stops the subscription on the server when the job is removed
+            await messages.aclose()  # type: ignore
+
+    async def _put(self, job_id: str, message: str):
+        if self.overflow == COALESCE and job_id in self._latest:
+            self._latest[job_id][1] = message
+            self.coalesced += 1
+            return
+        while len(self._buffer) >= self.maxsize:
+            if self.overflow == DROP_OLDEST:
+                self._pop()
+                self.dropped += 1
+            else:
+                self._writable.clear()
+                await self._writable.wait()
+        entry = [job_id, message]
+        self._buffer.append(entry)
+        if self.overflow == COALESCE:
+            self._latest[job_id] = entry
+        self._readable.set()
+
+    def _pop(self) -> JobMessage:
+        job_id, message = self._buffer.popleft()
+        if self.overflow == COALESCE:
+            del self._latest[job_id]
+        self._writable.set()
+        return JobMessage(job_id, message)
+
+    async def _wait_readable(self) -> bool:
+        """Wait for a buffered message, False once the stream has ended"""
+        while not self._buffer:
+            if self._error is not None:
+                error, self._error = self._error, None
+                raise error
+            if not self._tasks:
+                return False
+            self._readable.clear()
+            await self._readable.wait()
+        return True
+
+    async def get(self) -> JobMessage:
+        """Wait for the next message
+
+        Returns:
+            JobMessage: The oldest buffered message
+
+        Raises:
+            StopAsyncIteration: If all subscriptions have ended and the buffer is
+                empty
+        """
+        if not await self._wait_readable():
+            raise StopAsyncIteration
+        return self._pop()
+
+    def __aiter__(self) -> MessageStream:
+        return self
+
+    async def __anext__(self) -> JobMessage:
+        return await self.get()
+
+    async def batches(self, interval: float = 0.1, max_size: Optional[int] = None):
+        """Iterate over the messages in batches
+
+        Once a message is available, messages are collected for ``interval``
+        seconds and yielded together, so the consumer handles one list per tick
+        instead of one message at a time.
+
+        Args:
+            interval (float, optional): Time, in seconds, messages are collected
+                for after the first one arrives, default 0.1
+            max_size (int, optional): Maximum number of messages in a batch,
+                defaults to all buffered messages
+
+        Returns:
+            AsyncIterator<list<JobMessage>>: Batches of messages, oldest first
+        """
+        while await self._wait_readable():
+            if interval > 0:
+                await asyncio.sleep(interval)
+            count = len(self._buffer)
+            if max_size is not None:
+                count = min(count, max_size)
+            if count:
+                yield [self._pop() for _ in range(count)]
@@ -0,0 +1,229 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+from __future__ import annotations
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Optional, Set
+
+from gql import gql
+from .poller import ACTIVE_STATUSES, BatchStatusPoller
+from .subscriptions import SUBSCRIPTION_ERRORS
+
+if TYPE_CHECKING:
+    from .client import AsyncMothrClient
+
+
+log = logging.getLogger(__name__)
+
+JOB_EVENTS = gql(
+    """
+    subscription {
+        subscribeJobs {
+            jobId
+            type
+        }
+    }
+"""
+)
+
+
+class JobStateMirror(BatchStatusPoller):
+    """Local copy of job statuses kept up to date by the ``subscribeJobs`` events
+
+    The mirror subscribes to job events once, on the client's shared websocket
+    connection, and records the latest status of each job. While the
+    subscription is live, statuses are local lookups and jobs waiting through
+    ``wait`` are woken by their events, so only finished jobs are queried, to
+    retrieve their results.
+
+    Events sent while the connection was down are lost. Each time the connection
+    is (re)opened, and every ``reconcile_interval`` seconds, the statuses of jobs
+    submitted through the client that have not finished are queried to fill the
+    gaps. While the subscription is down, awaited jobs are polled every
+    ``interval`` seconds like ``BatchStatusPoller`` does.
+
+    Attributes:
+        statuses (dict<str, str>): Latest status of each job, by job ID
+
+    Args:
+        client (AsyncMothrClient): Client used for the subscription and queries
+        interval (float, optional): Time, in seconds, between checks of the
+            subscription, default 0.25
+        reconcile_interval (float, optional): Time, in seconds, between
+            reconciliation queries while the subscription is live, default 30
+        chunk_size (int, optional): Maximum number of jobs queried in a single
+            request, default 100
+        max_jobs (int, optional): Maximum number of job statuses kept, the least
+            recently updated are discarded first, default 100000
+    """
+
+    def __init__(self, client: AsyncMothrClient, **kwargs):
+        self.reconcile_interval = kwargs.pop("reconcile_interval", 30.0)
+        self.max_jobs = kwargs.pop("max_jobs", 100000)
+        super().__init__(client, **kwargs)
+        self.statuses: OrderedDict = OrderedDict()
+        self._active: Set[str] = set()
+        self._fetch: Set[str] = set()
+        self._fetch_task: Optional[asyncio.Future] = None
+        self._listener: Optional[asyncio.Future] = None
+        self._listening = False
+        self._closing = False
+        self._synced_generation: Optional[int] = None
+
+    @property
+    def live(self) -> bool:
+        """Whether the statuses are being kept up to date by the subscription"""
+        subscriptions = self.client.subscriptions
+        return (
+            self._listening
+            and subscriptions.connected
+            and self._synced_generation == subscriptions.generation
+        )
+
+    def start(self):
+        """Subscribe to job events, if not already subscribed"""
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.ensure_future(self._listen())
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def close(self):
+        """Stop following job events, pending waiters are cancelled"""
+        tasks = [t for t in (self._listener, self._fetch_task) if t is not None]
+        self._listener, self._fetch_task = None, None
+        self._closing = True
+        for task in tasks:
+            task.cancel()
+        try:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            self._closing = False
+        self._listening = False
+        self._synced_generation = None
+        await super().close()
+
+    def track(self, job_id: str, status: Optional[str] = None):
+        """Follow a job submitted through the client
+
+        Tracked jobs that have not finished are included in reconciliation
+        queries.
+
+        Args:
+            job_id (str): Submitted job
+            status (str, optional): Status returned when the job was submitted
+        """
+        if job_id not in self.statuses and status is not None:
+            self._update(job_id, status)
+        if self.statuses.get(job_id, "submitted") in ACTIVE_STATUSES:
+            self._active.add(job_id)
+        self.start()
+
+    def status(self, job_id: str) -> Optional[str]:
+        """Get the status of a job from the mirror
+
+        Returns:
+            str: The latest status of the job, None if it is not known or the
+                subscription is not live
+        """
+        if not self.live:
+            return None
+        return self.statuses.get(job_id)
+
+    async def wait(self, job_id: str) -> Dict[str, str]:
+        """Wait for a job to reach a final state
+
+        Args:
+            job_id (str): Job to wait for
+
+        Returns:
+            dict: The job result
+        """
+        self._active.add(job_id)
+        self.start()
+        if self.statuses.get(job_id, "unknown") not in ACTIVE_STATUSES:
+            # Query jobs that finished or whose status is not known yet
+            self._fetch_result(job_id)
+        return await super().wait(job_id)
+
+    def _update(self, job_id: str, status: str):
+        self.statuses[job_id] = status
+        self.statuses.move_to_end(job_id)
+        if len(self.statuses) > self.max_jobs:
+            self.statuses.popitem(last=False)
+        if status not in ACTIVE_STATUSES:
+            self._active.discard(job_id)
+            if job_id in self._waiters:
+                self._fetch_result(job_id)
+
+    def _received(
+        self, job_id: str, job: Optional[Dict[str, str]], error: Optional[str] = None
+    ):
+        if job is None:
+            self._active.discard(job_id)
+        super()._received(job_id, job, error)
+        if job is not None:
+            self._update(job_id, job["status"])
+
+    def _fetch_result(self, job_id: str):
+        """Query a job together with the other jobs to query at the same time"""
+        self._fetch.add(job_id)
+        if self._fetch_task is None or self._fetch_task.done():
+            self._fetch_task = asyncio.ensure_future(self._fetch_results())
+
+    async def _fetch_results(self):
+        # Let the waiters and events of the same tick accumulate
+        await asyncio.sleep(0)
+        while self._fetch:
+            job_ids = list(self._fetch & set(self._waiters))
+            self._fetch.clear()
+            await self.poll(job_ids)
+
+    async def _listen(self):
+        # The websocket transport ends cancelled subscriptions without raising
+        while not self._closing:
+            try:
+                subscription = self.client.subscriptions.subscribe(JOB_EVENTS)
+                self._listening = True
+                try:
+                    async for result in subscription:
+                        event = result.get("subscribeJobs") or {}
+                        if event.get("jobId") and event.get("type"):
+                            self._update(event["jobId"], event["type"])
+                finally:
+                    self._listening = False
+                    await subscription.aclose()
+                if self._closing:
+                    return
+                log.warning("Job event subscription ended, subscribing again")
+            except SUBSCRIPTION_ERRORS as e:
+                log.warning("Job event subscription failed, polling: %r", e)
+            await asyncio.sleep(self.reconcile_interval)
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        reconciled = loop.time()
+        while self._waiters or self._active:
+            await asyncio.sleep(self.interval)
+            subscriptions = self.client.subscriptions
+            if not (self._listening and subscriptions.connected):
+                # Events are not received, poll the awaited jobs
+                await self.poll()
+            elif (
+                self._synced_generation != subscriptions.generation
+                or loop.time() - reconciled >= self.reconcile_interval
+            ):
+                self._synced_generation = subscriptions.generation
+                reconciled = loop.time()
+                await self.reconcile()
+
+    async def reconcile(self):
+        """Query the statuses of the jobs that have not finished, correcting any
+        event missed while the connection was down"""
+        # Statuses of jobs not submitted through the client may be outdated
+        for job_id, status in list(self.statuses.items()):
+            if status in ACTIVE_STATUSES and job_id not in self._active:
+                del self.statuses[job_id]
+        await self.poll(list(self._active | set(self._waiters)))
@@ -0,0 +1,203 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""Pipelines of job requests whose outputs are inputs of later jobs"""
+
+from __future__ import annotations
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Union
+
+from .pool import AsyncJobPool
+from .request import AsyncJobRequest
+
+
+class UpstreamFailedError(RuntimeError):
+    """Raised for a pipeline step that was not run because a step it depends on
+    failed
+
+    Attributes:
+        step (str): Step that was not run
+        upstream (str): Failed step it depends on
+    """
+
+    def __init__(self, step: str, upstream: str):
+        super().__init__(f"Step {step} not run, step {upstream} failed")
+        self.step = step
+        self.upstream = upstream
+
+
+class PipelineStep(NamedTuple):
+    """Job request of a pipeline with the steps it depends on"""
+
+    name: str
+    request: AsyncJobRequest
+    after: List[str]
+    inputs: Dict[str, Optional[str]]
+
+
+def outputs(request: AsyncJobRequest) -> List[str]:
+    """S3 URIs of the outputs of a job request, from its output parameters and
+    its additional outputs"""
+    uris = [
+        p["value"] for p in request.req_args["parameters"] if p.get("type") == "output"
+    ]
+    return uris + list(request.req_args.get("outputs") or [])
+
+
+class Pipeline:
+    """Runs job requests depending on each other, each job as soon as the jobs it
+    depends on have completed
+
+    Steps declare the steps they run after, and which steps' outputs are added
+    to their inputs. Independent steps run in parallel, within the limits of an
+    ``AsyncJobPool``. Jobs are waited on through subscriptions by default, so a
+    step is submitted as soon as MOTHR pushes the result of its last upstream
+    job, without waiting for a poll::
+
+        pipeline = Pipeline(max_jobs=20)
+        pipeline.add(
+            "extract",
+            AsyncJobRequest(service="extract").add_output("s3://bucket/raw.csv"),
+        )
+        pipeline.add(
+            "clean",
+            AsyncJobRequest(service="clean").add_output("s3://bucket/clean.csv"),
+            inputs={"extract": "--input"},
+        )
+        pipeline.add("report", AsyncJobRequest(service="report"), after=["clean"])
+        results = await pipeline.run()
+
+    When a step fails, the steps depending on it, directly or not, are not run
+    and fail with ``UpstreamFailedError``, while independent steps carry on.
+    With ``fail_fast``, the first failure cancels all running jobs instead.
+
+    Args:
+        max_jobs (int, optional): Maximum number of jobs running at once,
+            default 100
+        service_limits (dict<str, int>, optional): Maximum number of jobs running
+            at once for each service
+        queue_limits (dict<str, int>, optional): Maximum number of jobs running
+            at once for each queue
+        fail_fast (bool, optional): Cancel the pipeline on the first failure,
+            default False
+        kwargs: Additional arguments passed to ``AsyncJobRequest.run_job``,
+            default ``push=True``
+    """
+
+    def __init__(self, **kwargs):
+        self.fail_fast: bool = kwargs.pop("fail_fast", False)
+        kwargs.setdefault("push", True)
+        self.pool = AsyncJobPool(**kwargs)
+        self.steps: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        """Number of steps"""
+        return len(self.steps)
+
+    def add(
+        self,
+        name: str,
+        request: AsyncJobRequest,
+        after: Optional[Iterable[str]] = None,
+        inputs: Optional[Dict[str, Optional[str]]] = None,
+    ) -> Pipeline:
+        """Add a step to the pipeline
+
+        Args:
+            name (str): Unique name of the step
+            request (AsyncJobRequest): Job request run by the step
+            after (iterable<str>, optional): Steps that must complete before the
+                job is submitted
+            inputs (dict<str, str>, optional): Steps whose outputs are added to
+                the inputs of the request, with the name of the input parameter,
+                or None for unnamed inputs. The step also runs after these steps.
+
+        Raises:
+            ValueError: If a step with the same name was already added
+        """
+        if name in self.steps:
+            raise ValueError(f"Step {name} already exists")
+        inputs = dict(inputs or {})
+        after = list(after or [])
+        after += [upstream for upstream in inputs if upstream not in after]
+        self.steps[name] = PipelineStep(name, request, after, inputs)
+        return self
+
+    def order(self) -> List[str]:
+        """Sort the steps so each step comes after the steps it depends on
+
+        Returns:
+            list<str>: Names of the steps
+
+        Raises:
+            ValueError: If a step depends on a missing step or the steps depend
+                on each other in a cycle
+        """
+        ordered: List[str] = []
+        visiting: List[str] = []
+
+        def visit(name: str):
+            if name in ordered:
+                return
+            if name in visiting:
+                cycle = " -> ".join(visiting[visiting.index(name) :] + [name])
+                raise ValueError(f"Steps depend on each other: {cycle}")
+            visiting.append(name)
+            for upstream in self.steps[name].after:
+                if upstream not in self.steps:
+                    raise ValueError(f"Step {name} depends on missing step {upstream}")
+                visit(upstream)
+            visiting.pop()
+            ordered.append(name)
+
+        for name in self.steps:
+            visit(name)
+        return ordered
+
+    async def run(self) -> Dict[str, Union[Dict[str, str], BaseException]]:
+        """Run the pipeline until all steps have completed, failed or been
+        skipped
+
+        Returns:
+            dict<str, dict|Exception>: The job result of each step, by name, or
+                the exception raised by the step
+
+        Raises:
+            ValueError: If the steps can not be ordered, see ``order``
+        """
+        tasks: Dict[str, asyncio.Future] = {}
+        for name in self.order():
+            tasks[name] = asyncio.ensure_future(self._run_step(self.steps[name], tasks))
+        try:
+            when = asyncio.FIRST_EXCEPTION if self.fail_fast else asyncio.ALL_COMPLETED
+            await asyncio.wait(set(tasks.values()), return_when=when)
+        finally:
+            pending = [task for task in tasks.values() if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                # Wait for the jobs to be cancelled on MOTHR
+                await asyncio.wait(pending)
+        return {
+            name: (task.exception() or task.result())
+            if not task.cancelled()
+            else asyncio.CancelledError()
+            for name, task in tasks.items()
+        }
+
+    async def _run_step(
+        self, step: PipelineStep, tasks: Dict[str, asyncio.Future]
+    ) -> Dict[str, str]:
+        upstream = [tasks[name] for name in step.after]
+        if upstream:
+            await asyncio.wait(upstream)
+        for name in step.after:
+            if tasks[name].cancelled() or tasks[name].exception() is not None:
+                raise UpstreamFailedError(step.name, name)
+        for name, parameter in step.inputs.items():
+            for uri in outputs(self.steps[name].request):
+                step.request.add_input(uri, name=parameter)
+        job = await self.pool.submit(step.request)
+        return await job
@@ -0,0 +1,148 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+from __future__ import annotations
+import asyncio
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from gql.transport.exceptions import TransportQueryError
+
+from .documents import status_query
+
+if TYPE_CHECKING:
+    from .client import AsyncMothrClient
+
+
+# Job statuses that have not reached a final state
+ACTIVE_STATUSES = ("submitted", "running")
+
+
+class BatchStatusPoller:
+    """Polls the status of many jobs using one aliased query per tick
+
+    Job IDs awaited through ``wait`` are collected and their statuses are
+    retrieved together on each tick, split into queries of at most
+    ``chunk_size`` jobs. The number of requests sent to MOTHR scales with the
+    number of ticks instead of the number of jobs.
+
+    Args:
+        client (AsyncMothrClient): Client used to send the status queries
+        interval (float, optional): Time, in seconds, between ticks, default 0.25
+        chunk_size (int, optional): Maximum number of jobs queried in a single
+            request, default 100
+    """
+
+    def __init__(self, client: AsyncMothrClient, **kwargs):
+        self.client = client
+        self.interval = kwargs.pop("interval", 0.25)
+        self.chunk_size = kwargs.pop("chunk_size", 100)
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._task: Optional[asyncio.Future] = None
+
+    def __len__(self) -> int:
+        return len(self._waiters)
+
+    async def wait(self, job_id: str) -> Dict[str, str]:
+        """Wait for a job to reach a final state
+
+        Args:
+            job_id (str): Job to wait for
+
+        Returns:
+            dict: The job result
+        """
+        future = asyncio.get_event_loop().create_future()
+        self._waiters.setdefault(job_id, []).append(future)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        try:
+            return await future
+        finally:
+            waiters = self._waiters.get(job_id, [])
+            if future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    del self._waiters[job_id]
+
+    async def close(self):
+        """Stop polling, pending waiters are cancelled"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for waiters in self._waiters.values():
+            for future in waiters:
+                future.cancel()
+        self._waiters.clear()
+
+    async def _run(self):
+        while self._waiters:
+            await asyncio.sleep(self.interval)
+            await self.poll()
+
+    async def poll(self, job_ids: Optional[List[str]] = None):
+        """Query the status of all awaited jobs and wake those that finished
+
+        Args:
+            job_ids (list<str>, optional): Jobs to query instead of the awaited
+                jobs
+        """
+        if job_ids is None:
+            job_ids = list(self._waiters)
+        chunks = [
+            job_ids[i : i + self.chunk_size]
+            for i in range(0, len(job_ids), self.chunk_size)
+        ]
+        await asyncio.gather(*[self._poll_chunk(chunk) for chunk in chunks])
+
+    async def _poll_chunk(self, job_ids: List[str]):
+        variables = {f"j{i}": job_id for i, job_id in enumerate(job_ids)}
+        errors: Dict[str, str] = {}
+        try:
+            with self.client.instrumentation.span("poll", data={"jobs": len(job_ids)}):
+                resp = await self.client.execute(
+                    status_query(len(job_ids)), variable_values=variables
+                )
+        except TransportQueryError as e:
+            if e.data is None:
+                self._fail(job_ids, e)
+                return
+            # Jobs that were found are still returned alongside the errors
+            resp = e.data
+            for error in e.errors or []:
+                path = error.get("path") or [None]
+                errors[path[0]] = error.get("message", str(e))
+        except Exception as e:
+            self._fail(job_ids, e)
+            return
+        for alias, job_id in variables.items():
+            self._received(job_id, resp.get(alias), errors.get(alias))
+
+    def _received(
+        self, job_id: str, job: Optional[Dict[str, str]], error: Optional[str] = None
+    ):
+        """Handle the status of a job returned by a query, None if not found
+        with the error returned for the job, if any"""
+        if job is None:
+            message = f"Job {job_id} not found" + (f": {error}" if error else "")
+            self._resolve(job_id, exception=ValueError(message))
+        elif job["status"] not in ACTIVE_STATUSES:
+            self._resolve(job_id, job=job)
+
+    def _fail(self, job_ids: List[str], exception: Exception):
+        for job_id in job_ids:
+            self._resolve(job_id, exception=exception)
+
+    def _resolve(
+        self,
+        job_id: str,
+        job: Optional[Dict[str, str]] = None,
+        exception: Optional[Exception] = None,
+    ):
+        for future in self._waiters.pop(job_id, []):
+            if future.done():
+                continue
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(job)
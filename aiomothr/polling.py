@@ -0,0 +1,98 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+from __future__ import annotations
+import random
+import statistics
+from typing import Dict, Iterable, Iterator, Optional, Union
+
+
+class PollingStrategy:  # pylint: disable=too-few-public-methods
+    """Poll for the job status at a fixed interval
+
+    Args:
+        interval (float, optional): Time, in seconds, between polls, default 0.25
+    """
+
+    def __init__(self, interval: float = 0.25):
+        self.min_interval = interval
+
+    def intervals(self) -> Iterator[float]:
+        """Time, in seconds, to wait before each poll"""
+        while True:
+            yield self.min_interval
+
+
+class BackoffPolling(PollingStrategy):
+    """Poll for the job status with exponential backoff and jitter
+
+    Polls start at ``min_interval`` and the interval is multiplied by ``factor``
+    after each poll, up to ``max_interval``. If the expected duration of the job
+    is known, the first poll is delayed until the job is expected to finish.
+
+    Args:
+        min_interval (float, optional): Shortest time, in seconds, between polls,
+            default 0.25
+        max_interval (float, optional): Longest time, in seconds, between polls,
+            default 30
+        factor (float, optional): Multiplier applied to the interval after each
+            poll, default 2
+        jitter (float, optional): Fraction of the interval randomly added or
+            removed, so many jobs polling at once are spread out, default 0.1
+        expected_duration (float, optional): Expected time, in seconds, from
+            submission until the job finishes
+
+    Raises:
+        ValueError: If ``min_interval`` is not positive, or ``factor`` is lower
+            than 1, so the interval would never grow
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(kwargs.pop("min_interval", 0.25))
+        self.max_interval: float = kwargs.pop("max_interval", 30.0)
+        self.factor: float = kwargs.pop("factor", 2.0)
+        if self.min_interval <= 0:
+            raise ValueError("Backoff polling requires a positive min_interval")
+        if self.factor < 1:
+            raise ValueError("Backoff polling requires a factor of at least 1")
+        self.jitter: float = kwargs.pop("jitter", 0.1)
+        self.expected_duration: Optional[float] = kwargs.pop("expected_duration", None)
+
+    @classmethod
+    def from_history(cls, jobs: Iterable[Dict], **kwargs) -> BackoffPolling:
+        """Create a strategy using the duration of previous runs of a job
+
+        Args:
+            jobs (list<dict>): Previous jobs including the ``runTime`` and
+                ``waitTime`` fields
+            kwargs: Additional arguments passed to ``BackoffPolling``
+
+        Returns:
+            BackoffPolling: Strategy expecting the median duration of the jobs
+        """
+        durations = [
+            (job.get("runTime") or 0) + (job.get("waitTime") or 0) for job in jobs
+        ]
+        if durations:
+            kwargs.setdefault("expected_duration", statistics.median(durations))
+        return cls(**kwargs)
+
+    def _jitter(self, interval: float) -> float:
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def intervals(self) -> Iterator[float]:
+        """Time, in seconds, to wait before each poll"""
+        if self.expected_duration:
+            yield self._jitter(min(self.expected_duration, self.max_interval))
+        interval = self.min_interval
+        while True:
+            yield self._jitter(interval)
+            interval = min(interval * self.factor, self.max_interval)
+
+
+def polling_strategy(poll_frequency: Union[float, PollingStrategy]) -> PollingStrategy:
+    """Get the polling strategy for a fixed frequency or an existing strategy"""
+    if isinstance(poll_frequency, PollingStrategy):
+        return poll_frequency
+    return PollingStrategy(poll_frequency)
@@ -0,0 +1,195 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+from __future__ import annotations
+import asyncio
+from collections import deque
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from .request import AsyncJobRequest
+
+
+class AsyncJobPool:
+    """Runs job requests with a bounded number of jobs in flight
+
+    Example::
+
+        async with AsyncJobPool(max_jobs=50, service_limits={"echo": 10}) as pool:
+            async for value, result in pool.map(make_request, range(1000000)):
+                print(value, result["result"])
+
+    Args:
+        max_jobs (int, optional): Maximum number of jobs running at once,
+            default 100
+        service_limits (dict<str, int>, optional): Maximum number of jobs running
+            at once for each service
+        queue_limits (dict<str, int>, optional): Maximum number of jobs running
+            at once for each queue
+        kwargs: Additional arguments passed to ``AsyncJobRequest.run_job``,
+            e.g., ``push=True`` or ``return_failed=True``
+    """
+
+    def __init__(self, **kwargs):
+        self.max_jobs: int = kwargs.pop("max_jobs", 100)
+        self.service_limits: Dict[str, int] = kwargs.pop("service_limits", None) or {}
+        self.queue_limits: Dict[str, int] = kwargs.pop("queue_limits", None) or {}
+        self.run_args = kwargs
+        self._semaphores: Dict[Tuple[str, Optional[str]], asyncio.Semaphore] = {}
+        self._pending: Set[asyncio.Future] = set()
+
+    async def __aenter__(self) -> AsyncJobPool:
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.cancel()
+        await self.join()
+
+    def __len__(self) -> int:
+        """Number of jobs submitted to the pool that have not completed"""
+        return len(self._pending)
+
+    def _semaphore(self, kind: str, name: Optional[str], limit: int):
+        key = (kind, name)
+        if key not in self._semaphores:
+            self._semaphores[key] = asyncio.Semaphore(limit)
+        return self._semaphores[key]
+
+    def _limits(self, request: AsyncJobRequest) -> List[asyncio.Semaphore]:
+        # Narrower limits are acquired first so a job waiting on its service or
+        # queue does not hold one of the pool's slots
+        semaphores = []
+        service = request.req_args.get("service")
+        if service in self.service_limits:
+            semaphores.append(
+                self._semaphore("service", service, self.service_limits[service])
+            )
+        queue = request.req_args.get("queue")
+        if queue in self.queue_limits:
+            semaphores.append(self._semaphore("queue", queue, self.queue_limits[queue]))
+        semaphores.append(self._semaphore("pool", None, self.max_jobs))
+        return semaphores
+
+    async def submit(self, request: AsyncJobRequest) -> asyncio.Future:
+        """Run a job request in the pool, waiting until the pool has capacity
+
+        Args:
+            request (AsyncJobRequest): Job request to run
+
+        Returns:
+            `asyncio.Future`: Future resolving to the job result
+        """
+        semaphores = self._limits(request)
+        acquired: List[asyncio.Semaphore] = []
+        try:
+            for semaphore in semaphores:
+                await semaphore.acquire()
+                acquired.append(semaphore)
+        except BaseException:
+            for semaphore in acquired:
+                semaphore.release()
+            raise
+        task = asyncio.ensure_future(self._run(request, semaphores))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    async def _run(
+        self, request: AsyncJobRequest, semaphores: List[asyncio.Semaphore]
+    ) -> Dict[str, str]:
+        try:
+            return await request.run_job(**self.run_args)
+        finally:
+            for semaphore in semaphores:
+                semaphore.release()
+
+    async def as_completed(self) -> AsyncIterator[asyncio.Future]:
+        """Iterate over the jobs in the pool as they complete
+
+        Jobs submitted while iterating are included. Iteration stops once no jobs
+        are running.
+
+        Returns:
+            AsyncIterator<`asyncio.Future`>: Completed jobs, awaiting the future
+                returns the job result or raises the job's exception
+        """
+        while self._pending:
+            done, _ = await asyncio.wait(
+                set(self._pending), return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task
+
+    async def map(
+        self, factory: Callable[[Any], AsyncJobRequest], values: Iterable
+    ) -> AsyncIterator[Tuple[Any, Dict[str, str]]]:
+        """Run a job request for each value, yielding results as jobs complete
+
+        Values are consumed lazily, a new value is only taken once the pool has
+        capacity for another job, so ``values`` can be a generator producing an
+        arbitrary number of values.
+
+        Args:
+            factory (callable): Function creating the job request for a value
+            values (iterable): Values to create job requests for
+
+        Returns:
+            AsyncIterator<tuple>: Pairs of value and job result, in the order the
+                jobs complete
+
+        Raises:
+            RuntimeError: If a job fails, unless the pool was created with
+                ``return_failed=True``. Jobs still running are cancelled, and
+                their cancellation sent to MOTHR, before the exception is raised.
+        """
+        running: Dict[asyncio.Future, Any] = {}
+        completed: Deque[asyncio.Future] = deque()
+        try:
+            for value in values:
+                task = await self.submit(factory(value))
+                running[task] = value
+                task.add_done_callback(completed.append)
+                while completed:
+                    task = completed.popleft()
+                    yield running.pop(task), task.result()
+            while running:
+                if not completed:
+                    await asyncio.wait(
+                        set(running), return_when=asyncio.FIRST_COMPLETED
+                    )
+                while completed:
+                    task = completed.popleft()
+                    yield running.pop(task), task.result()
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                # Wait for the jobs to be cancelled on MOTHR
+                await asyncio.wait(set(running))
+
+    async def join(self):
+        """Wait for all jobs in the pool to complete"""
+        if self._pending:
+            await asyncio.wait(set(self._pending))
+
+    def cancel(self):
+        """Cancel all jobs in the pool
+
+        Jobs are also cancelled on MOTHR, unless the pool was created with
+        ``cancel_abandoned=False``, ``join`` waits for the cancellations to be
+        sent.
+        """
+        for task in self._pending:
+            task.cancel()
@@ -4,13 +4,38 @@
 
 from __future__ import annotations
 import asyncio
+import logging
 import re
-from typing import AsyncIterator, Dict, List, Optional
+import time
+from typing import AsyncIterator, Dict, List, Optional, Union
 from warnings import warn
 
-from gql import gql, Client
-from gql.dsl import DSLSchema
-from .client import AsyncMothrClient
+from gql.utils import to_camel_case
+from .client import AsyncMothrClient, default_client
+from .instrumentation import JOB_STATS_FIELDS
+from .poller import ACTIVE_STATUSES
+from .polling import PollingStrategy, polling_strategy
+from .results import is_final
+from .subscriptions import SUBSCRIPTION_ERRORS
+
+
+log = logging.getLogger(__name__)
+
+# Fields returned by result(), each poll requests them with the status so the
+# poll that sees the job finish also returns its result and statistics
+RESULT_FIELDS = ["jobId", "service", "status", "result", "error"] + JOB_STATS_FIELDS
+
+# Shortest time, in seconds, between checks of the connection while waiting for a
+# pushed result, so polling strategies without delay do not busy-wait
+MIN_PUSH_CHECK_INTERVAL = 0.05
+
+# Pattern of s3://<bucket>/<key> URIs
+S3_URI = re.compile(r"^s3\:\/\/[a-zA-Z0-9\-\.]+[a-zA-Z]\/\S*?$")
+
+
+def _retrieve_exception(task: asyncio.Future):
+    if not task.cancelled():
+        task.exception()
 
 
 class AsyncJobRequest:
@@ -21,7 +46,9 @@ class AsyncJobRequest:
         status (str): Status of the job
 
     Args:
-        client (AsyncMothrClient): Client connection to use for requests
+        client (AsyncMothrClient, optional): Client connection to use for
+            requests, defaults to a client shared by all requests created
+            without a client, see ``default_client``
         service (str): Service being invoked by the request
         parameters (list<dict>, optional): Parameters to pass to the service
         broadcast (str, optional): PubSub channel to broadcast the job result to
@@ -34,18 +61,65 @@ class AsyncJobRequest:
         version (str, optional): Version of the service, default `latest`
     """
 
+    __slots__ = ("_client", "req_args", "job_id", "status")
+
     def __init__(self, **kwargs):
-        self.client = kwargs.pop("client", AsyncMothrClient())
+        self._client: Optional[AsyncMothrClient] = kwargs.pop("client", None)
         kwargs["parameters"] = kwargs.get("parameters", [])
-        kwargs["outputMetadata"] = kwargs.get("output_metadata", {})
+        kwargs["outputMetadata"] = kwargs.pop("output_metadata", {})
         self.req_args = kwargs
         self.job_id = None
         self.status = None
 
+    @property
+    def client(self) -> AsyncMothrClient:
+        """Client used to send requests"""
+        if self._client is None:
+            self._client = default_client()
+        return self._client
+
+    @client.setter
+    def client(self, client: AsyncMothrClient):
+        self._client = client
+
+    @staticmethod
+    def resume(client: Optional[AsyncMothrClient] = None) -> List[AsyncJobRequest]:
+        """Recreate the requests of the journaled jobs that were not seen finishing
+
+        The requests are read from the journal of the client, see
+        ``AsyncMothrClient(journal_path=...)``, with the ID and last known status
+        of their job. Waiting on them, e.g., with ``run_job(batch=True)`` or
+        ``run_job(push=True)``, follows the jobs submitted before the restart
+        instead of submitting them again. The journal is compacted to these jobs.
+
+        Args:
+            client (AsyncMothrClient, optional): Client with the journal, defaults
+                to the shared client
+
+        Returns:
+            list<AsyncJobRequest>: Requests of the jobs, in order of submission
+
+        Raises:
+            ValueError: If the client has no journal
+        """
+        client = client if client is not None else default_client()
+        if client.journal is None:
+            raise ValueError("Client has no journal, have you set journal_path?")
+        requests = []
+        for job in client.journal.compact().values():
+            request = AsyncJobRequest(client=client)
+            request.req_args = job["request"]
+            request.job_id = job["jobId"]
+            request.status = job["status"]
+            if client.mirror is not None:
+                client.mirror.track(request.job_id, request.status)
+            requests.append(request)
+        return requests
+
     @staticmethod
     def is_s3_uri(uri: str) -> bool:
         """Checks if string matches the pattern s3://<bucket>/<key>"""
-        return bool(re.match(r"^s3\:\/\/[a-zA-Z0-9\-\.]+[a-zA-Z]\/\S*?$", uri))
+        return S3_URI.match(uri) is not None
 
     def add_parameter(
         self, value: str, param_type: str = "parameter", name: Optional[str] = None
@@ -93,31 +167,54 @@ class AsyncJobRequest:
         self.req_args["outputMetadata"].update(metadata)
         return self
 
+    def job_request(self) -> Dict:
+        """Build the ``JobRequest`` input sent to MOTHR when submitting the job
+
+        Returns:
+            dict: Request arguments using the field names defined by the schema
+        """
+        request = {to_camel_case(key): value for key, value in self.req_args.items()}
+        request["outputMetadata"] = [
+            {"key": key, "value": value}
+            for key, value in self.req_args["outputMetadata"].items()
+        ]
+        return request
+
     async def submit(self) -> str:
         """Submit a job request to the service endpoint
 
         Returns:
             str: The unique job identifier
         """
-        q = self.client.ds.Mutation.submit_job.args(request=self.req_args).select(
-            self.client.ds.JobRequestResponse.job.select(
-                self.client.ds.Job.job_id, self.client.ds.Job.status
+        with self.client.instrumentation.span("submit") as span:
+            resp = await self.client.execute_operation(
+                "Mutation",
+                "submitJob",
+                ["job.jobId", "job.status"],
+                {"request": self.job_request()},
             )
-        )
-        async with Client(
-            transport=self.client.transport, schema=self.client.schema
-        ) as sess:
-            ds = DSLSchema(sess)
-            resp = await ds.mutate(q)
-        if "errors" in resp:
-            raise ValueError("Error submitting job request: " + resp["errors"])
-        self.job_id = resp["submitJob"]["job"]["jobId"]
-        self.status = resp["submitJob"]["job"]["status"]
+            if "errors" in resp:
+                raise ValueError("Error submitting job request: " + resp["errors"])
+            self.job_id = resp["submitJob"]["job"]["jobId"]
+            self.status = resp["submitJob"]["job"]["status"]
+            span.set(job_id=self.job_id, status=self.status)
+        if self.client.mirror is not None:
+            self.client.mirror.track(self.job_id, self.status)  # type: ignore
+        if self.client.journal is not None:
+            self.client.journal.submitted(
+                self.job_id, self.status, self.req_args  # type: ignore
+            )
+            # Journaled before returning, so the job is not submitted again
+            # after a restart
+            await self.client.journal.written()
         return self.job_id
 
     async def query_job(self, fields: List[str]) -> Dict[str, str]:
         """Query information about the job request
 
+        When the client has a result store, the records of finished jobs are
+        kept there and later queries of the same fields are served from it.
+
         Args:
             fields (list<str>): Fields to return in the query response
 
@@ -130,23 +227,34 @@ class AsyncJobRequest:
         if self.job_id is None:
             raise ValueError("Job ID is None, have you submitted the job?")
 
-        fields = [
-            self.client.resolve_field(self.client.ds.Job, field) for field in fields
-        ]
-        q = self.client.ds.Query.job.args(jobId=self.job_id).select(*fields)
-        async with Client(
-            transport=self.client.transport, schema=self.client.schema
-        ) as sess:
-            ds = DSLSchema(sess)
-            resp = await ds.query(q)
-        return resp["job"]
+        results = self.client.results
+        if results is not None:
+            stored = results.get(self.job_id, fields)
+            if stored is not None:
+                return stored
+        resp = await self.client.execute_operation(
+            "Query", "job", fields, {"jobId": self.job_id}
+        )
+        job = resp["job"]
+        if results is not None and job is not None:
+            if is_final(job.get("status", self.status)):
+                results.set(self.job_id, fields, job)
+        return job
 
     async def check_status(self) -> str:
         """Check the current status of the job request
 
+        When the client mirrors job statuses, the status is read from the mirror
+        without querying MOTHR.
+
         Returns:
             str: Job status
         """
+        mirror = self.client.mirror
+        if mirror is not None and self.job_id is not None:
+            status = mirror.status(self.job_id)
+            if status is not None:
+                return status
         job = await self.query_job(fields=["status"])
         return job["status"]
 
@@ -156,56 +264,209 @@ class AsyncJobRequest:
         Returns:
             dict: Complete response from the job query
         """
-        return await self.query_job(
-            fields=["jobId", "service", "status", "result", "error"]
+        return await self.query_job(fields=RESULT_FIELDS)
+
+    async def cancel(self) -> Optional[Dict[str, str]]:
+        """Cancel the job, freeing the worker running it
+
+        Returns:
+            dict: The ``jobId`` and ``status`` of the job after the cancellation,
+                None if the job does not exist
+
+        Raises:
+            ValueError: If the job was not submitted
+        """
+        if self.job_id is None:
+            raise ValueError("Job ID is None, have you submitted the job?")
+        resp = await self.client.execute_operation(
+            "Mutation", "cancelJob", ["jobId", "status"], {"jobId": self.job_id}
         )
+        job = resp["cancelJob"]
+        if job is not None:
+            self.status = job["status"]
+            if self.client.journal is not None and is_final(self.status):
+                self.client.journal.finished(self.job_id, self.status)  # type: ignore
+        return job
+
+    async def _cancel_abandoned(self):
+        """Cancel a job that is no longer waited on, unless it already finished"""
+        if self.job_id is None or is_final(self.status):
+            return
+        try:
+            # Shielded so the job is cancelled even if the caller is cancelled again
+            await asyncio.shield(self.cancel())
+        except Exception as e:  # pylint: disable=broad-except
+            log.warning("Could not cancel job %s: %r", self.job_id, e)
+
+    async def _abandon(self, task: asyncio.Future, cancel_abandoned: bool):
+        """Stop waiting on the job, cancelling it if ``cancel_abandoned``"""
+        task.cancel()
+        # Waited on so a submission in progress sets the job ID before the job
+        # is cancelled
+        await asyncio.wait({task})
+        task.add_done_callback(_retrieve_exception)
+        if cancel_abandoned:
+            await self._cancel_abandoned()
 
     async def subscribe(self) -> Dict:
-        """Subscribe to job"""
-        s = gql(
-            f"""
-            subscription {{
-                subscribeJobComplete(jobId: "{self.job_id}") {{
-                    jobId
-                    service
-                    status
-                    result
-                    error
-                }}
-            }}
+        """Subscribe to job
+
+        Returns:
+            dict: The job pushed by the server once it completes
         """
-        )
-        async with Client(
-            transport=self.client.ws_transport, schema=self.client.schema
-        ) as sess:
-            result = [r async for r in sess.subscribe(s)]
-        return result[0]["subscribeJobComplete"]
+        return await self.client.subscriptions.job_complete(self.job_id)
 
     async def subscribe_messages(self) -> AsyncIterator[str]:
         """Subscribe to job messages"""
-        s = gql(
-            f"""
-            subscription {{
-                subscribeJobMessages(jobId: "{self.job_id}")
-            }}
+        async for message in self.client.subscriptions.job_messages(self.job_id):
+            yield message
+
+    async def wait(
+        self,
+        poll_frequency: Union[float, PollingStrategy] = 0.25,
+        push: bool = False,
+        batch: bool = False,
+    ) -> Dict[str, str]:
+        """Wait for a submitted job to finish
+
+        Args:
+            poll_frequency (float|PollingStrategy, optional): Frequency, in seconds,
+                to poll for job status, or a ``PollingStrategy`` deciding when to
+                poll. Default, poll every 0.25 seconds.
+            push (bool, optional): Wait for the job to be pushed by the
+                ``subscribeJobComplete`` subscription instead of polling. Polling
+                is only used if the subscription can not be established or is
+                dropped. Default False
+            batch (bool, optional): Poll for the job status using the client's
+                batch poller, which queries the status of all waiting jobs
+                together, instead of polling individually. Default False
+
+        Returns:
+            dict: The job result
         """
+        strategy = polling_strategy(poll_frequency)
+        if not self.client.instrumentation.hooks:
+            return await self._wait(strategy, push, batch)
+        start = time.perf_counter()
+        job = await self._wait(strategy, push, batch)
+        self._record_result(job, time.perf_counter() - start)
+        return job
+
+    async def _wait(
+        self, strategy: PollingStrategy, push: bool, batch: bool
+    ) -> Dict[str, str]:
+        job = await self._wait_job(strategy, push, batch)
+        if self.client.journal is not None:
+            self.client.journal.finished(self.job_id, job["status"])  # type: ignore
+        return job
+
+    async def _wait_job(
+        self, strategy: PollingStrategy, push: bool, batch: bool
+    ) -> Dict[str, str]:
+        if self.client.mirror is not None:
+            return await self._wait_mirror()
+        if push:
+            return await self._wait_push(strategy, batch)
+        if batch:
+            return await self._wait_batch()
+        return await self._wait_poll(strategy)
+
+    def _record_result(self, job: Dict[str, str], duration: float):
+        """Emit the result event, with the job statistics reported by MOTHR"""
+        stats = {field: job[field] for field in JOB_STATS_FIELDS if field in job}
+        self.client.instrumentation.emit(
+            "result",
+            duration=duration,
+            job_id=self.job_id,
+            status=job["status"],
+            data=stats,
         )
-        async with Client(
-            transport=self.client.ws_transport, schema=self.client.schema
-        ) as sess:
-            async for result in sess.subscribe(s):
-                yield result["subscribeJobMessages"]
-
-    async def run_job(
-        self, poll_frequency: float = 0.25, return_failed: bool = False
+
+    async def _wait_poll(self, strategy: PollingStrategy) -> Dict[str, str]:
+        instrumentation = self.client.instrumentation
+        for interval in strategy.intervals():
+            await asyncio.sleep(interval)
+            with instrumentation.span("poll", job_id=self.job_id) as span:
+                job = await self.result()
+                span.set(status=job["status"])
+            self.status = job["status"]
+            if self.status not in ACTIVE_STATUSES:
+                return job
+        raise RuntimeError(f"Polling for job {self.job_id} stopped")
+
+    async def _wait_mirror(self) -> Dict[str, str]:
+        job = await self.client.mirror.wait(self.job_id)  # type: ignore
+        self.status = job["status"]
+        return job
+
+    async def _wait_batch(self) -> Dict[str, str]:
+        job = await self.client.poller.wait(self.job_id)
+        self.status = job["status"]
+        return job
+
+    async def _wait_push(
+        self, strategy: PollingStrategy, batch: bool
+    ) -> Dict[str, str]:
+        subscriptions = self.client.subscriptions
+        subscription = asyncio.ensure_future(self.subscribe())
+        generation = None
+        interval = max(strategy.min_interval, MIN_PUSH_CHECK_INTERVAL)
+        try:
+            while True:
+                done, _ = await asyncio.wait({subscription}, timeout=interval)
+                if done:
+                    return await subscription
+                # The job can finish before the subscription is registered with the
+                # server or while the connection is down, check the status once
+                # each time the connection is (re)opened in case the push was missed
+                if subscriptions.connected and generation != subscriptions.generation:
+                    generation = subscriptions.generation
+                    job = await self.result()
+                    if job["status"] not in ACTIVE_STATUSES:
+                        return job
+        except SUBSCRIPTION_ERRORS as e:
+            log.warning("Subscription to job %s failed, polling: %r", self.job_id, e)
+            if batch:
+                return await self._wait_batch()
+            return await self._wait_poll(strategy)
+        finally:
+            subscription.cancel()
+            # A subscription cut short can still end with an error, retrieve it so
+            # it is not reported as never retrieved
+            subscription.add_done_callback(_retrieve_exception)
+
+    async def run_job(  # pylint: disable=too-many-arguments
+        self,
+        poll_frequency: Union[float, PollingStrategy] = 0.25,
+        return_failed: bool = False,
+        push: bool = False,
+        batch: bool = False,
+        timeout: Optional[float] = None,
+        cancel_abandoned: bool = True,
     ) -> Dict[str, str]:
         """Execute the job request
 
+        A request whose job was already submitted, e.g., returned by ``resume``,
+        is not submitted again, only waited on. If waiting is cancelled or times
+        out, the job is cancelled with ``cancelJob`` so it stops using a worker.
+
         Args:
-            poll_frequency (float, optional): Frequency, in seconds, to poll for job
-                status. Default, poll every 0.25 seconds.
+            poll_frequency (float|PollingStrategy, optional): Frequency, in seconds,
+                to poll for job status, or a ``PollingStrategy`` such as
+                ``BackoffPolling``. Default, poll every 0.25 seconds.
             return_failed (bool, optional): Return failed job results instead of
                 raising an exception. Default False
+            push (bool, optional): Wait for the job result to be pushed through a
+                subscription, falling back to polling if the websocket connection
+                can not be established or is dropped. Default False
+            batch (bool, optional): Poll for the job status together with other
+                jobs waiting on the same client, see ``AsyncMothrClient.poller``.
+                Default False
+            timeout (float, optional): Time, in seconds, after which the job is
+                cancelled and ``asyncio.TimeoutError`` is raised. By default the
+                job is waited on until it finishes.
+            cancel_abandoned (bool, optional): Cancel the job when waiting is
+                cancelled or times out, default True
 
         Returns:
             dict: The job result
@@ -224,14 +485,29 @@ class AsyncJobRequest:
             RuntimeError: If job returns a status of failed, unless explicitly
                 specified to return failed jobs by setting `return_failed`
                 parameter to True
+            asyncio.TimeoutError: If the job did not finish within ``timeout``
         """
-        job_id = await self.submit()
-        status = await self.check_status()
-        while status in ["submitted", "running"]:
-            status = await self.check_status()
-            await asyncio.sleep(poll_frequency)
-
-        result = await self.result()
-        if status != "complete" and return_failed is False:
-            raise RuntimeError("Job {} failed: {}".format(job_id, result["error"]))
+
+        async def submit_and_wait() -> Dict[str, str]:
+            if self.job_id is None:
+                await self.submit()
+            return await self.wait(
+                poll_frequency=poll_frequency, push=push, batch=batch
+            )
+
+        # Only the job's own deadline or cancelling run_job abandon the job,
+        # errors raised while submitting or waiting, including timeouts of
+        # single requests, are raised without cancelling it
+        task = asyncio.ensure_future(submit_and_wait())
+        try:
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+        except asyncio.CancelledError:
+            await self._abandon(task, cancel_abandoned)
+            raise
+        if not done:
+            await self._abandon(task, cancel_abandoned)
+            raise asyncio.TimeoutError()
+        result = task.result()
+        if result["status"] != "complete" and return_failed is False:
+            raise RuntimeError(f"Job {self.job_id} failed: {result['error']}")
         return result
@@ -0,0 +1,289 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""Timeouts, retries and circuit breaking for requests sent to MOTHR
+
+Requests that fail because MOTHR, or the network, is unavailable are retried
+with jittered exponential backoff within a deadline. Queries are retried on any
+such failure. Mutations, e.g., ``submitJob``, are only retried when the
+connection could not be established, since a mutation that reached MOTHR must
+not be applied twice. Errors returned by MOTHR for a request, such as an
+unknown job, are never retried.
+"""
+
+from __future__ import annotations
+import asyncio
+import logging
+import random
+import re
+import time
+from typing import Awaitable, Callable, Iterator, Optional, TypeVar
+
+import aiohttp
+from gql.transport.exceptions import TransportProtocolError, TransportServerError
+
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# HTTP status codes of responses worth retrying
+RETRY_STATUSES = (429, 502, 503, 504)
+STATUS = re.compile(r"^(\d{3})\b")
+
+
+class CircuitOpenError(Exception):
+    """Raised without sending a request while MOTHR is considered unavailable"""
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Check if a request failed because MOTHR or the network was unavailable"""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, TransportServerError):
+        match = STATUS.match(str(error))
+        return match is None or int(match.group(1)) in RETRY_STATUSES
+    return isinstance(
+        error,
+        (OSError, asyncio.TimeoutError, aiohttp.ClientError, TransportProtocolError),
+    )
+
+
+def is_connect_error(error: BaseException) -> bool:
+    """Check if a request failed before it was sent to MOTHR"""
+    return isinstance(error, (aiohttp.ClientConnectorError, ConnectionRefusedError))
+
+
+class RetryBudget:
+    """Limits retries to a fraction of all requests
+
+    Retries are only sent while the budget has tokens. Each request adds
+    ``ratio`` tokens and each retry takes one, so an outage does not multiply
+    the load on MOTHR by the number of attempts.
+
+    Args:
+        ratio (float, optional): Retries allowed for each request, default 0.2
+        reserve (int, optional): Retries allowed before any request has been
+            made, default 10
+        capacity (int, optional): Maximum number of tokens saved, default 100
+    """
+
+    def __init__(self, **kwargs):
+        self.ratio: float = kwargs.pop("ratio", 0.2)
+        self.capacity: float = kwargs.pop("capacity", 100)
+        self.tokens: float = kwargs.pop("reserve", 10)
+
+    def deposit(self):
+        """Record a request"""
+        self.tokens = min(self.tokens + self.ratio, self.capacity)
+
+    def withdraw(self) -> bool:
+        """Take a token for a retry, returns False if the budget is spent"""
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CircuitBreaker:
+    """Fails requests fast while MOTHR is unavailable
+
+    After ``failure_threshold`` consecutive transient failures the circuit
+    opens and requests raise ``CircuitOpenError`` without being sent. Once
+    ``reset_timeout`` has passed a single trial request is let through, the
+    circuit closes if it succeeds and opens again otherwise.
+
+    Args:
+        failure_threshold (int, optional): Consecutive failures opening the
+            circuit, default 5
+        reset_timeout (float, optional): Time, in seconds, the circuit stays open
+            before a trial request, default 10
+        clock (callable, optional): Function returning the current time in
+            seconds, default ``time.monotonic``
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, **kwargs):
+        self.failure_threshold: int = kwargs.pop("failure_threshold", 5)
+        self.reset_timeout: float = kwargs.pop("reset_timeout", 10.0)
+        self.clock: Callable[[], float] = kwargs.pop("clock", time.monotonic)
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+
+    def check(self):
+        """Check a request can be sent
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+        """
+        if self.state == self.OPEN:
+            if self.clock() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError("MOTHR is unavailable, circuit is open")
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._trial:
+                raise CircuitOpenError("MOTHR is unavailable, awaiting trial request")
+            self._trial = True
+
+    def record_success(self):
+        """Record a request answered by MOTHR"""
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial = False
+
+    def record_failure(self):
+        """Record a request that failed because MOTHR was unavailable"""
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                log.warning("Opening circuit after %d failures", self.failures)
+            self.state = self.OPEN
+            self._opened_at = self.clock()
+        self._trial = False
+
+    def release(self):
+        """Release a trial request that was cancelled before completing"""
+        self._trial = False
+
+
+async def wait_for(func: Callable[[], Awaitable[T]], timeout: Optional[float]) -> T:
+    """Await ``func()``, raising ``asyncio.TimeoutError`` after ``timeout`` seconds
+
+    Unlike ``asyncio.wait_for`` on Python 3.8, a cancellation arriving as the
+    request completes is not lost, so the cancelled caller does not carry on.
+    """
+    if timeout is None:
+        return await func()
+    task = asyncio.ensure_future(func())
+    try:
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+    except asyncio.CancelledError:
+        task.cancel()
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        raise
+    if not done:
+        task.cancel()
+        # Stopped before retrying, like asyncio.wait_for
+        await asyncio.wait({task})
+        if not task.cancelled():
+            task.exception()
+        raise asyncio.TimeoutError()
+    return task.result()
+
+
+class RetryPolicy:
+    """Timeouts and retries applied to requests
+
+    Args:
+        timeout (float, optional): Time, in seconds, allowed for each attempt,
+            default 30. None for no limit.
+        deadline (float, optional): Time, in seconds, allowed for the request
+            including all retries, default 60. None for no limit.
+        retries (int, optional): Maximum number of retries, default 3
+        min_delay (float, optional): Delay, in seconds, before the first retry,
+            default 0.1
+        max_delay (float, optional): Maximum delay, in seconds, between retries,
+            default 5
+    """
+
+    def __init__(self, **kwargs):
+        self.timeout: Optional[float] = kwargs.pop("timeout", 30.0)
+        self.deadline: Optional[float] = kwargs.pop("deadline", 60.0)
+        self.retries: int = kwargs.pop("retries", 3)
+        self.min_delay: float = kwargs.pop("min_delay", 0.1)
+        self.max_delay: float = kwargs.pop("max_delay", 5.0)
+
+    def delays(self) -> Iterator[float]:
+        """Time, in seconds, to wait before each retry
+
+        Delays grow exponentially with full jitter, spreading out the retries
+        of requests that failed together.
+        """
+        for attempt in range(self.retries):
+            yield random.uniform(0, min(self.min_delay * 2 ** attempt, self.max_delay))
+
+    async def run(
+        self,
+        func: Callable[[], Awaitable[T]],
+        idempotent: bool = True,
+        breaker: Optional[CircuitBreaker] = None,
+        budget: Optional[RetryBudget] = None,
+    ) -> T:
+        """Run a request, retrying transient failures
+
+        Args:
+            func (callable): Coroutine function sending the request
+            idempotent (bool, optional): Whether the request can safely be sent
+                more than once, otherwise it is only retried if it was not sent.
+                Default True
+            breaker (CircuitBreaker, optional): Circuit breaker checked before
+                each attempt
+            budget (RetryBudget, optional): Budget retries are taken from
+
+        Returns:
+            The result of ``func``
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open
+            asyncio.TimeoutError: If the request did not complete in time
+        """
+        loop = asyncio.get_event_loop()
+        deadline = None if self.deadline is None else loop.time() + self.deadline
+        delays = self.delays()
+        if budget is not None:
+            budget.deposit()
+        while True:
+            timeout = self.timeout
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            if breaker is not None:
+                breaker.check()
+            try:
+                result = await wait_for(func, timeout)
+            except asyncio.CancelledError:
+                if breaker is not None:
+                    breaker.release()
+                raise
+            except Exception as e:
+                delay = self._retry_delay(e, idempotent, delays, deadline, breaker)
+                if delay is None or (budget is not None and not budget.withdraw()):
+                    raise
+                log.debug("Retrying request in %.2fs after %r", delay, e)
+                await asyncio.sleep(delay)
+                continue
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+    @staticmethod
+    def _retry_delay(
+        error: Exception,
+        idempotent: bool,
+        delays: Iterator[float],
+        deadline: Optional[float],
+        breaker: Optional[CircuitBreaker],
+    ) -> Optional[float]:
+        """Get the delay before retrying a failed request, None if the request
+        should not be retried"""
+        if not is_transient_error(error):
+            # MOTHR answered, the request itself was rejected
+            if breaker is not None:
+                breaker.record_success()
+            return None
+        if breaker is not None:
+            breaker.record_failure()
+        if not (idempotent or is_connect_error(error)):
+            return None
+        delay = next(delays, None)
+        if delay is None:
+            return None
+        if deadline is not None and asyncio.get_event_loop().time() + delay >= deadline:
+            return None
+        return delay
@@ -0,0 +1,232 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""Local store of the records of jobs that reached a final state"""
+
+from __future__ import annotations
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .poller import ACTIVE_STATUSES
+from .writer import BackgroundWriter
+
+
+def is_final(status: Optional[str]) -> bool:
+    """Whether a job status is final, i.e., the job record no longer changes"""
+    return status is not None and status not in ACTIVE_STATUSES
+
+
+def _fields_key(fields: Iterable[str]) -> str:
+    return ",".join(sorted(set(fields)))
+
+
+class SQLiteResultBackend:
+    """Persistent store of job records in an SQLite database
+
+    Records are stored as JSON, by job ID and field set. The database is opened
+    on first use, and again after ``close``. Records stored and deleted while an
+    event loop is running are written in a worker thread, those of the same
+    iteration of the loop in a single transaction, so commits do not stall the
+    loop. The database is in WAL mode and records are read with a connection
+    of their own, so lookups do not wait for the writes in progress. ``close``
+    writes the records not written yet.
+
+    Args:
+        path (str): Path of the database file, created if it does not exist
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._reader: Optional[sqlite3.Connection] = None
+        self._writer = BackgroundWriter(self._write, "aiomothr-results")
+        # Held while writing, by the worker thread or the loop's thread
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connection used to write, with the lock held"""
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            # Readers see the last commit while a write is in progress
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "job_id TEXT NOT NULL, fields TEXT NOT NULL, record TEXT NOT NULL, "
+                "PRIMARY KEY (job_id, fields))"
+            )
+            self._db.commit()
+        return self._db
+
+    def _read_connection(self) -> sqlite3.Connection:
+        """Connection used to read, without the lock"""
+        if self._reader is None:
+            # The table is created when the write connection is opened
+            if self._db is None:
+                with self._lock:
+                    self._connection()
+            self._reader = sqlite3.connect(self.path, check_same_thread=False)
+        return self._reader
+
+    def get(self, job_id: str, fields: str) -> Optional[str]:
+        """Get the serialized record of a job, None if it is not stored"""
+        for operation, key, record in reversed(self._writer.items()):
+            if key is None or key == job_id or key == (job_id, fields):
+                return record if operation == "set" else None
+        row = (
+            self._read_connection()
+            .execute(
+                "SELECT record FROM results WHERE job_id = ? AND fields = ?",
+                (job_id, fields),
+            )
+            .fetchone()
+        )
+        return row[0] if row is not None else None
+
+    def set(self, job_id: str, fields: str, record: str):
+        """Store the serialized record of a job"""
+        self._writer.add(("set", (job_id, fields), record))
+
+    def delete(self, job_id: Optional[str] = None):
+        """Remove the records of a job, or all records if no job is given"""
+        self._writer.add(("delete", job_id, None))
+
+    def _write(self, operations: List[Tuple[str, Any, Optional[str]]]):
+        with self._lock:
+            db = self._connection()
+            for operation, key, record in operations:
+                if operation == "set":
+                    db.execute(
+                        "INSERT OR REPLACE INTO results (job_id, fields, record) "
+                        "VALUES (?, ?, ?)",
+                        (*key, record),
+                    )
+                elif key is None:
+                    db.execute("DELETE FROM results")
+                else:
+                    db.execute("DELETE FROM results WHERE job_id = ?", (key,))
+            db.commit()
+
+    def close(self):
+        """Write the pending records and close the database"""
+        self._writer.close()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class ResultStore:
+    """Cache of the records of jobs that reached a final state
+
+    Records of ``complete``, ``failed`` and ``cancelled`` jobs never change, so
+    once retrieved they are kept by job ID and set of queried fields. Records
+    are kept in memory up to ``maxsize`` entries and ``max_bytes`` of
+    serialized JSON, least recently used first out. When a backend is given,
+    records are also written to it and looked up there when they are not in
+    memory, so they survive evictions and restarts.
+
+    Args:
+        maxsize (int, optional): Maximum number of records kept in memory,
+            default 1024
+        max_bytes (int, optional): Maximum total size, in bytes of serialized
+            JSON, of the records kept in memory. By default only ``maxsize``
+            applies.
+        backend (SQLiteResultBackend, optional): Persistent store of the records
+    """
+
+    def __init__(self, **kwargs):
+        self.maxsize: int = kwargs.pop("maxsize", 1024)
+        self.max_bytes: Optional[int] = kwargs.pop("max_bytes", None)
+        self.backend: Optional[SQLiteResultBackend] = kwargs.pop("backend", None)
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._records: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        """Number of records kept in memory"""
+        return len(self._records)
+
+    def get(self, job_id: str, fields: Iterable[str]) -> Optional[Dict]:
+        """Get the record of a job
+
+        Args:
+            job_id (str): Job ID
+            fields (iterable<str>): Queried fields
+
+        Returns:
+            dict: The stored record, None if it is not stored
+        """
+        key = (job_id, _fields_key(fields))
+        entry = self._records.get(key)
+        if entry is not None:
+            self._records.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if self.backend is not None:
+            serialized = self.backend.get(*key)
+            if serialized is not None:
+                record = json.loads(serialized)
+                self._remember(key, record, len(serialized))
+                self.hits += 1
+                return record
+        self.misses += 1
+        return None
+
+    def set(self, job_id: str, fields: Iterable[str], record: Dict):
+        """Store the record of a job that reached a final state
+
+        Args:
+            job_id (str): Job ID
+            fields (iterable<str>): Queried fields
+            record (dict): Query result for the job
+        """
+        key = (job_id, _fields_key(fields))
+        if self.backend is None and self.max_bytes is None:
+            self._remember(key, record, 0)
+            return
+        serialized = json.dumps(record)
+        self._remember(key, record, len(serialized))
+        if self.backend is not None:
+            self.backend.set(*key, serialized)
+
+    def _remember(self, key: Tuple[str, str], record: Dict, size: int):
+        previous = self._records.pop(key, None)
+        if previous is not None:
+            self.size -= previous[1]
+        self._records[key] = (record, size)
+        self.size += size
+        while self._records and (
+            len(self._records) > self.maxsize
+            or (self.max_bytes is not None and self.size > self.max_bytes)
+        ):
+            _, (_, evicted) = self._records.popitem(last=False)
+            self.size -= evicted
+
+    def invalidate(self, job_id: Optional[str] = None):
+        """Remove the records of a job, from memory and the backend
+
+        Args:
+            job_id (str, optional): Job whose records are removed, if not given
+                all records are removed
+        """
+        if job_id is None:
+            self._records.clear()
+            self.size = 0
+        else:
+            for key in [k for k in self._records if k[0] == job_id]:
+                self.size -= self._records.pop(key)[1]
+        if self.backend is not None:
+            self.backend.delete(job_id)
+
+    def close(self):
+        """Close the backend, it is opened again when next used"""
+        if self.backend is not None:
+            self.backend.close()
@@ -0,0 +1,74 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""Loading of the MOTHR GraphQL schema
+
+The schema is built once per process, the first time it is needed, and is
+shared by every client. It is loaded from ``schema.json``, an introspection
+result precompiled from ``schema.graphql``, which avoids parsing the SDL.
+``schema.json`` must be regenerated whenever ``schema.graphql`` changes::
+
+    python -m aiomothr.schema
+"""
+
+import json
+import os
+from functools import lru_cache
+
+from gql import Client
+from gql.dsl import DSLSchema
+from graphql import (
+    GraphQLSchema,
+    build_ast_schema,
+    build_client_schema,
+    introspection_from_schema,
+    parse,
+)
+
+
+SCHEMA_DIR = os.path.realpath(os.path.dirname(__file__))
+SDL_PATH = os.path.join(SCHEMA_DIR, "schema.graphql")
+INTROSPECTION_PATH = os.path.join(SCHEMA_DIR, "schema.json")
+
+
+def build_schema_from_sdl(path: str = SDL_PATH) -> GraphQLSchema:
+    """Build the schema by parsing the SDL"""
+    with open(path, encoding="utf-8") as f:
+        return build_ast_schema(parse(f.read()))
+
+
+@lru_cache(maxsize=None)
+def load_schema() -> GraphQLSchema:
+    """Get the schema shared by all clients in the process
+
+    Returns:
+        `graphql.GraphQLSchema`: The MOTHR schema
+    """
+    try:
+        with open(INTROSPECTION_PATH, encoding="utf-8") as f:
+            return build_client_schema(json.load(f))
+    except FileNotFoundError:
+        return build_schema_from_sdl()
+
+
+@lru_cache(maxsize=None)
+def dsl_schema() -> DSLSchema:
+    """Get the DSL schema shared by all clients in the process
+
+    Returns:
+        `gql.dsl.DSLSchema`
+    """
+    return DSLSchema(Client(schema=load_schema()))
+
+
+def compile_schema(path: str = INTROSPECTION_PATH):
+    """Write the introspection result of ``schema.graphql`` to ``path``"""
+    introspection = introspection_from_schema(build_schema_from_sdl())
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(introspection, f, separators=(",", ":"), sort_keys=True)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    compile_schema()
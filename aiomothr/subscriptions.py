@@ -0,0 +1,235 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+from __future__ import annotations
+import asyncio
+import json
+import logging
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Optional
+
+from gql import gql, Client
+from gql.client import AsyncClientSession
+from gql.transport.exceptions import (
+    TransportClosed,
+    TransportError,
+    TransportQueryError,
+)
+from gql.transport.websockets import WebsocketsTransport
+from graphql import DocumentNode
+from websockets.exceptions import WebSocketException
+from .instrumentation import Instrumentation
+
+
+log = logging.getLogger(__name__)
+
+# Errors raised when the websocket connection can not be established or is dropped
+CONNECTION_ERRORS = (OSError, asyncio.TimeoutError, TransportError, WebSocketException)
+
+# Errors raised when a subscription can not be established or is dropped
+SUBSCRIPTION_ERRORS = CONNECTION_ERRORS + (TransportQueryError,)
+
+JOB_COMPLETE = gql(
+    """
+    subscription ($jobId: ID!) {
+        subscribeJobComplete(jobId: $jobId) {
+            jobId
+            service
+            status
+            result
+            error
+            waitTime
+            runTime
+            maxMemory
+            cpuUsage
+        }
+    }
+"""
+)
+
+JOB_MESSAGES = gql(
+    """
+    subscription ($jobId: ID!) {
+        subscribeJobMessages(jobId: $jobId)
+    }
+"""
+)
+
+EVENT = gql(
+    """
+    subscription ($event: String!) {
+        subscribeEvent(event: $event) {
+            channel
+            message
+        }
+    }
+"""
+)
+
+
+def _root_field(document: DocumentNode) -> str:
+    operation = document.definitions[0]
+    return operation.selection_set.selections[0].name.value  # type: ignore
+
+
+class SubscriptionManager:
+    """Multiplexes subscriptions over a single graphql-ws connection
+
+    The websocket connection is opened when the first subscription is made and
+    is shared by every subscription made through the manager. If the connection
+    is dropped it is reopened and active subscriptions are sent again.
+
+    Attributes:
+        generation (int): Number of times the connection has been opened.
+            Messages sent by the server while the connection was down are lost,
+            a change in generation can be used to detect that case.
+
+    Args:
+        url (str): Websocket endpoint
+        headers (dict, optional): Headers sent when opening the connection
+        max_retries (int, optional): Number of times a subscription is sent again
+            after the connection is dropped before giving up, default 3
+        retry_delay (float, optional): Initial delay, in seconds, before
+            reconnecting. The delay doubles after each attempt. Default 0.5
+        max_retry_delay (float, optional): Maximum delay, in seconds, before
+            reconnecting, default 10
+        instrumentation (Instrumentation, optional): Instrumentation receiving
+            ``subscribe`` and ``message`` events
+    """
+
+    def __init__(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs):
+        self.url = url
+        self.headers = headers
+        self.max_retries = kwargs.pop("max_retries", 3)
+        self.retry_delay = kwargs.pop("retry_delay", 0.5)
+        self.max_retry_delay = kwargs.pop("max_retry_delay", 10.0)
+        self.instrumentation: Instrumentation = kwargs.pop(
+            "instrumentation", Instrumentation()
+        )
+        self.generation = 0
+        self._transport: Optional[WebsocketsTransport] = None
+        self._session: Optional[AsyncClientSession] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def connected(self) -> bool:
+        """Whether the websocket connection is open"""
+        return self._session is not None
+
+    async def connect(self) -> AsyncClientSession:
+        """Open the websocket connection, if it is not already open
+
+        Returns:
+            `gql.client.AsyncClientSession`: Session shared by all subscriptions
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._session is None:
+                transport = WebsocketsTransport(url=self.url, headers=self.headers)
+                await transport.connect()
+                self._transport = transport
+                self._session = AsyncClientSession(client=Client(transport=transport))
+                self.generation += 1
+        return self._session
+
+    async def close(self):
+        """Close the websocket connection, ending all active subscriptions"""
+        if self._transport is not None:
+            transport = self._transport
+            self._transport, self._session = None, None
+            await transport.close()
+
+    async def _drop(self, session: AsyncClientSession):
+        """Discard a failed connection unless it has already been replaced"""
+        if session is self._session:
+            await self.close()
+
+    async def subscribe(
+        self, document: DocumentNode, variable_values: Optional[Dict[str, Any]] = None
+    ) -> AsyncGenerator[Dict, None]:
+        """Subscribe using the shared connection
+
+        Args:
+            document (`graphql.DocumentNode`): Subscription document
+            variable_values (dict, optional): Variables used by the subscription
+
+        Returns:
+            AsyncIterator<dict>: Data received from the subscription
+        """
+        instrumentation = self.instrumentation
+        job_id = (variable_values or {}).get("jobId")
+        operation = _root_field(document) if instrumentation.hooks else None
+        retries = 0
+        delay = self.retry_delay
+        while True:
+            session = None
+            generator = None
+            try:
+                with instrumentation.span(
+                    "subscribe", operation=operation, job_id=job_id, retries=retries
+                ):
+                    session = await self.connect()
+                generator = session.subscribe(document, variable_values=variable_values)
+                async for result in generator:
+                    retries, delay = 0, self.retry_delay
+                    if instrumentation.hooks:
+                        instrumentation.emit(
+                            "message",
+                            operation=operation,
+                            job_id=job_id,
+                            size=len(json.dumps(result).encode()),
+                        )
+                    yield result
+                return
+            except CONNECTION_ERRORS as e:
+                if session is not None:
+                    await self._drop(session)
+                if retries >= self.max_retries:
+                    raise
+                retries += 1
+                log.warning("Subscription connection lost, reconnecting: %r", e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+            finally:
+                # Stops the subscription on the server if the consumer exits early
+                if generator is not None:
+                    await generator.aclose()
+
+    async def job_complete(self, job_id: str) -> Dict:
+        """Wait for a job to complete
+
+        Args:
+            job_id (str): Job to wait for
+
+        Returns:
+            dict: The completed job
+
+        Raises:
+            TransportClosed: If the subscription ends without a result
+        """
+        subscription = self.subscribe(JOB_COMPLETE, {"jobId": job_id})
+        try:
+            async for result in subscription:
+                return result["subscribeJobComplete"]
+        finally:
+            await subscription.aclose()
+        raise TransportClosed("Subscription closed before the job completed")
+
+    async def job_messages(self, job_id: str) -> AsyncIterator[str]:
+        """Iterate over messages published by a job
+
+        Args:
+            job_id (str): Job publishing the messages
+        """
+        async for result in self.subscribe(JOB_MESSAGES, {"jobId": job_id}):
+            yield result["subscribeJobMessages"]
+
+    async def events(self, event: str) -> AsyncIterator[Dict[str, str]]:
+        """Iterate over events published to a channel
+
+        Args:
+            event (str): Channel to subscribe to
+        """
+        async for result in self.subscribe(EVENT, {"event": event}):
+            yield result["subscribeEvent"]
@@ -0,0 +1,231 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""Templates of job requests differing only in some parameters
+
+A ``JobTemplate`` validates and converts the arguments shared by its jobs once.
+The requests it creates only hold the values of the varying parameters, every
+other argument, including the fixed parameters, is shared with the template.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from warnings import warn
+
+from gql.utils import to_camel_case
+from .client import AsyncMothrClient
+from .request import S3_URI, AsyncJobRequest
+from .schema import load_schema
+
+
+PARAMETER_TYPES = ("parameter", "input", "output")
+PARAMETER_FIELDS = ("type", "name", "value", "delimiter")
+
+
+class JobTemplate:
+    """Template of job requests sharing their service, version, queue, fixed
+    parameters and output metadata
+
+    Parameters given without a ``value`` are variables, whose values are passed
+    to ``request`` for each job::
+
+        template = JobTemplate(
+            service="echo",
+            parameters=[{"value": "--verbose"}, {"name": "-i", "type": "input"}],
+        )
+        requests = template.requests(f"s3://bucket/{i}.csv" for i in range(1000))
+
+    The arguments are validated when the template is created, and must not be
+    modified afterwards since they are shared by all requests.
+
+    Args:
+        client (AsyncMothrClient, optional): Client used by the requests,
+            defaults to the client shared by requests created without a client
+        service (str): Service being invoked by the requests
+        parameters (list<dict>, optional): Parameters to pass to the service,
+            with a ``value``, ``type``, ``name`` and ``delimiter``. The type
+            defaults to ``parameter``. Parameters without a value are variables.
+        output_metadata (dict, optional): Metadata attached to job outputs
+        kwargs: Other arguments of ``AsyncJobRequest``, e.g., ``version``,
+            ``queue`` or ``inputs``
+
+    Raises:
+        ValueError: If an argument is not valid for a job request
+    """
+
+    def __init__(self, **kwargs):
+        self.client: Optional[AsyncMothrClient] = kwargs.pop("client", None)
+        service = kwargs.get("service")
+        if not isinstance(service, str) or not service:
+            raise ValueError("A job template requires a service name")
+        fields = load_schema().get_type("JobRequest").fields  # type: ignore
+        for key in kwargs:
+            if to_camel_case(key) not in fields:
+                raise ValueError(f"Unknown job request argument {key}")
+        for key in ("version", "queue"):
+            if not isinstance(kwargs.get(key, ""), (str, type(None))):
+                raise ValueError(f"Job template {key} must be a string")
+
+        metadata = kwargs.pop("output_metadata", {})
+        for key, value in metadata.items():
+            if not isinstance(key, str) or not isinstance(value, str):
+                raise ValueError(f"Output metadata {key}: {value} must be strings")
+
+        # Fixed parameters are shared by all requests, variables are None
+        self.parameters: List[Optional[Dict[str, Any]]] = []
+        self.variables: List[Tuple[int, Dict[str, Any]]] = []
+        for parameter in kwargs.get("parameters", []):
+            parameter = self._parameter(parameter)
+            if "value" in parameter:
+                self.parameters.append(parameter)
+            else:
+                self.variables.append((len(self.parameters), parameter))
+                self.parameters.append(None)
+        # Variables whose values are checked to be S3 URIs
+        self._uri_variables = [
+            i
+            for i, (_, parameter) in enumerate(self.variables)
+            if parameter["type"] != "parameter"
+        ]
+
+        kwargs["parameters"] = self.parameters
+        kwargs["outputMetadata"] = metadata
+        self.req_args = kwargs
+        self.request_base = {
+            to_camel_case(key): value
+            for key, value in kwargs.items()
+            if key != "parameters"
+        }
+        self.request_base["outputMetadata"] = [
+            {"key": key, "value": value} for key, value in metadata.items()
+        ]
+
+    @staticmethod
+    def _parameter(parameter: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate a parameter, setting its default type"""
+        unknown = set(parameter) - set(PARAMETER_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown parameter fields {sorted(unknown)}")
+        parameter = {"type": "parameter", **parameter}
+        if parameter["type"] not in PARAMETER_TYPES:
+            raise ValueError(f"Unknown parameter type {parameter['type']}")
+        value = parameter.get("value")
+        if (
+            parameter["type"] != "parameter"
+            and value is not None
+            and not S3_URI.match(value)
+        ):
+            warn(f"{parameter['type']} parameter {value} is not an S3 URI")
+        return parameter
+
+    def request(self, *values: Any) -> TemplateJobRequest:
+        """Create a job request
+
+        Args:
+            values: Values of the variable parameters, in order
+
+        Returns:
+            TemplateJobRequest: The job request
+
+        Raises:
+            ValueError: If the number of values does not match the variables
+        """
+        if len(values) != len(self.variables):
+            raise ValueError(
+                f"Expected {len(self.variables)} parameter values, got {len(values)}"
+            )
+        for i in self._uri_variables:
+            if not S3_URI.match(values[i]):
+                parameter_type = self.variables[i][1]["type"]
+                warn(f"{parameter_type} parameter {values[i]} is not an S3 URI")
+        return TemplateJobRequest(self, values)
+
+    def requests(self, values: Iterable[Any]) -> Iterator[TemplateJobRequest]:
+        """Create job requests lazily
+
+        Args:
+            values (iterable): Values of the variable parameters of each job,
+                as a tuple, or a single value when the template has one variable
+
+        Returns:
+            iterator<TemplateJobRequest>: The job requests
+        """
+        single = len(self.variables) == 1
+        for value in values:
+            yield self.request(value) if single else self.request(*value)
+
+
+class TemplateJobRequest(AsyncJobRequest):
+    """Job request created by a ``JobTemplate``
+
+    Only the values of the variable parameters are stored, the other arguments
+    are read from the template. Parameters added to the request, e.g., the inputs
+    wired by a ``Pipeline``, follow the template's parameters. Metadata can not
+    be added.
+
+    Attributes:
+        template (JobTemplate): Template the request was created from
+        values (tuple): Values of the variable parameters
+        extra (list<dict>): Parameters added to the request, if any
+    """
+
+    __slots__ = ("template", "values", "extra")
+
+    def __init__(  # pylint: disable=super-init-not-called
+        self, template: JobTemplate, values: Tuple[Any, ...]
+    ):
+        self._client = template.client
+        self.template = template
+        self.values = values
+        self.extra: Optional[List[Dict[str, Any]]] = None
+        self.job_id = None
+        self.status = None
+
+    @property  # type: ignore
+    def req_args(self) -> Dict:  # type: ignore
+        """Arguments of the request, built from the template"""
+        req_args = dict(self.template.req_args)
+        req_args["parameters"] = self.parameters()
+        return req_args
+
+    def parameters(self) -> List[Dict[str, Any]]:
+        """Parameters of the request, fixed, variable and added"""
+        parameters = list(self.template.parameters)
+        for (index, parameter), value in zip(self.template.variables, self.values):
+            parameters[index] = dict(parameter, value=value)
+        if self.extra is not None:
+            parameters.extend(self.extra)
+        return parameters  # type: ignore
+
+    def add_parameter(
+        self, value: str, param_type: str = "parameter", name: Optional[str] = None
+    ) -> AsyncJobRequest:
+        """Add a parameter to the job request, after the template's parameters
+
+        Args:
+            value (str): Parameter value
+            param_type (str, optional): Parameter type, one of
+                (`parameter`, `input`, `output`). Default `parameter`
+            name (str, optional): Parameter name/flag (e.g., `-i`, `--input`)
+        """
+        if self.job_id is not None:
+            warn(
+                "job has already been submitted, "
+                "adding additional parameters will have no effect"
+            )
+        parameter = {"type": param_type, "value": value}
+        if name is not None:
+            parameter["name"] = name
+        if self.extra is None:
+            self.extra = []
+        self.extra.append(self.template._parameter(parameter))
+        return self
+
+    def add_output_metadata(self, metadata: Dict[str, str]) -> AsyncJobRequest:
+        raise TypeError("Metadata can not be added to a templated job request")
+
+    def job_request(self) -> Dict:
+        request = dict(self.template.request_base)
+        request["parameters"] = self.parameters()
+        return request
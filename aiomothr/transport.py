@@ -0,0 +1,63 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""HTTP transport sending the query text kept by compiled documents"""
+
+from __future__ import annotations
+from typing import Any, Dict, Optional
+
+from gql.transport.aiohttp import AIOHTTPTransport
+from gql.transport.exceptions import (
+    TransportClosed,
+    TransportProtocolError,
+    TransportServerError,
+)
+from graphql import DocumentNode, ExecutionResult
+from .documents import query_text
+
+
+class QueryTextTransport(AIOHTTPTransport):
+    """``AIOHTTPTransport`` posting the query text kept by documents parsed with
+    ``parse_query``, such as the documents compiled by ``QueryCache``, instead
+    of printing them for each request. Other documents are printed.
+    """
+
+    async def execute(  # pylint: disable=too-many-arguments
+        self,
+        document: DocumentNode,
+        variable_values: Optional[Dict[str, Any]] = None,
+        operation_name: Optional[str] = None,
+        extra_args: Optional[Dict[str, Any]] = None,
+        upload_files: bool = False,
+    ) -> ExecutionResult:
+        if upload_files:
+            return await super().execute(
+                document, variable_values, operation_name, extra_args, upload_files
+            )
+        payload: Dict[str, Any] = {"query": query_text(document)}
+        if operation_name:
+            payload["operationName"] = operation_name
+        if variable_values:
+            payload["variables"] = variable_values
+        if self.session is None:
+            raise TransportClosed("Transport is not connected")
+        async with self.session.post(
+            self.url, ssl=self.ssl, json=payload, **(extra_args or {})
+        ) as resp:
+            try:
+                result = await resp.json()
+            except Exception as e:
+                if resp.status >= 400:
+                    raise TransportServerError(
+                        f"{resp.status}, message='{resp.reason}'"
+                    ) from e
+                raise TransportProtocolError(
+                    f"Server did not return a GraphQL result: {await resp.text()}"
+                ) from e
+            if "errors" not in result and "data" not in result:
+                raise TransportProtocolError(
+                    "Server did not return a GraphQL result: "
+                    f"No data or errors in answer: {await resp.text()}"
+                )
+            return ExecutionResult(errors=result.get("errors"), data=result.get("data"))
@@ -0,0 +1,155 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""Batched writes to local storage, run in a worker thread"""
+
+from __future__ import annotations
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+
+log = logging.getLogger(__name__)
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    """Event loop running in the current thread, if any"""
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        return None
+    return loop if loop.is_running() else None
+
+
+def _resolve(written: Optional[asyncio.Future], error: Optional[BaseException]):
+    """Wake up the callers waiting for items to be written"""
+    if written is None or written.done():
+        return
+    if error is None:
+        written.set_result(None)
+    else:
+        written.set_exception(error)
+
+
+class BackgroundWriter:
+    """Writes items in batches, in a worker thread while an event loop is running
+
+    Items added while the event loop runs are collected and passed together to
+    ``write`` in a worker thread, one batch at a time, so blocking calls like
+    commits and fsyncs run once per batch and do not stall the loop. Items added
+    while a batch is written are collected into the next batch. Items added
+    without a running event loop are written immediately. ``written`` waits
+    until the items added so far are written.
+
+    Args:
+        write (callable): Function writing a list of items, in order
+        name (str): Name of the worker thread
+    """
+
+    def __init__(self, write: Callable[[List[Any]], None], name: str):
+        self.write = write
+        self.name = name
+        self._pending: List[Any] = []
+        self._batch: List[Any] = []
+        self._future: Optional[Future] = None
+        # Awaited by ``written``, for the items pending and the batch being
+        # written, only created when waited on
+        self._pending_written: Optional[asyncio.Future] = None
+        self._batch_written: Optional[asyncio.Future] = None
+        self._scheduled = False
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Held while writing, so batches are never written concurrently
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of items not written yet"""
+        return len(self._batch) + len(self._pending)
+
+    def items(self) -> List[Any]:
+        """Items not written yet, in the order they were added"""
+        return self._batch + self._pending
+
+    def add(self, item: Any):
+        """Add an item to write"""
+        self._pending.append(item)
+        loop = _running_loop()
+        if loop is None:
+            self.flush()
+        elif not self._scheduled and self._future is None:
+            # Items added in the same iteration of the loop are written together
+            self._scheduled = True
+            loop.call_soon(self._start, loop)
+
+    def _start(self, loop: asyncio.AbstractEventLoop):
+        self._scheduled = False
+        if self._future is not None or not self._pending:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(1, thread_name_prefix=self.name)
+        self._batch, self._pending = self._pending, []
+        self._batch_written, self._pending_written = self._pending_written, None
+        future = self._future = self._executor.submit(self._write, self._batch)
+        future.add_done_callback(
+            lambda _: loop.call_soon_threadsafe(self._done, future, loop)
+        )
+
+    def _done(self, future: Future, loop: asyncio.AbstractEventLoop):
+        if future is not self._future:
+            return
+        self._future = None
+        self._batch = []
+        written, self._batch_written = self._batch_written, None
+        error = future.exception()
+        if error is not None:
+            log.error("Writing %s failed: %r", self.name, error)
+        _resolve(written, error)
+        self._start(loop)
+
+    def _write(self, items: List[Any]):
+        with self._lock:
+            self.write(items)
+
+    async def written(self):
+        """Wait until the items added so far are written
+
+        Raises:
+            Exception: Raised by ``write`` for the items
+        """
+        if self._pending:
+            if self._pending_written is None:
+                self._pending_written = asyncio.get_event_loop().create_future()
+            written = self._pending_written
+        elif self._batch:
+            if self._batch_written is None:
+                self._batch_written = asyncio.get_event_loop().create_future()
+            written = self._batch_written
+        else:
+            return
+        # Shielded so a cancelled caller does not cancel the wait of others
+        await asyncio.shield(written)
+
+    def flush(self):
+        """Write all items now, waiting for the batch being written, if any"""
+        future = self._future
+        if future is not None:
+            # Errors are logged when the batch completes
+            future.exception()
+        items, self._pending = self._pending, []
+        written, self._pending_written = self._pending_written, None
+        try:
+            if items:
+                self._write(items)
+        except Exception as e:
+            _resolve(written, e)
+            raise
+        _resolve(written, None)
+
+    def close(self):
+        """Write all items and stop the worker thread"""
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,241 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""Load benchmark of the client against a stand-in MOTHR server
+
+Runs jobs at a fixed concurrency and reports throughput, submit-to-result
+latency, request and connection counts and memory use as JSON::
+
+    python -m benchmarks.load --jobs 2000 --concurrency 200 --mode push
+
+Modes:
+
+- ``poll``: ``run_job`` polling each job individually
+- ``batch``: ``run_job(batch=True)``, polling all jobs together
+- ``push``: ``run_job(push=True)``, waiting on subscriptions
+- ``mirror``: ``run_job`` with a client mirroring job statuses from job events
+- ``submit_many``: ``submit_many`` followed by batch polling
+
+The stand-in server from ``benchmarks.server`` is started in the same process
+unless ``--url`` is given.
+"""
+
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import resource
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from aiomothr import AsyncJobPool, AsyncJobRequest, AsyncMothrClient, MetricsCollector
+from benchmarks.server import start_server
+
+
+MODES = ("poll", "batch", "push", "mirror", "submit_many")
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, Optional[float]]:
+    """Percentiles, in seconds, of the submit-to-result latencies"""
+    if not latencies:
+        return {"mean": None, "p50": None, "p90": None, "p99": None, "max": None}
+    ordered = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+    return {
+        "mean": statistics.mean(ordered),
+        "p50": percentile(50),
+        "p90": percentile(90),
+        "p99": percentile(99),
+        "max": ordered[-1],
+    }
+
+
+class BenchmarkRequest(AsyncJobRequest):
+    """Job request returning the errors of its job as a status, so a job failing
+    with an error, e.g., a submission answered with a 502, does not end the run"""
+
+    __slots__ = ()
+
+    async def run_job(self, *args, **kwargs) -> Dict[str, str]:
+        try:
+            return await super().run_job(*args, **kwargs)
+        except Exception as e:  # pylint: disable=broad-except
+            return {"status": f"error:{type(e).__name__}"}
+
+
+async def run_pool(
+    client: AsyncMothrClient, args: argparse.Namespace
+) -> Dict[str, Any]:
+    """Run the jobs through ``run_job`` at the requested concurrency
+
+    Jobs ending with an error are counted by error type in the statuses, their
+    latency is not recorded.
+    """
+    started: Dict[int, float] = {}
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+
+    def make_request(i: int) -> AsyncJobRequest:
+        started[i] = time.perf_counter()
+        request = BenchmarkRequest(client=client, service="echo")
+        return request.add_parameter(value=str(i))
+
+    pool = AsyncJobPool(
+        max_jobs=args.concurrency,
+        poll_frequency=args.poll_interval,
+        return_failed=True,
+        push=args.mode == "push",
+        batch=args.mode == "batch",
+    )
+    async for i, result in pool.map(make_request, range(args.jobs)):
+        latency = time.perf_counter() - started.pop(i)
+        if not result["status"].startswith("error:"):
+            latencies.append(latency)
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    return {"latencies": latencies, "statuses": statuses}
+
+
+async def run_submit_many(
+    client: AsyncMothrClient, args: argparse.Namespace
+) -> Dict[str, Any]:
+    """Submit the jobs in batches and wait for them with the batch poller"""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+
+    async def wait(job_id: str, submitted: float):
+        job = await client.poller.wait(job_id)
+        latencies.append(time.perf_counter() - submitted)
+        statuses[job["status"]] = statuses.get(job["status"], 0) + 1
+
+    waiters = []
+    for offset in range(0, args.jobs, args.concurrency):
+        count = min(args.concurrency, args.jobs - offset)
+        requests = [
+            AsyncJobRequest(client=client, service="echo").add_parameter(value=str(i))
+            for i in range(offset, offset + count)
+        ]
+        submitted = time.perf_counter()
+        job_ids = await client.submit_many(requests, chunk_size=args.chunk_size)
+        for job_id in job_ids:
+            if isinstance(job_id, Exception):
+                statuses["submit_error"] = statuses.get("submit_error", 0) + 1
+            else:
+                waiters.append(asyncio.ensure_future(wait(job_id, submitted)))
+    await asyncio.gather(*waiters)
+    return {"latencies": latencies, "statuses": statuses}
+
+
+async def benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the benchmark described by the command line arguments"""
+    mothr, runner, url = None, None, args.url
+    if url is None:
+        mothr, runner, url = await start_server(
+            job_duration=args.job_duration,
+            job_jitter=args.job_jitter,
+            failure_rate=args.failure_rate,
+            error_rate=args.error_rate,
+            seed=args.seed,
+        )
+    metrics = MetricsCollector()
+    client = AsyncMothrClient(
+        url=url,
+        hooks=[metrics],
+        batch_interval=args.poll_interval,
+        pool_size=args.pool_size,
+        mirror_jobs=args.mode == "mirror",
+    )
+    try:
+        await client.connect()
+        start = time.perf_counter()
+        if args.mode == "submit_many":
+            outcome = await run_submit_many(client, args)
+        else:
+            outcome = await run_pool(client, args)
+        elapsed = time.perf_counter() - start
+    finally:
+        await client.close()
+        if mothr is not None:
+            await mothr.close()
+            await runner.cleanup()  # type: ignore
+
+    latencies = outcome["latencies"]
+    summary = metrics.summary()
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "elapsed": elapsed,
+        "jobs": len(latencies),
+        "statuses": outcome["statuses"],
+        "jobs_per_sec": len(latencies) / elapsed if elapsed else None,
+        "latency": latency_summary(latencies),
+        "client": {
+            "counters": summary["counters"],
+            "request_latency": summary["latency"].get("request"),
+        },
+        "server": mothr.stats() if mothr is not None else None,
+        # Kilobytes on Linux, includes the in-process server
+        "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse the command line arguments"""
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n", 1)[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--jobs", type=int, default=1000, help="Jobs to run")
+    parser.add_argument(
+        "--concurrency", type=int, default=100, help="Jobs running at once"
+    )
+    parser.add_argument("--mode", choices=MODES, default="poll")
+    parser.add_argument(
+        "--poll-interval", type=float, default=0.05, help="Seconds between polls"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=100, help="Jobs per submit_many mutation"
+    )
+    parser.add_argument("--pool-size", type=int, default=100, help="HTTP connections")
+    parser.add_argument("--job-duration", type=float, default=0.1)
+    parser.add_argument("--job-jitter", type=float, default=0.1)
+    parser.add_argument(
+        "--failure-rate", type=float, default=0.0, help="Fraction of jobs failing"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of HTTP requests answered with a 502",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--url", default=None, help="Use a running server instead")
+    parser.add_argument("--output", default=None, help="Write the results to a file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Run the benchmark and write the results"""
+    args = parse_args(argv)
+    results = asyncio.get_event_loop().run_until_complete(benchmark(args))
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    latency = results["latency"]
+    print(
+        f"{results['jobs']} jobs in {results['elapsed']:.2f}s, "
+        f"{results['jobs_per_sec']:.1f} jobs/s, "
+        f"p50 {latency['p50']:.3f}s, p99 {latency['p99']:.3f}s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""Microbenchmarks of the client's CPU hot paths
+
+Times operations that run for every client, job request or poll, and compares
+them with the baselines saved in ``benchmarks/baselines.json``::
+
+    python -m benchmarks.micro                 # compare with the baselines
+    python -m benchmarks.micro -k document     # only cases matching "document"
+    python -m benchmarks.micro --save          # record new baselines
+
+A case is reported as a regression, and the command exits with status 1, when
+it is slower than its baseline by more than the threshold, by default 50%.
+Baselines depend on the machine they were recorded on, record them again on the
+machine used for comparisons.
+"""
+
+from __future__ import annotations
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import warnings
+from typing import Callable, Dict, List, Optional
+
+from graphql import print_ast, validate
+
+from aiomothr import AsyncJobRequest, AsyncMothrClient, JobTemplate
+from aiomothr.documents import QueryCache, query_text, status_query, submit_mutation
+from aiomothr.request import RESULT_FIELDS
+from aiomothr.schema import build_schema_from_sdl, load_schema
+
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+S3_URI = "s3://my-bucket/inputs/data.csv"
+
+# Cases by name, each is a function called with no arguments
+CASES: Dict[str, Callable[[], object]] = {}
+
+
+def case(func: Callable[[], object]) -> Callable[[], object]:
+    """Register a benchmark case under the name of the function"""
+    CASES[func.__name__] = func
+    return func
+
+
+# Loaded once, cases measure their own work and not the first load of the schema
+CLIENT = AsyncMothrClient(url="http://localhost:8080/query", token="token")
+JOB = CLIENT.ds.Job
+JOB_DOCUMENT = CLIENT.documents.get("Query", "job", tuple(RESULT_FIELDS))
+TEMPLATE = JobTemplate(
+    client=CLIENT,
+    service="echo",
+    parameters=[{"value": "a"}, {"value": "b"}, {"name": "-c"}],
+    output_metadata={"key": "value"},
+)
+
+
+@case
+def schema_from_introspection():
+    """Build the schema from the precompiled ``schema.json``"""
+    return load_schema.__wrapped__()  # type: ignore
+
+
+@case
+def schema_from_sdl():
+    """Build the schema by parsing ``schema.graphql``"""
+    return build_schema_from_sdl()
+
+
+@case
+def client_init():
+    """Create a client, the schema is already loaded"""
+    return AsyncMothrClient(url="http://localhost:8080/query", token="token")
+
+
+@case
+def resolve_field():
+    """Resolve a top level field"""
+    return CLIENT.resolve_field(JOB, "status")
+
+
+@case
+def resolve_nested_field():
+    """Resolve a field nested two levels deep"""
+    return CLIENT.resolve_field(JOB, "parameters.name")
+
+
+@case
+def job_request_init():
+    """Create a job request"""
+    return AsyncJobRequest(client=CLIENT, service="echo")
+
+
+@case
+def add_parameter():
+    """Create a job request with three parameters"""
+    request = AsyncJobRequest(client=CLIENT, service="echo")
+    return request.add_parameter("a").add_parameter("b").add_parameter("c", name="-c")
+
+
+@case
+def add_input():
+    """Create a job request with an S3 input and output"""
+    request = AsyncJobRequest(client=CLIENT, service="echo")
+    return request.add_input(S3_URI).add_output(S3_URI)
+
+
+@case
+def is_s3_uri():
+    """Check a URI"""
+    return AsyncJobRequest.is_s3_uri(S3_URI)
+
+
+@case
+def job_request():
+    """Build the submitted ``JobRequest`` of a request with metadata"""
+    request = AsyncJobRequest(client=CLIENT, service="echo")
+    request.add_parameter("a").add_output_metadata({"key": "value"})
+    return request.job_request()
+
+
+@case
+def template_request():
+    """Create a job request with three parameters from a template"""
+    return TEMPLATE.request("c")
+
+
+@case
+def template_job_request():
+    """Build the submitted ``JobRequest`` of a request created from a template"""
+    return TEMPLATE.request("a").job_request()
+
+
+@case
+def document_cached():
+    """Get a compiled document from the client's cache, done by every request"""
+    return CLIENT.documents.get("Query", "job", tuple(RESULT_FIELDS))
+
+
+@case
+def document_compile():
+    """Compile and validate a document"""
+    return QueryCache().compile("Query", "job", tuple(RESULT_FIELDS))
+
+
+@case
+def document_validate():
+    """Validate a job query"""
+    return validate(CLIENT.schema, JOB_DOCUMENT)
+
+
+@case
+def document_print():
+    """Serialize a job query, done by the transport for documents not compiled
+    by the client"""
+    return print_ast(JOB_DOCUMENT)
+
+
+@case
+def document_query_text():
+    """Get the query text of a compiled job query, done by the transport for
+    every request"""
+    return query_text(JOB_DOCUMENT)
+
+
+@case
+def status_query_100():
+    """Build the batch status query of 100 jobs"""
+    return status_query.__wrapped__(100)  # type: ignore
+
+
+@case
+def submit_mutation_100():
+    """Build the batch submission mutation of 100 jobs"""
+    return submit_mutation.__wrapped__(100)  # type: ignore
+
+
+def measure(func: Callable[[], object], min_time: float, repeat: int) -> float:
+    """Time a function
+
+    The number of calls per run is grown until a run takes at least
+    ``min_time``, the fastest of ``repeat`` runs is kept. The garbage collector
+    is disabled while timing, as ``timeit`` does.
+
+    Returns:
+        float: Time, in microseconds, of a single call
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _measure(func, min_time, repeat)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _measure(func: Callable[[], object], min_time: float, repeat: int) -> float:
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / number * 1e6
+
+
+def load_baselines(path: str) -> Dict:
+    """Load saved baselines, empty if none were saved"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"threshold": 1.5, "cases": {}}
+
+
+def compare(
+    results: Dict[str, float], baselines: Dict, threshold: Optional[float] = None
+) -> List[str]:
+    """Print the results against the baselines
+
+    Args:
+        results (dict<str, float>): Time, in microseconds, of each case
+        baselines (dict): Saved baselines
+        threshold (float, optional): Ratio to the baseline above which a case is
+            a regression, defaults to the saved threshold
+
+    Returns:
+        list<str>: Names of the cases that regressed
+    """
+    if threshold is None:
+        threshold = baselines.get("threshold", 1.5)
+    saved = baselines.get("cases", {})
+    regressions = []
+    print(f"{'case':<28}{'usec':>12}{'baseline':>12}{'ratio':>8}")
+    for name, usec in results.items():
+        baseline = saved.get(name)
+        if baseline is None:
+            print(f"{name:<28}{usec:>12.2f}{'-':>12}{'-':>8}")
+            continue
+        ratio = usec / baseline
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<28}{usec:>12.2f}{baseline:>12.2f}{ratio:>8.2f}{flag}")
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse the command line arguments"""
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n", 1)[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-k", dest="match", default="", help="Only run cases containing this text"
+    )
+    parser.add_argument(
+        "--min-time", type=float, default=0.2, help="Minimum seconds per run"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of each case")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=None,
+        help="Ratio to the baseline flagged as a regression, "
+        "defaults to the saved threshold",
+    )
+    parser.add_argument("--baselines", default=BASELINES_PATH)
+    parser.add_argument(
+        "--save", action="store_true", help="Save the results as the baselines"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmarks, returns the exit status"""
+    args = parse_args(argv)
+    results: Dict[str, float] = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for name, func in CASES.items():
+            if args.match in name:
+                results[name] = measure(func, args.min_time, args.repeat)
+    baselines = load_baselines(args.baselines)
+    regressions = compare(results, baselines, args.threshold)
+    if args.save:
+        for name, usec in results.items():
+            baselines["cases"][name] = round(usec, 3)
+        if args.threshold is not None:
+            baselines["threshold"] = args.threshold
+        with open(args.baselines, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        return 0
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,378 @@
+# Copyright 2020 Resilient Solutions Inc. All rights reserved.
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file.
+
+"""Stand-in MOTHR server for benchmarks
+
+Serves the bundled ``schema.graphql`` over HTTP and graphql-ws subscriptions.
+Submitted jobs do not run anything, they complete after a configurable duration
+and fail at a configurable rate. Run on its own with::
+
+    python -m benchmarks.server --port 8080 --job-duration 0.5
+"""
+
+from __future__ import annotations
+import argparse
+import asyncio
+import inspect
+import json
+import random
+import time
+import uuid
+import weakref
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from aiohttp import WSMsgType, web
+from graphql import (
+    DocumentNode,
+    GraphQLError,
+    GraphQLSchema,
+    execute,
+    get_operation_ast,
+    parse,
+    subscribe,
+    validate,
+)
+
+from aiomothr.schema import build_schema_from_sdl
+
+
+def build_schema() -> GraphQLSchema:
+    """Build the MOTHR schema including the subscription root type"""
+    schema = build_schema_from_sdl()
+    return GraphQLSchema(
+        query=schema.query_type,
+        mutation=schema.mutation_type,
+        subscription=schema.get_type("Subscription"),  # type: ignore
+        types=list(schema.type_map.values()),
+    )
+
+
+class FakeMothr:
+    """State and resolvers of the stand-in server
+
+    Args:
+        job_duration (float, optional): Time, in seconds, jobs take to run,
+            default 0.1
+        job_jitter (float, optional): Fraction of the duration randomly added or
+            removed for each job, default 0.1
+        queue_delay (float, optional): Time, in seconds, jobs wait before
+            running, default 0
+        failure_rate (float, optional): Fraction of jobs that fail, default 0
+        error_rate (float, optional): Fraction of HTTP requests answered with a
+            502 error, default 0
+        seed (int, optional): Seed of the random generator
+    """
+
+    def __init__(self, **kwargs):
+        self.job_duration: float = kwargs.pop("job_duration", 0.1)
+        self.job_jitter: float = kwargs.pop("job_jitter", 0.1)
+        self.queue_delay: float = kwargs.pop("queue_delay", 0.0)
+        self.failure_rate: float = kwargs.pop("failure_rate", 0.0)
+        self.error_rate: float = kwargs.pop("error_rate", 0.0)
+        self.random = random.Random(kwargs.pop("seed", None))
+        self.schema = build_schema()
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.done: Dict[str, asyncio.Event] = {}
+        self.requests: Counter = Counter()
+        # Parsed and validated documents by query, so the server spends as little
+        # time as possible on each request
+        self.documents: Dict[str, DocumentNode] = {}
+        self.sockets: "weakref.WeakSet" = weakref.WeakSet()
+        self.socket_count = 0
+        self.ws_connections = 0
+        self._tasks: List[asyncio.Future] = []
+        # Queues of the subscribeJobs subscriptions
+        self._job_events: List[asyncio.Queue] = []
+
+    def stats(self) -> Dict[str, Any]:
+        """Counts of requests and connections served"""
+        return {
+            "requests": dict(self.requests),
+            "http_sockets": self.socket_count,
+            "ws_connections": self.ws_connections,
+            "jobs": len(self.records),
+        }
+
+    # Resolvers, called by graphql-core with the root value as parent
+    # pylint: disable=missing-function-docstring
+
+    def submitJob(self, _info, request: Dict) -> Dict:  # pylint: disable=invalid-name
+        job_id = str(uuid.uuid4())
+        job = {
+            "jobId": job_id,
+            "service": request["service"],
+            "version": request.get("version") or "latest",
+            "status": "submitted",
+            "parameters": request.get("parameters") or [],
+            "outputMetadata": request.get("outputMetadata") or [],
+            "result": None,
+            "error": None,
+            "messages": [],
+            "numCpu": 1,
+        }
+        self.records[job_id] = job
+        self.done[job_id] = asyncio.Event()
+        self._publish(job)
+        self._tasks.append(asyncio.ensure_future(self._run(job)))
+        return {"job": job}
+
+    def job(self, _info, jobId: str) -> Optional[Dict]:  # pylint: disable=invalid-name
+        return self.records.get(jobId)
+
+    def jobs(
+        self, _info, status: Optional[str] = None, service: Optional[str] = None
+    ) -> List[Dict]:
+        return [
+            job
+            for job in self.records.values()
+            if (status is None or job["status"] == status)
+            and (service is None or job["service"] == service)
+        ]
+
+    def cancelJob(  # pylint: disable=invalid-name
+        self, _info, jobId: str
+    ) -> Optional[Dict]:
+        job = self.records.get(jobId)
+        if job is not None and job["status"] in ("submitted", "running"):
+            job["status"] = "cancelled"
+            self.done[jobId].set()
+            self._publish(job)
+        return job
+
+    @staticmethod
+    def login(_info, username: str, password: str) -> Dict:
+        return {"token": f"token-{username}", "refresh": f"refresh-{password}"}
+
+    @staticmethod
+    def refresh(_info, token: str) -> Dict:
+        return {"token": f"token-{token}"}
+
+    @staticmethod
+    def service(_info, name: str, **_kwargs) -> List[Dict]:
+        return [{"name": name, "version": "latest", "parameters": []}]
+
+    @staticmethod
+    def services(_info, **_kwargs) -> List[Dict]:
+        return [{"name": "echo", "version": "latest", "parameters": []}]
+
+    # pylint: enable=missing-function-docstring
+
+    async def _run(self, job: Dict):
+        submitted = time.perf_counter()
+        await asyncio.sleep(self.queue_delay)
+        if job["status"] == "cancelled":
+            return
+        job["status"] = "running"
+        self._publish(job)
+        started = time.perf_counter()
+        jitter = self.random.uniform(-self.job_jitter, self.job_jitter)
+        await asyncio.sleep(max(self.job_duration * (1 + jitter), 0))
+        if job["status"] == "cancelled":
+            return
+        job["waitTime"] = started - submitted
+        job["runTime"] = time.perf_counter() - started
+        job["maxMemory"] = 1024
+        job["cpuUsage"] = int(job["runTime"] * 100)
+        if self.random.random() < self.failure_rate:
+            job["status"] = "failed"
+            job["error"] = "simulated failure"
+        else:
+            job["status"] = "complete"
+            job["result"] = " ".join(str(p.get("value")) for p in job["parameters"])
+        self.done[job["jobId"]].set()
+        self._publish(job)
+
+    def _publish(self, job: Dict):
+        event = {
+            "jobId": job["jobId"],
+            "type": job["status"],
+            "total": len(self.records),
+        }
+        for queue in self._job_events:
+            queue.put_nowait(event)
+
+    async def _jobs(self, _root, _info) -> AsyncIterator:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._job_events.append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._job_events.remove(queue)
+
+    async def _job_complete(
+        self, _root, _info, jobId: str  # pylint: disable=invalid-name
+    ) -> AsyncIterator:
+        done = self.done.get(jobId)
+        if done is not None:
+            await done.wait()
+            yield self.records[jobId]
+
+    def subscriptions(self) -> Dict[str, Any]:
+        """Subscribe functions by field name"""
+        return {
+            "subscribeJobComplete": self._job_complete,
+            "subscribeJobs": self._jobs,
+        }
+
+    # HTTP and websocket handlers
+
+    def app(self) -> web.Application:
+        """Build the aiohttp application serving ``/query``"""
+        subscription = self.schema.subscription_type
+        for name, func in self.subscriptions().items():
+            field = subscription.fields[name]  # type: ignore
+            field.subscribe = func
+            field.resolve = lambda job, _info, **_kwargs: job
+        app = web.Application()
+        app.router.add_get("/query", self.handle_websocket)
+        app.router.add_post("/query", self.handle_http)
+        return app
+
+    async def handle_http(self, request: web.Request) -> web.Response:
+        """Execute a GraphQL request"""
+        if request.transport not in self.sockets:
+            self.sockets.add(request.transport)
+            self.socket_count += 1
+        payload = await request.json()
+        try:
+            document = self.document(payload["query"])
+        except GraphQLError as e:
+            body: Dict[str, Any] = {"data": None, "errors": [e.formatted]}
+            return web.Response(text=json.dumps(body), content_type="application/json")
+        operation = get_operation_ast(document)
+        name = operation.selection_set.selections[0].name.value  # type: ignore
+        self.requests[name] += 1
+        if self.random.random() < self.error_rate:
+            self.requests["http_502"] += 1
+            raise web.HTTPBadGateway()
+        result = execute(
+            self.schema,
+            document,
+            root_value=self,
+            variable_values=payload.get("variables"),
+        )
+        if inspect.isawaitable(result):
+            result = await result  # type: ignore
+        body = {"data": result.data}  # type: ignore
+        errors = result.errors  # type: ignore
+        if errors:
+            body["errors"] = [error.formatted for error in errors]
+        return web.Response(text=json.dumps(body), content_type="application/json")
+
+    def document(self, query: str) -> DocumentNode:
+        """Parse and validate a query, raising the first validation error"""
+        document = self.documents.get(query)
+        if document is None:
+            document = parse(query)
+            errors = validate(self.schema, document)
+            if errors:
+                raise errors[0]
+            self.documents[query] = document
+        return document
+
+    async def handle_websocket(self, request: web.Request) -> web.WebSocketResponse:
+        """Serve subscriptions using the graphql-ws protocol"""
+        ws = web.WebSocketResponse(protocols=("graphql-ws",))
+        await ws.prepare(request)
+        self.ws_connections += 1
+        operations: Dict[str, asyncio.Future] = {}
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    break
+                message = json.loads(msg.data)
+                kind = message.get("type")
+                if kind == "connection_init":
+                    await ws.send_json({"type": "connection_ack"})
+                elif kind == "start":
+                    self.requests["subscribe"] += 1
+                    operations[message["id"]] = asyncio.ensure_future(
+                        self._stream(ws, message["id"], message["payload"])
+                    )
+                elif kind == "stop":
+                    task = operations.pop(message["id"], None)
+                    if task is not None:
+                        task.cancel()
+                elif kind == "connection_terminate":
+                    break
+        finally:
+            for task in operations.values():
+                task.cancel()
+        return ws
+
+    async def _stream(self, ws: web.WebSocketResponse, op_id: str, payload: Dict):
+        try:
+            document = self.document(payload["query"])
+        except GraphQLError as e:
+            await ws.send_json({"type": "error", "id": op_id, "payload": e.formatted})
+            return
+        results = await subscribe(
+            self.schema,
+            document,
+            root_value=self,
+            variable_values=payload.get("variables"),
+        )
+        if hasattr(results, "__aiter__"):
+            async for result in results:  # type: ignore
+                self.requests["message"] += 1
+                await ws.send_json(
+                    {"type": "data", "id": op_id, "payload": {"data": result.data}}
+                )
+        await ws.send_json({"type": "complete", "id": op_id})
+
+    async def close(self):
+        """Cancel jobs still running"""
+        for task in self._tasks:
+            task.cancel()
+
+
+async def start_server(
+    host: str = "127.0.0.1", port: int = 0, **kwargs
+) -> Tuple[FakeMothr, web.AppRunner, str]:
+    """Start the server in the running event loop
+
+    Args:
+        host (str, optional): Interface to listen on, default 127.0.0.1
+        port (int, optional): Port to listen on, default is any free port
+        kwargs: Arguments passed to ``FakeMothr``
+
+    Returns:
+        tuple: The server state, the runner to clean up with ``runner.cleanup()``
+            and the HTTP URL of the GraphQL endpoint
+    """
+    mothr = FakeMothr(**kwargs)
+    runner = web.AppRunner(mothr.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    sockets = site._server.sockets  # type: ignore # pylint: disable=protected-access
+    port = sockets[0].getsockname()[1]
+    return mothr, runner, f"http://{host}:{port}/query"
+
+
+def main():
+    """Run the server until interrupted"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--job-duration", type=float, default=0.1)
+    parser.add_argument("--job-jitter", type=float, default=0.1)
+    parser.add_argument("--queue-delay", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    mothr = FakeMothr(
+        job_duration=args.job_duration,
+        job_jitter=args.job_jitter,
+        queue_delay=args.queue_delay,
+        failure_rate=args.failure_rate,
+        error_rate=args.error_rate,
+    )
+    web.run_app(mothr.app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
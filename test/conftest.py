@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+
+class Tracker:
+    """Mock run_job recording the number of jobs running at once, and the
+    threads and clients they run with"""
+
+    def __init__(self, delay=0.01, failed=()):
+        self.delay = delay
+        self.failed = failed
+        self.running = {}
+        self.peak = {}
+        self.calls = 0
+        self.kwargs = None
+        self.threads = set()
+        self.clients = set()
+        self.cancelled = []
+
+    @property
+    def run_job(self):
+        def run_job(request, **kwargs):
+            self.kwargs = kwargs
+            return self(request)
+
+        return run_job
+
+    async def __call__(self, request):
+        service = request.req_args["service"]
+        value = request.req_args["parameters"][0]["value"]
+        self.calls += 1
+        self.threads.add(threading.current_thread().name)
+        self.clients.add(id(request.client))
+        self.running[service] = self.running.get(service, 0) + 1
+        total = sum(self.running.values())
+        self.peak[service] = max(self.peak.get(service, 0), self.running[service])
+        self.peak["total"] = max(self.peak.get("total", 0), total)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(value)
+            raise
+        finally:
+            self.running[service] -= 1
+        if value in self.failed:
+            raise RuntimeError(f"Job {value} failed")
+        return {"status": "complete", "result": value}
@@ -0,0 +1,30 @@
+import base64
+import json
+
+from aiomothr.auth import is_auth_error, token_expiry
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+
+
+def make_token(claims):
+    """Build an unsigned JSON web token"""
+
+    def encode(value):
+        data = base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+        return data.rstrip("=")
+
+    return f"{encode({'alg': 'HS256'})}.{encode(claims)}.signature"
+
+
+class TestAuth:
+    def test_token_expiry(self):
+        assert token_expiry(make_token({"sub": "user", "exp": 1600000000})) == 1.6e9
+        assert token_expiry(make_token({"sub": "user"})) is None
+        assert token_expiry("not-a-jwt") is None
+        assert token_expiry("a.!!!.c") is None
+        assert token_expiry(None) is None
+
+    def test_is_auth_error(self):
+        assert is_auth_error(TransportQueryError("{'message': 'token is expired'}"))
+        assert is_auth_error(TransportServerError("401, message='Unauthorized'"))
+        assert not is_auth_error(TransportQueryError("{'message': 'job not found'}"))
+        assert not is_auth_error(ValueError("unauthorized"))
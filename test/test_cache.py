@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+from aiomothr import AsyncMothrClient
+from aiomothr.cache import TTLCache
+from asynctest import CoroutineMock, patch
+
+
+class Clock:
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+class TestTTLCache:
+    @pytest.mark.asyncio
+    async def test_ttl(self):
+        clock = Clock()
+        cache = TTLCache(ttl=10, clock=clock)
+        fetch = CoroutineMock(side_effect=["a", "b"])
+        assert await cache.get("key", fetch) == "a"
+        clock.time = 9
+        assert await cache.get("key", fetch) == "a"
+        clock.time = 10
+        assert await cache.get("key", fetch) == "b"
+        assert fetch.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_lru(self):
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert "a" in cache
+        cache.set("c", 3)
+        assert "a" in cache
+        assert "b" not in cache
+        assert len(cache) == 2
+
+    @pytest.mark.asyncio
+    async def test_single_flight(self):
+        cache = TTLCache()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "value"
+
+        values = await asyncio.gather(*[cache.get("key", fetch) for _ in range(10)])
+        assert values == ["value"] * 10
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_errors_not_cached(self):
+        cache = TTLCache()
+        fetch = CoroutineMock(side_effect=[ValueError, "value"])
+        with pytest.raises(ValueError):
+            await cache.get("key", fetch)
+        assert await cache.get("key", fetch) == "value"
+
+    @pytest.mark.asyncio
+    async def test_invalidate(self):
+        cache = TTLCache()
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.invalidate("a")
+        assert "a" not in cache and "b" in cache
+        cache.invalidate()
+        assert len(cache) == 0
+
+    @pytest.mark.asyncio
+    async def test_invalidate_during_fetch(self):
+        cache = TTLCache()
+        values = iter(["old", "new"])
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def fetch():
+            value = next(values)
+            started.set()
+            await release.wait()
+            return value
+
+        stale = asyncio.ensure_future(cache.get("key", fetch))
+        await started.wait()
+        cache.invalidate()
+        fresh = asyncio.ensure_future(cache.get("key", fetch))
+        release.set()
+        assert await stale == "old"
+        assert await fresh == "new"
+        assert await cache.get("key", fetch) == "new"
+
+    @pytest.mark.asyncio
+    @patch("aiomothr.client.AsyncMothrClient.execute")
+    async def test_service_cache(self, mock_execute):
+        mock_execute.return_value = {"service": [{"name": "test"}]}
+        client = AsyncMothrClient(service_cache_ttl=60)
+        for _ in range(3):
+            await client.service("test")
+        await client.service("test", fields=["name"])
+        assert mock_execute.call_count == 2
+        client.service_cache.invalidate()
+        await client.service("test")
+        assert mock_execute.call_count == 3
+
+    @pytest.mark.asyncio
+    @patch("aiomothr.subscriptions.SubscriptionManager.events")
+    async def test_watch_service_events(self, mock_events):
+        async def events(event):
+            yield {"channel": event, "message": "updated"}
+
+        mock_events.side_effect = events
+        client = AsyncMothrClient(service_cache_ttl=60)
+        client.service_cache.set(("services", ("name",)), [])
+        await client.watch_service_events("services")
+        assert len(client.service_cache) == 0
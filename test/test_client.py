@@ -1,13 +1,19 @@
+import asyncio
+import json
+import time
+
 import pytest
-from aiomothr import AsyncMothrClient
+from aiomothr import AsyncJobRequest, AsyncMothrClient
 from asynctest import CoroutineMock, MagicMock, patch
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+from test_auth import make_token
 
 
 class TestClient:
     @pytest.mark.asyncio
-    @patch("gql.dsl.DSLSchema.mutate", new_callable=CoroutineMock)
-    async def test_login(self, mock_mutate):
-        mock_mutate.return_value = {
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_login(self, mock_execute):
+        mock_execute.return_value = {
             "login": {"token": "access-token", "refresh": "refresh-token"}
         }
         client = AsyncMothrClient()
@@ -16,9 +22,9 @@ class TestClient:
         assert refresh == "refresh-token"
 
     @pytest.mark.asyncio
-    @patch("gql.dsl.DSLSchema.mutate", new_callable=CoroutineMock)
-    async def test_refresh(self, mock_mutate):
-        mock_mutate.side_effect = [
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_refresh(self, mock_execute):
+        mock_execute.side_effect = [
             {"login": {"token": "access-token", "refresh": "refresh-token"}},
             {"refresh": {"token": "refreshed-access-token"}},
         ]
@@ -28,9 +34,9 @@ class TestClient:
         assert access == "refreshed-access-token"
 
     @pytest.mark.asyncio
-    @patch("gql.dsl.DSLSchema.query", new_callable=CoroutineMock)
-    async def test_service(self, mock_query):
-        mock_query.return_value = {
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_service(self, mock_execute):
+        mock_execute.return_value = {
             "service": [
                 {
                     "name": "test",
@@ -52,9 +58,9 @@ class TestClient:
         assert len(service) == 2
 
     @pytest.mark.asyncio
-    @patch("gql.dsl.DSLSchema.query", new_callable=CoroutineMock)
-    async def test_services(self, mock_query):
-        mock_query.return_value = {
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_services(self, mock_execute):
+        mock_execute.return_value = {
             "services": [
                 {"name": "test-service", "version": "latest"},
                 {"name": "test-service", "version": "dev"},
@@ -65,3 +71,310 @@ class TestClient:
         client = AsyncMothrClient()
         services = await client.services()
         assert len(services) == 4
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_session_reuse(self, mock_execute):
+        mock_execute.return_value = {"services": []}
+        async with AsyncMothrClient(pool_size=10, pool_size_per_host=2) as client:
+            session = await client.get_session()
+            await client.services()
+            await client.services()
+            assert await client.get_session() is session
+            connector = client.transport.session.connector
+            assert connector.limit == 10
+            assert connector.limit_per_host == 2
+        assert client.transport.session is None
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_login_updates_session_headers(self, mock_execute):
+        mock_execute.return_value = {
+            "login": {"token": "access-token", "refresh": "refresh-token"}
+        }
+        async with AsyncMothrClient() as client:
+            await client.login(username="test", password="password")
+            headers = client.transport.session.headers
+            assert headers["Authorization"] == "Bearer access-token"
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_create(self, mock_execute):
+        mock_execute.return_value = {
+            "login": {"token": "access-token", "refresh": "refresh-token"}
+        }
+        # Credentials are only used once connected, inside the running loop
+        client = AsyncMothrClient(username="test", password="password")
+        mock_execute.assert_not_called()
+        await client.close()
+        client = await AsyncMothrClient.create(username="test", password="password")
+        assert client.token == "access-token"
+        headers = client.transport.session.headers
+        assert headers["Authorization"] == "Bearer access-token"
+        await client.close()
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_login_on_first_use(self, mock_execute):
+        mock_execute.side_effect = [
+            {"login": {"token": "access-token", "refresh": "refresh-token"}},
+            {"job": {"status": "complete"}},
+            {"job": {"status": "complete"}},
+        ]
+        client = AsyncMothrClient(username="test", password="password")
+        await asyncio.gather(
+            client.execute_operation("Query", "job", ["status"], {"jobId": "1"}),
+            client.execute_operation("Query", "job", ["status"], {"jobId": "2"}),
+        )
+        calls = mock_execute.call_args_list
+        logins = [c for c in calls if "username" in c[1]["variable_values"]]
+        assert len(logins) == 1
+        assert calls[0] == logins[0]
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_token_reaches_transport(self):
+        async with AsyncMothrClient(token="access-token") as client:
+            headers = client.transport.session.headers
+            assert headers["Authorization"] == "Bearer access-token"
+            assert client.subscriptions.headers is client.headers
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_renew_on_auth_error(self, mock_execute):
+        expired = TransportQueryError("{'message': 'token is expired'}")
+
+        async def execute(document, variable_values=None):
+            operation = document.definitions[0].selection_set.selections[0]
+            if operation.name.value == "refresh":
+                await asyncio.sleep(0.01)
+                return {"refresh": {"token": "new-token"}}
+            if client.token != "new-token":
+                raise expired
+            return {"job": {"status": "complete"}}
+
+        mock_execute.side_effect = execute
+        client = AsyncMothrClient(token="old-token", refresh="refresh-token")
+        results = await asyncio.gather(
+            *[
+                client.execute_operation("Query", "job", ["status"], {"jobId": "1"})
+                for _ in range(5)
+            ]
+        )
+        assert results == [{"job": {"status": "complete"}}] * 5
+        refreshes = [
+            c
+            for c in mock_execute.call_args_list
+            if c[1]["variable_values"] == {"token": "refresh-token"}
+        ]
+        assert len(refreshes) == 1
+        assert client.headers["Authorization"] == "Bearer new-token"
+        await client.close()
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_auth_error_without_refresh(self, mock_execute):
+        mock_execute.side_effect = TransportQueryError("{'message': 'unauthorized'}")
+        client = AsyncMothrClient(token="old-token")
+        with pytest.raises(TransportQueryError):
+            await client.execute_operation("Query", "job", ["status"], {"jobId": "1"})
+        assert mock_execute.call_count == 1
+        await client.close()
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_dsl_operations(self, mock_execute):
+        expired = TransportQueryError("{'message': 'token is expired'}")
+        mock_execute.side_effect = [
+            expired,
+            {"refresh": {"token": "new-token"}},
+            {"services": []},
+            {"cancelJob": "1"},
+        ]
+        client = AsyncMothrClient(token="old-token", refresh="refresh-token")
+        field = client.ds.Query.services.select(client.ds.Service.name)
+        assert await client.query(field) == {"services": []}
+        assert client.token == "new-token"
+        field = client.ds.Mutation.cancelJob(jobId="1")
+        assert await client.mutate(field) == {"cancelJob": "1"}
+        (document,), _ = mock_execute.call_args
+        assert document.definitions[0].operation.value == "mutation"
+        await client.close()
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_renew_before_expiry(self, mock_execute):
+        mock_execute.return_value = {"refresh": {"token": "new-token"}}
+        token = make_token({"exp": time.time() + 3600})
+        client = AsyncMothrClient(token=token, refresh="refresh-token")
+        sleep = CoroutineMock()
+        with patch("aiomothr.client.asyncio.sleep", sleep):
+            await client.connect()
+            await client._renewal_timer
+        (delay,), _ = sleep.call_args
+        assert 3530 < delay <= 3540
+        assert client.token == "new-token"
+        assert client.token_expires_at is None
+        await client.close()
+
+    @pytest.mark.asyncio
+    @patch("aiomothr.client.AsyncMothrClient.execute")
+    async def test_submit_many(self, mock_execute):
+        async def execute(document, variable_values):
+            return {
+                alias: {"job": {"jobId": f"job-{alias}", "status": "submitted"}}
+                for alias in variable_values
+            }
+
+        mock_execute.side_effect = execute
+        client = AsyncMothrClient()
+        requests = [
+            AsyncJobRequest(client=client, service="test", output_metadata={"i": i})
+            for i in range(25)
+        ]
+        job_ids = await client.submit_many(requests, chunk_size=10)
+        assert mock_execute.call_count == 3
+        assert job_ids[:2] == ["job-r0", "job-r1"]
+        assert all(r.job_id == j for r, j in zip(requests, job_ids))
+        _, kwargs = mock_execute.call_args_list[0]
+        assert kwargs["variable_values"]["r3"]["outputMetadata"] == [
+            {"key": "i", "value": 3}
+        ]
+
+    @pytest.mark.asyncio
+    @patch("aiomothr.client.AsyncMothrClient.execute")
+    async def test_submit_many_partial_failure(self, mock_execute):
+        mock_execute.side_effect = TransportQueryError(
+            "unknown service",
+            errors=[{"message": "unknown service", "path": ["r1"]}],
+            data={"r0": {"job": {"jobId": "job-0", "status": "submitted"}}, "r1": None},
+        )
+        client = AsyncMothrClient()
+        requests = [
+            AsyncJobRequest(client=client, service="test"),
+            AsyncJobRequest(client=client, service="missing"),
+        ]
+        results = await client.submit_many(requests)
+        assert results[0] == "job-0"
+        assert isinstance(results[1], ValueError)
+        assert requests[1].job_id is None
+
+
+    @pytest.mark.asyncio
+    @patch("aiomothr.client.AsyncMothrClient.execute")
+    async def test_cancel_many(self, mock_execute):
+        async def execute(document, variable_values):
+            return {
+                alias: {"jobId": job_id, "status": "cancelled"}
+                if job_id != "missing"
+                else None
+                for alias, job_id in variable_values.items()
+            }
+
+        mock_execute.side_effect = execute
+        client = AsyncMothrClient()
+        job_ids = [f"job-{i}" for i in range(25)] + ["missing"]
+        results = await client.cancel_many(job_ids, chunk_size=10)
+        assert mock_execute.call_count == 3
+        assert [r["jobId"] for r in results[:25]] == job_ids[:25]
+        assert isinstance(results[25], ValueError)
+
+
+class StreamedResponse:
+    """Response returning its body in small chunks"""
+
+    def __init__(self, body, status=200):
+        self.body = json.dumps(body).encode()
+        self.status = status
+        self.reason = "Internal Server Error"
+        self.content = self
+
+    def __await__(self):
+        yield from []
+        return self
+
+    def release(self):
+        pass
+
+    async def iter_any(self):
+        for i in range(0, len(self.body), 16):
+            yield self.body[i : i + 16]
+
+
+class TestJobs:
+    @pytest.mark.asyncio
+    async def test_jobs(self):
+        jobs = [{"jobId": str(i), "status": "failed"} for i in range(50)]
+        client = AsyncMothrClient()
+        await client.connect()
+        with patch.object(
+            client.transport.session,
+            "post",
+            MagicMock(return_value=StreamedResponse({"data": {"jobs": jobs}})),
+        ) as mock_post:
+            result = [
+                job
+                async for job in client.jobs(
+                    status="failed", fields=["job_id", "status"]
+                )
+            ]
+        await client.close()
+        assert result == jobs
+        payload = mock_post.call_args[1]["json"]
+        assert payload["variables"] == {"status": "failed", "service": None}
+        assert "jobs(status: $status, service: $service) {" in payload["query"]
+
+    @pytest.mark.asyncio
+    async def test_jobs_server_error(self):
+        client = AsyncMothrClient()
+        await client.connect()
+        response = StreamedResponse({}, status=500)
+        with patch.object(
+            client.transport.session, "post", MagicMock(return_value=response)
+        ):
+            with pytest.raises(TransportServerError):
+                async for _ in client.jobs():
+                    pass
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_jobs_renew_token(self):
+        jobs = [{"jobId": "1", "status": "failed"}]
+        client = AsyncMothrClient(token="old-token", refresh="refresh-token")
+        await client.connect()
+
+        def post(*args, **kwargs):
+            if client.headers["Authorization"] == "Bearer new-token":
+                return StreamedResponse({"data": {"jobs": jobs}})
+            return StreamedResponse({"errors": [{"message": "token is expired"}]})
+
+        async def refresh_token():
+            client._set_token("new-token")
+            return "new-token"
+
+        with patch.object(client.transport.session, "post", side_effect=post):
+            with patch.object(client, "refresh_token", side_effect=refresh_token):
+                result = [job async for job in client.jobs()]
+        await client.close()
+        assert result == jobs
+
+    @pytest.mark.asyncio
+    async def test_jobs_retry(self):
+        events = []
+        client = AsyncMothrClient(hooks=[events.append])
+        await client.connect()
+        responses = [
+            StreamedResponse({}, status=503),
+            StreamedResponse({"data": {"jobs": [{"jobId": "1"}]}}),
+        ]
+        with patch.object(
+            client.transport.session, "post", MagicMock(side_effect=responses)
+        ):
+            result = [job async for job in client.jobs()]
+        await client.close()
+        assert result == [{"jobId": "1"}]
+        (event,) = [e for e in events if e.name == "request"]
+        assert event.operation == "jobs"
+        assert event.retries == 1
+        assert event.size == len(responses[1].body)
+
@@ -0,0 +1,88 @@
+import pytest
+from aiomothr import AsyncMothrClient
+from aiomothr.documents import (
+    QueryCache,
+    cancel_mutation,
+    query_text,
+    selection_set,
+    status_query,
+    submit_mutation,
+)
+from aiomothr.transport import QueryTextTransport
+from asynctest import CoroutineMock, MagicMock, patch
+from gql import gql
+from gql.transport.exceptions import TransportServerError
+from graphql import GraphQLError, build_schema, parse, print_ast, validate
+
+
+class TestDocuments:
+    def setup_method(self, _):
+        with open("aiomothr/schema.graphql") as f:
+            self.schema = build_schema(f.read())
+
+    def test_selection_set(self):
+        fields = ["name", "parameters.name", "parameters.file_type.name"]
+        assert selection_set(fields) == "{ name parameters { name fileType { name } } }"
+
+    def test_batch_documents(self):
+        assert not validate(self.schema, status_query(3))
+        assert not validate(self.schema, submit_mutation(3))
+        assert not validate(self.schema, cancel_mutation(3))
+
+    def test_query_cache(self):
+        cache = QueryCache(self.schema, maxsize=2)
+        document = cache.get("Query", "job", ("status",))
+        assert cache.get("Query", "job", ("status",)) is document
+        assert "$jobId: ID!" in print_ast(document)
+        cache.get("Query", "services", ("name",))
+        cache.get("Query", "service", ("name",))
+        assert len(cache) == 2
+        assert cache.get("Query", "job", ("status",)) is not document
+
+    def test_query_cache_invalid(self):
+        cache = QueryCache(self.schema)
+        with pytest.raises(GraphQLError):
+            cache.get("Query", "job", ("missing",))
+        with pytest.raises(GraphQLError):
+            cache.get("Query", "job", ("parameters",))
+
+    def test_client_documents(self):
+        client = AsyncMothrClient(query_cache_size=10)
+        document = client.documents.get("Mutation", "submit_job", ("job.job_id",))
+        assert "submitJob(request: $request)" in print_ast(document)
+
+    def test_query_text(self):
+        document = QueryCache(self.schema).get("Query", "job", ("status",))
+        # Kept from compilation, not printed again
+        with patch("aiomothr.documents.print_ast") as mock_print:
+            text = query_text(document)
+            assert query_text(status_query(2)) == status_query(2).query_text
+        mock_print.assert_not_called()
+        assert print_ast(parse(text)) == print_ast(document)
+        document = gql("{ services { name } }")
+        assert query_text(document) == print_ast(document)
+
+    @pytest.mark.asyncio
+    async def test_transport(self):
+        transport = QueryTextTransport(url="http://localhost:8080/query")
+        transport.session = MagicMock()
+        response = MagicMock(status=200, reason="OK")
+        response.json = CoroutineMock(return_value={"data": {"job": {"status": "x"}}})
+        transport.session.post.return_value.__aenter__ = CoroutineMock(
+            return_value=response
+        )
+        transport.session.post.return_value.__aexit__ = CoroutineMock(
+            return_value=False
+        )
+        document = QueryCache(self.schema).get("Query", "job", ("status",))
+        result = await transport.execute(document, {"jobId": "1"})
+        assert result.data == {"job": {"status": "x"}}
+        _, kwargs = transport.session.post.call_args
+        assert kwargs["json"] == {
+            "query": document.query_text,
+            "variables": {"jobId": "1"},
+        }
+        response.status, response.reason = 502, "Bad Gateway"
+        response.json.side_effect = ValueError
+        with pytest.raises(TransportServerError, match="^502, "):
+            await transport.execute(document, {"jobId": "1"})
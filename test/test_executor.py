@@ -0,0 +1,98 @@
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+import pytest
+from aiomothr import AsyncJobRequest, MothrExecutor
+from asynctest import patch
+from conftest import Tracker
+
+
+class TestMothrExecutor:
+    def setup_method(self, _):
+        self.jobs = Tracker(failed=("fail",))
+        self.patch = patch.object(AsyncJobRequest, "run_job", self.jobs.run_job)
+        self.patch.start()
+        self.executor = MothrExecutor(url="http://localhost:8080/query", max_jobs=4)
+
+    def teardown_method(self, _):
+        self.executor.shutdown(wait=False)
+        self.patch.stop()
+
+    def request(self, value):
+        return self.executor.request(service="echo").add_parameter(value)
+
+    def test_submit(self):
+        future = self.executor.submit(self.request("a"))
+        assert future.result(1)["result"] == "a"
+        assert self.jobs.threads == {"MothrExecutor"}
+        assert self.jobs.kwargs == {"batch": True}
+
+    def test_many_threads(self):
+        def run(i):
+            return self.executor.submit(self.request(str(i))).result(5)["result"]
+
+        with ThreadPoolExecutor(max_workers=8) as threads:
+            results = list(threads.map(run, range(50)))
+        assert results == [str(i) for i in range(50)]
+        # All jobs shared the executor's client
+        assert self.jobs.clients == {id(self.executor.client)}
+        assert len(self.executor.pool) == 0
+
+    def test_client_replaced(self):
+        request = AsyncJobRequest(service="echo").add_parameter("a")
+        assert self.executor.submit(request).result(1)["result"] == "a"
+        assert request.client is self.executor.client
+
+    def test_map(self):
+        requests = (self.request(str(i)) for i in range(20))
+        results = [r["result"] for r in self.executor.map(requests, timeout=5)]
+        assert results == [str(i) for i in range(20)]
+
+    def test_map_failed(self):
+        requests = [self.request(v) for v in ("a", "fail", "b")]
+        with pytest.raises(RuntimeError):
+            list(self.executor.map(requests, timeout=5))
+
+    def test_cancel(self):
+        self.jobs.delay = 10
+        future = self.executor.submit(self.request("a"))
+        while not self.jobs.threads:
+            threading.Event().wait(0.01)
+        future.cancel()
+        with pytest.raises(CancelledError):
+            future.result(1)
+        self.executor.shutdown()
+        assert self.jobs.cancelled == ["a"]
+
+    def test_run(self):
+        async def answer():
+            return threading.current_thread().name
+
+        assert self.executor.run(answer(), timeout=1) == "MothrExecutor"
+
+    def test_shutdown(self):
+        self.jobs.delay = 10
+        self.executor.submit(self.request("a"))
+        self.executor.shutdown(wait=False)
+        with pytest.raises(RuntimeError):
+            self.executor.submit(self.request("b"))
+        assert not self.executor._thread.is_alive()
+
+    def test_submit_during_shutdown(self):
+        futures = []
+
+        def submit():
+            try:
+                while True:
+                    futures.append(self.executor.submit(self.request("a")))
+            except RuntimeError:
+                pass
+
+        with ThreadPoolExecutor(max_workers=4) as threads:
+            for _ in range(4):
+                threads.submit(submit)
+            while len(futures) < 20:
+                threading.Event().wait(0.001)
+            self.executor.shutdown(wait=False)
+        # Every future accepted before the shutdown was resolved by it
+        assert all(future.done() for future in futures)
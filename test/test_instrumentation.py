@@ -0,0 +1,145 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from aiomothr import AsyncJobRequest, AsyncMothrClient
+from aiomothr.instrumentation import (
+    NULL_SPAN,
+    Event,
+    Histogram,
+    Instrumentation,
+    MetricsCollector,
+)
+from aiomothr.subscriptions import SubscriptionManager
+from asynctest import CoroutineMock, patch
+from test_subscriptions import AsyncIterator
+
+
+class TestInstrumentation:
+    def test_histogram(self):
+        histogram = Histogram(start=1, factor=2, buckets=4)
+        for value in [0.5, 1.5, 3, 3, 20]:
+            histogram.add(value)
+        assert histogram.counts == [1, 1, 2, 0, 1]
+        assert histogram.percentile(50) == 4
+        assert histogram.percentile(100) == 20
+        summary = histogram.summary()
+        assert summary["count"] == 5
+        assert summary["min"] == 0.5
+        assert summary["mean"] == pytest.approx(5.6)
+        assert Histogram().percentile(50) is None
+
+    def test_no_hooks(self):
+        instrumentation = Instrumentation()
+        assert instrumentation.span("submit") is NULL_SPAN
+        with patch("aiomothr.instrumentation.Event") as mock_event:
+            instrumentation.emit("submit")
+            mock_event.assert_not_called()
+
+    def test_failing_hook(self):
+        events = []
+
+        def broken(event):
+            raise ValueError("broken")
+
+        instrumentation = Instrumentation([broken, events.append])
+        with pytest.raises(KeyError):
+            with instrumentation.span("poll", job_id="1") as span:
+                span.set(status="running")
+                raise KeyError
+        assert len(events) == 1
+        assert events[0].status == "running"
+        assert isinstance(events[0].error, KeyError)
+        assert events[0].duration >= 0
+
+    def test_collector(self):
+        metrics = MetricsCollector()
+        metrics(Event("request", duration=0.01, retries=2))
+        metrics(Event("request", duration=0.02, error=OSError()))
+        metrics(Event("result", duration=1, data={"runTime": 4.5, "cpuUsage": 10}))
+        assert metrics.counters == {
+            "request": 2,
+            "request.retries": 2,
+            "request.error": 1,
+            "result": 1,
+        }
+        assert metrics.latency["request"].count == 2
+        assert metrics.job_stats["runTime"].max == 4.5
+        summary = metrics.summary()
+        assert summary["job_stats"]["cpuUsage"]["count"] == 1
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_run_job(self, mock_execute):
+        mock_execute.side_effect = [
+            {"submitJob": {"job": {"jobId": "test", "status": "submitted"}}},
+            {"job": {"status": "running"}},
+            {
+                "job": {
+                    "status": "complete",
+                    "waitTime": 0.5,
+                    "runTime": 2.0,
+                    "maxMemory": 1024,
+                }
+            },
+        ]
+        metrics = MetricsCollector()
+        events = []
+        client = AsyncMothrClient(hooks=[metrics, events.append])
+        request = AsyncJobRequest(client=client, service="test")
+        await request.run_job(poll_frequency=0)
+        names = [e.name for e in events if e.name != "request"]
+        assert names == ["submit", "poll", "poll", "result"]
+        # Requests end, and are emitted, before the operation sending them
+        assert events[0].name == "request"
+        assert events[0].operation == "submitJob"
+        assert events[0].retries == 0
+        result = events[-1]
+        assert result.job_id == "test"
+        assert result.status == "complete"
+        assert result.data["runTime"] == 2.0
+        # Statistics are returned with the result, without another query
+        assert metrics.counters["request"] == 3
+        assert metrics.job_stats["maxMemory"].max == 1024
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_body_sizes(self):
+        config = Instrumentation([print]).trace_config()
+        payload = SimpleNamespace(size=0)
+        context = config.trace_config_ctx(trace_request_ctx=payload)
+        (on_sent,) = config.on_request_chunk_sent
+        (on_received,) = config.on_response_chunk_received
+        await on_sent(None, context, SimpleNamespace(chunk=b"x" * 10))
+        await on_received(None, context, SimpleNamespace(chunk=b"x" * 32))
+        assert payload.size == 42
+        # Requests sent without a context are not counted
+        context = config.trace_config_ctx()
+        await on_sent(None, context, SimpleNamespace(chunk=b"x" * 10))
+
+    def test_collector_sizes(self):
+        metrics = MetricsCollector()
+        metrics(Event("request", size=100))
+        metrics(Event("request", size=300))
+        assert metrics.sizes["request"].max == 300
+        assert metrics.summary()["sizes"]["request"]["count"] == 2
+
+    @pytest.mark.asyncio
+    @patch("aiomothr.subscriptions.AsyncClientSession.subscribe")
+    @patch("aiomothr.subscriptions.WebsocketsTransport")
+    async def test_message_size(self, mock_transport, mock_subscribe):
+        mock_transport.return_value.connect = CoroutineMock()
+        mock_transport.return_value.close = CoroutineMock()
+        message = {"subscribeJobComplete": {"jobId": "a", "result": "ü"}}
+        mock_subscribe.return_value = AsyncIterator([message])
+        events = []
+        instrumentation = Instrumentation([events.append])
+        manager = SubscriptionManager(
+            "ws://localhost:8080/query", instrumentation=instrumentation
+        )
+        await manager.job_complete("a")
+        await manager.close()
+        (event,) = [e for e in events if e.name == "message"]
+        assert event.operation == "subscribeJobComplete"
+        assert event.size == len(json.dumps(message).encode())
+
@@ -0,0 +1,129 @@
+import threading
+
+import pytest
+from aiomothr import AsyncJobRequest, AsyncMothrClient, JobJournal
+from asynctest import CoroutineMock, patch
+
+
+class TestJobJournal:
+    def test_load(self, tmp_path):
+        journal = JobJournal(str(tmp_path / "jobs.jsonl"))
+        journal.submitted("a", "submitted", {"service": "test"})
+        journal.submitted("b", "submitted", {"service": "test"})
+        journal.finished("a", "complete")
+        journal.close()
+        jobs = journal.load()
+        assert list(jobs) == ["a", "b"]
+        assert jobs["a"]["status"] == "complete"
+        assert list(journal.pending()) == ["b"]
+
+    def test_truncated_line(self, tmp_path):
+        path = tmp_path / "jobs.jsonl"
+        journal = JobJournal(str(path))
+        journal.submitted("a", "submitted", {"service": "test"})
+        journal.close()
+        with open(path, "a") as f:
+            f.write('{"jobId": "b", "sta')
+        assert list(journal.load()) == ["a"]
+
+    def test_compact(self, tmp_path):
+        path = tmp_path / "jobs.jsonl"
+        journal = JobJournal(str(path))
+        for job_id in "abc":
+            journal.submitted(job_id, "submitted", {"service": "test"})
+        journal.finished("b", "failed")
+        assert list(journal.compact()) == ["a", "c"]
+        assert len(path.read_text().splitlines()) == 2
+        journal.finished("a", "complete")
+        assert list(journal.pending()) == ["c"]
+
+    def test_missing(self, tmp_path):
+        assert len(JobJournal(str(tmp_path / "jobs.jsonl")).load()) == 0
+
+    @pytest.mark.asyncio
+    async def test_background(self, tmp_path):
+        path = tmp_path / "jobs.jsonl"
+        journal = JobJournal(str(path), fsync=True)
+        threads = []
+        with patch("aiomothr.journal.os.fsync") as mock_fsync:
+            mock_fsync.side_effect = lambda _: threads.append(
+                threading.current_thread().name
+            )
+            for i in range(100):
+                journal.submitted(str(i), "submitted", {"service": "test"})
+            assert not path.exists()
+            await journal.written()
+            # Written together, with a single fsync, in the worker thread
+            assert len(threads) == 1
+            assert threads[0].startswith("aiomothr-journal")
+            assert len(path.read_text().splitlines()) == 100
+            # Pending lines are written when the journal is closed
+            journal.finished("0", "complete")
+            journal.close()
+        assert list(journal.pending())[0] == "1"
+
+
+class TestResume:
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_resume(self, mock_execute, tmp_path):
+        path = str(tmp_path / "jobs.jsonl")
+        mock_execute.return_value = {
+            "submitJob": {"job": {"jobId": "a", "status": "submitted"}}
+        }
+        client = AsyncMothrClient(url="http://localhost:8080/query", journal_path=path)
+        request = AsyncJobRequest(client=client, service="test", version="1.0")
+        await request.add_parameter("x").submit()
+        await client.close()
+
+        # After a restart, the job is waited on without submitting it again
+        client = AsyncMothrClient(url="http://localhost:8080/query", journal_path=path)
+        (resumed,) = AsyncJobRequest.resume(client)
+        assert resumed.job_id == "a"
+        assert resumed.req_args == request.req_args
+        mock_execute.reset_mock()
+        mock_execute.return_value = {"job": {"jobId": "a", "status": "complete"}}
+        result = await resumed.run_job(poll_frequency=0)
+        assert result["status"] == "complete"
+        assert mock_execute.call_count == 1
+        assert AsyncJobRequest.resume(client) == []
+        await client.close()
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_submit_written(self, mock_execute, tmp_path):
+        path = tmp_path / "jobs.jsonl"
+        mock_execute.return_value = {
+            "submitJob": {"job": {"jobId": "a", "status": "submitted"}}
+        }
+        client = AsyncMothrClient(
+            url="http://localhost:8080/query",
+            journal_path=str(path),
+            journal_fsync=True,
+        )
+        with patch("aiomothr.journal.os.fsync") as mock_fsync:
+            await AsyncJobRequest(client=client, service="test").submit()
+            # On disk when submit returns, before the journal is closed
+            assert '"jobId": "a"' in path.read_text()
+            assert mock_fsync.call_count == 1
+        await client.close()
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_submit_many(self, mock_execute, tmp_path):
+        path = str(tmp_path / "jobs.jsonl")
+        mock_execute.return_value = {
+            "r0": {"job": {"jobId": "a", "status": "submitted"}},
+            "r1": {"job": {"jobId": "b", "status": "submitted"}},
+        }
+        client = AsyncMothrClient(url="http://localhost:8080/query", journal_path=path)
+        requests = [AsyncJobRequest(client=client, service="test") for _ in range(2)]
+        await client.submit_many(requests)
+        with open(path, encoding="utf-8") as f:
+            assert len(f.readlines()) == 2
+        assert [r.job_id for r in AsyncJobRequest.resume(client)] == ["a", "b"]
+        await client.close()
+
+    def test_no_journal(self):
+        with pytest.raises(ValueError):
+            AsyncJobRequest.resume(AsyncMothrClient(url="http://localhost:8080/query"))
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+from aiomothr.jsonstream import JSONReader, iter_list_field
+from gql.transport.exceptions import TransportProtocolError, TransportQueryError
+
+
+async def chunked(data, size):
+    """Split a response into chunks of ``size`` bytes"""
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+async def collect(data, size, field="jobs"):
+    return [item async for item in iter_list_field(chunked(data, size), field)]
+
+
+class TestJSONStream:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("size", [1, 3, 7, 1024])
+    async def test_iter_list_field(self, size):
+        jobs = [
+            {"jobId": str(i), "status": "complete", "result": "ü" * i, "runTime": i}
+            for i in range(20)
+        ]
+        data = json.dumps(
+            {"extensions": {"cost": 1.5}, "data": {"jobs": jobs}}, indent=1
+        ).encode()
+        assert await collect(data, size) == jobs
+
+    @pytest.mark.asyncio
+    async def test_numbers(self):
+        data = b'{"data": {"jobs": [12345, 6.5e3, null, true]}}'
+        assert await collect(data, 2) == [12345, 6.5e3, True]
+
+    @pytest.mark.asyncio
+    async def test_empty(self):
+        assert await collect(b'{"data": {"jobs": []}}', 4) == []
+        assert await collect(b'{"data": {"jobs": null}}', 4) == []
+        assert await collect(b'{"data": null}', 4) == []
+
+    @pytest.mark.asyncio
+    async def test_errors(self):
+        data = json.dumps(
+            {"data": {"jobs": [{"jobId": "1"}]}, "errors": [{"message": "denied"}]}
+        ).encode()
+        items = []
+        with pytest.raises(TransportQueryError) as e:
+            async for item in iter_list_field(chunked(data, 5), "jobs"):
+                items.append(item)
+        assert items == [{"jobId": "1"}]
+        assert e.value.errors == [{"message": "denied"}]
+
+    @pytest.mark.asyncio
+    async def test_truncated(self):
+        with pytest.raises(TransportProtocolError):
+            await collect(b'{"data": {"jobs": [{"jobId": "1"}, {"job', 4)
+        with pytest.raises(TransportProtocolError):
+            await collect(b'{"data": {"jobs": [1 2]}}', 4)
+
+    @pytest.mark.asyncio
+    async def test_reader_discards_parsed_input(self):
+        data = b"[" + b",".join([b'"' + b"x" * 100 + b'"'] * 100) + b"]"
+        reader = JSONReader(chunked(data, 64))
+        async for _ in reader.items():
+            assert len(reader._buffer) < 300
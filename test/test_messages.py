@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+from aiomothr import AsyncMothrClient, JobMessage, MessageStream
+from gql.transport.exceptions import TransportClosed
+
+
+class FakeSubscriptions:
+    """Publishes the messages put in the queue of each job, None ends a job"""
+
+    def __init__(self):
+        self.queues = {}
+        self.closed = []
+
+    def publish(self, job_id, *messages):
+        queue = self.queues.setdefault(job_id, asyncio.Queue())
+        for message in messages:
+            queue.put_nowait(message)
+
+    async def job_messages(self, job_id):
+        queue = self.queues.setdefault(job_id, asyncio.Queue())
+        try:
+            while True:
+                message = await queue.get()
+                if message is None:
+                    return
+                if isinstance(message, Exception):
+                    raise message
+                yield message
+        finally:
+            self.closed.append(job_id)
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+class TestMessageStream:
+    def setup_method(self, _):
+        self.subscriptions = FakeSubscriptions()
+
+    @pytest.mark.asyncio
+    async def test_many_jobs(self):
+        stream = MessageStream(self.subscriptions, ["a", "b"])
+        self.subscriptions.publish("a", "a1", "a2", None)
+        self.subscriptions.publish("b", "b1", None)
+        messages = [m async for m in stream]
+        assert sorted(messages) == [("a", "a1"), ("a", "a2"), ("b", "b1")]
+        assert isinstance(messages[0], JobMessage)
+        assert stream.job_ids == []
+
+    @pytest.mark.asyncio
+    async def test_block(self):
+        stream = MessageStream(self.subscriptions, ["a"], maxsize=2, overflow="block")
+        self.subscriptions.publish("a", "1", "2", "3", "4", None)
+        await settle()
+        assert len(stream) == 2
+        assert self.subscriptions.queues["a"].qsize() == 2
+        messages = [m.message async for m in stream]
+        assert messages == ["1", "2", "3", "4"]
+        assert stream.dropped == 0
+
+    @pytest.mark.asyncio
+    async def test_drop_oldest(self):
+        stream = MessageStream(
+            self.subscriptions, ["a"], maxsize=2, overflow="drop_oldest"
+        )
+        self.subscriptions.publish("a", "1", "2", "3", "4", None)
+        await settle()
+        messages = [m.message async for m in stream]
+        assert messages == ["3", "4"]
+        assert stream.dropped == 2
+
+    @pytest.mark.asyncio
+    async def test_coalesce(self):
+        stream = MessageStream(self.subscriptions, ["a", "b"], overflow="coalesce")
+        self.subscriptions.publish("a", "a1", "a2")
+        self.subscriptions.publish("b", "b1")
+        self.subscriptions.publish("a", "a3", None)
+        self.subscriptions.publish("b", None)
+        await settle()
+        messages = [m async for m in stream]
+        assert sorted(messages) == [("a", "a3"), ("b", "b1")]
+        assert stream.coalesced == 2
+
+    @pytest.mark.asyncio
+    async def test_batches(self):
+        stream = MessageStream(self.subscriptions, ["a", "b"])
+        self.subscriptions.publish("a", "a1", "a2")
+        self.subscriptions.publish("b", "b1")
+        batches = stream.batches(interval=0.01, max_size=2)
+        assert len(await batches.__anext__()) == 2
+        assert len(await batches.__anext__()) == 1
+        self.subscriptions.publish("a", None)
+        self.subscriptions.publish("b", None)
+        assert [b async for b in batches] == []
+
+    @pytest.mark.asyncio
+    async def test_add_remove(self):
+        async with MessageStream(self.subscriptions) as stream:
+            stream.add("a")
+            self.subscriptions.publish("a", "a1")
+            assert await stream.get() == ("a", "a1")
+            stream.remove("a")
+            await settle()
+            assert self.subscriptions.closed == ["a"]
+            assert [m async for m in stream] == []
+
+    @pytest.mark.asyncio
+    async def test_error(self):
+        stream = MessageStream(self.subscriptions, ["a"])
+        self.subscriptions.publish("a", "a1", TransportClosed("closed"))
+        assert await stream.get() == ("a", "a1")
+        with pytest.raises(TransportClosed):
+            await stream.get()
+
+    @pytest.mark.asyncio
+    async def test_close(self):
+        stream = MessageStream(self.subscriptions, ["a", "b"])
+        self.subscriptions.publish("a", "a1")
+        await settle()
+        await stream.close()
+        assert sorted(self.subscriptions.closed) == ["a", "b"]
+        assert len(stream) == 0
+        assert [m async for m in stream] == []
+
+    def test_overflow_policy(self):
+        assert MessageStream(self.subscriptions).overflow == "drop_oldest"
+        with pytest.raises(ValueError):
+            MessageStream(self.subscriptions, overflow="drop_newest")
+
+    @pytest.mark.asyncio
+    async def test_client(self):
+        client = AsyncMothrClient(url="http://localhost:8080/query")
+        stream = client.messages(maxsize=10, overflow="coalesce")
+        assert stream.subscriptions is client.subscriptions
+        assert stream.maxsize == 10
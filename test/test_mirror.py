@@ -0,0 +1,187 @@
+import asyncio
+
+import pytest
+from aiomothr import AsyncJobRequest, AsyncMothrClient
+from asynctest import patch
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+class TestJobStateMirror:
+    def setup_method(self, _):
+        self.client = AsyncMothrClient(
+            url="http://localhost:8080/query", mirror_jobs=True, batch_interval=0.01
+        )
+        self.mirror = self.client.mirror
+        self.events = None
+        self.jobs = {}
+        self.queried = []
+        self.client.subscriptions.subscribe = self.subscribe
+
+    def connect(self):
+        self.client.subscriptions._session = object()
+        self.client.subscriptions.generation += 1
+
+    def disconnect(self):
+        self.client.subscriptions._session = None
+
+    def queue(self):
+        # Created lazily, in the event loop of the test
+        if self.events is None:
+            self.events = asyncio.Queue()
+        return self.events
+
+    async def subscribe(self, document, variable_values=None):
+        self.connect()
+        while True:
+            event = await self.queue().get()
+            yield {"subscribeJobs": event}
+
+    def publish(self, job_id, status):
+        self.jobs[job_id] = status
+        self.queue().put_nowait({"jobId": job_id, "type": status, "total": 1})
+
+    async def execute(self, document, variable_values=None):
+        job_ids = list(variable_values.values())
+        self.queried.append(job_ids)
+        return {
+            alias: {
+                "jobId": job_id,
+                "status": self.jobs[job_id],
+                "result": "done",
+                "error": None,
+            }
+            if job_id in self.jobs
+            else None
+            for alias, job_id in variable_values.items()
+        }
+
+    @pytest.mark.asyncio
+    async def test_local_status(self):
+        with patch.object(AsyncMothrClient, "execute", self.execute):
+            self.jobs["a"] = "submitted"
+            self.mirror.track("a", "submitted")
+            await asyncio.sleep(0.05)
+            assert self.mirror.live
+            # The reconciliation after connecting queried the tracked job
+            assert self.queried == [["a"]]
+            self.publish("a", "running")
+            await settle()
+            request = AsyncJobRequest(client=self.client, service="test")
+            request.job_id = "a"
+            assert await request.check_status() == "running"
+            assert self.queried == [["a"]]
+            await self.client.close()
+
+    @pytest.mark.asyncio
+    async def test_run_job(self):
+        with patch.object(AsyncMothrClient, "execute_operation") as mock_operation:
+            mock_operation.return_value = {
+                "submitJob": {"job": {"jobId": "a", "status": "submitted"}}
+            }
+            with patch.object(AsyncMothrClient, "execute", self.execute):
+                self.jobs["a"] = "submitted"
+                request = AsyncJobRequest(client=self.client, service="test")
+                task = asyncio.ensure_future(request.run_job())
+                await asyncio.sleep(0.05)
+                assert not task.done()
+                queries = len(self.queried)
+                self.publish("a", "running")
+                await asyncio.sleep(0.05)
+                assert len(self.queried) == queries
+                self.publish("a", "complete")
+                result = await asyncio.wait_for(task, 1)
+        assert result["status"] == "complete"
+        assert result["result"] == "done"
+        assert self.queried[-1] == ["a"]
+        assert request.status == "complete"
+        await self.client.close()
+
+    @pytest.mark.asyncio
+    async def test_reconcile_after_reconnect(self):
+        with patch.object(AsyncMothrClient, "execute", self.execute):
+            self.jobs["a"] = "submitted"
+            self.mirror.track("a", "submitted")
+            self.publish("a", "running")
+            await asyncio.sleep(0.05)
+            assert self.mirror.status("a") == "running"
+            # The job finishes while the connection is down, the event is lost
+            self.disconnect()
+            self.jobs["a"] = "complete"
+            await asyncio.sleep(0.05)
+            self.connect()
+            assert self.mirror.status("a") is None
+            await asyncio.sleep(0.05)
+            assert self.mirror.status("a") == "complete"
+            await self.client.close()
+
+    @pytest.mark.asyncio
+    async def test_poll_while_disconnected(self):
+        with patch.object(AsyncMothrClient, "execute", self.execute):
+            self.jobs["a"] = "running"
+            self.mirror.track("a", "submitted")
+            waiter = asyncio.ensure_future(self.mirror.wait("a"))
+            await asyncio.sleep(0.05)
+            assert self.mirror.status("a") == "running"
+            # The job finishes while the connection is down, the event is lost
+            self.disconnect()
+            self.jobs["a"] = "complete"
+            assert self.mirror.status("a") is None
+            job = await asyncio.wait_for(waiter, 1)
+            assert job["status"] == "complete"
+            assert self.mirror.statuses["a"] == "complete"
+            await self.client.close()
+
+    @pytest.mark.asyncio
+    async def test_wait_many(self):
+        with patch.object(AsyncMothrClient, "execute", self.execute):
+            for i in range(50):
+                self.jobs[f"j{i}"] = "submitted"
+                self.mirror.track(f"j{i}", "submitted")
+            waiters = asyncio.gather(*[self.mirror.wait(f"j{i}") for i in range(50)])
+            await asyncio.sleep(0.05)
+            queries = len(self.queried)
+            for i in range(50):
+                self.publish(f"j{i}", "complete")
+            jobs = await asyncio.wait_for(waiters, 1)
+            assert [job["jobId"] for job in jobs] == [f"j{i}" for i in range(50)]
+            # The results of jobs finishing together are fetched together
+            assert len(self.queried) - queries <= 2
+            await self.client.close()
+
+    @pytest.mark.asyncio
+    async def test_unknown_job(self):
+        with patch.object(AsyncMothrClient, "execute", self.execute):
+            with pytest.raises(ValueError):
+                await asyncio.wait_for(self.mirror.wait("missing"), 1)
+            await self.client.close()
+
+    @pytest.mark.asyncio
+    async def test_close(self):
+        async def subscribe(document, variable_values=None):
+            # Like the websocket transport, ends without raising when cancelled
+            self.connect()
+            try:
+                await self.queue().get()
+            except asyncio.CancelledError:
+                return
+            yield
+
+        self.client.subscriptions.subscribe = subscribe
+        self.mirror.start()
+        await settle()
+        assert self.mirror._listening
+        await asyncio.wait_for(self.client.close(), 1)
+        assert not self.mirror._listening
+
+    def test_max_jobs(self):
+        self.mirror.max_jobs = 2
+        for i in range(3):
+            self.mirror._update(f"j{i}", "complete")
+        assert list(self.mirror.statuses) == ["j1", "j2"]
+
+    def test_disabled(self):
+        assert AsyncMothrClient(url="http://localhost:8080/query").mirror is None
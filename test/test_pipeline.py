@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+from aiomothr import (
+    AsyncJobRequest,
+    AsyncMothrClient,
+    JobTemplate,
+    Pipeline,
+    UpstreamFailedError,
+)
+from asynctest import patch
+
+
+class FakeJobs:
+    """Mock run_job recording the order jobs start and finish in"""
+
+    def __init__(self, failed=(), delays=None):
+        self.failed = failed
+        self.delays = delays or {}
+        self.events = []
+        self.running = 0
+        self.peak = 0
+        self.kwargs = None
+
+    @property
+    def run_job(self):
+        def run_job(request, **kwargs):
+            self.kwargs = kwargs
+            return self(request)
+
+        return run_job
+
+    async def __call__(self, request):
+        service = request.req_args["service"]
+        self.events.append(("start", service))
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self.delays.get(service, 0.01))
+        finally:
+            self.running -= 1
+        self.events.append(("end", service))
+        if service in self.failed:
+            raise RuntimeError(f"Job {service} failed")
+        return {"status": "complete", "service": service}
+
+
+class TestPipeline:
+    def setup_method(self, _):
+        self.client = AsyncMothrClient(url="http://localhost:8080/query")
+
+    def request(self, service, *outputs):
+        request = AsyncJobRequest(client=self.client, service=service)
+        for output in outputs:
+            request.add_output(output)
+        return request
+
+    def diamond(self, **kwargs):
+        pipeline = Pipeline(**kwargs)
+        pipeline.add("a", self.request("a", "s3://bucket/a.csv"))
+        pipeline.add("b", self.request("b", "s3://bucket/b.csv"), inputs={"a": "-i"})
+        pipeline.add("c", self.request("c"), after=["a"])
+        pipeline.add("d", self.request("d"), inputs={"b": None, "c": None})
+        return pipeline
+
+    @pytest.mark.asyncio
+    async def test_run(self):
+        jobs = FakeJobs()
+        pipeline = self.diamond()
+        with patch.object(AsyncJobRequest, "run_job", jobs.run_job):
+            results = await pipeline.run()
+        assert {name: r["service"] for name, r in results.items()} == {
+            "a": "a",
+            "b": "b",
+            "c": "c",
+            "d": "d",
+        }
+        events = jobs.events
+        assert events.index(("start", "b")) > events.index(("end", "a"))
+        assert events.index(("start", "d")) > events.index(("end", "b"))
+        assert events.index(("start", "d")) > events.index(("end", "c"))
+        # Independent branches run in parallel
+        assert events.index(("start", "c")) < events.index(("end", "b"))
+        assert jobs.kwargs == {"push": True}
+
+    @pytest.mark.asyncio
+    async def test_wiring(self):
+        jobs = FakeJobs()
+        pipeline = self.diamond()
+        with patch.object(AsyncJobRequest, "run_job", jobs.run_job):
+            await pipeline.run()
+        inputs = pipeline.steps["b"].request.req_args["parameters"]
+        assert inputs == [
+            {"type": "output", "value": "s3://bucket/b.csv"},
+            {"type": "input", "value": "s3://bucket/a.csv", "name": "-i"},
+        ]
+        inputs = pipeline.steps["d"].request.req_args["parameters"]
+        assert inputs == [{"type": "input", "value": "s3://bucket/b.csv"}]
+
+    @pytest.mark.asyncio
+    async def test_wiring_template(self):
+        jobs = FakeJobs()
+        template = JobTemplate(
+            client=self.client, service="t", parameters=[{"name": "-n"}]
+        )
+        pipeline = Pipeline()
+        pipeline.add("a", self.request("a", "s3://bucket/a.csv"))
+        pipeline.add("t", template.request("1"), inputs={"a": "-i"})
+        with patch.object(AsyncJobRequest, "run_job", jobs.run_job):
+            results = await pipeline.run()
+        assert results["t"]["service"] == "t"
+        assert pipeline.steps["t"].request.job_request()["parameters"] == [
+            {"type": "parameter", "name": "-n", "value": "1"},
+            {"type": "input", "value": "s3://bucket/a.csv", "name": "-i"},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_concurrency(self):
+        jobs = FakeJobs()
+        pipeline = Pipeline(max_jobs=2)
+        for i in range(6):
+            pipeline.add(str(i), self.request(str(i)))
+        with patch.object(AsyncJobRequest, "run_job", jobs.run_job):
+            await pipeline.run()
+        assert jobs.peak == 2
+
+    @pytest.mark.asyncio
+    async def test_failure(self):
+        jobs = FakeJobs(failed=("b",))
+        pipeline = self.diamond()
+        with patch.object(AsyncJobRequest, "run_job", jobs.run_job):
+            results = await pipeline.run()
+        assert isinstance(results["b"], RuntimeError)
+        assert results["c"]["status"] == "complete"
+        assert isinstance(results["d"], UpstreamFailedError)
+        assert results["d"].upstream == "b"
+        assert ("start", "d") not in jobs.events
+
+    @pytest.mark.asyncio
+    async def test_fail_fast(self):
+        jobs = FakeJobs(failed=("a",), delays={"slow": 10})
+        pipeline = Pipeline(fail_fast=True)
+        pipeline.add("a", self.request("a"))
+        pipeline.add("slow", self.request("slow"))
+        with patch.object(AsyncJobRequest, "run_job", jobs.run_job):
+            results = await asyncio.wait_for(pipeline.run(), 1)
+        assert isinstance(results["a"], RuntimeError)
+        assert isinstance(results["slow"], asyncio.CancelledError)
+        assert ("end", "slow") not in jobs.events
+
+    def test_order(self):
+        assert self.diamond().order() == ["a", "b", "c", "d"]
+        pipeline = Pipeline()
+        pipeline.add("a", self.request("a"), after=["b"])
+        pipeline.add("b", self.request("b"), after=["a"])
+        with pytest.raises(ValueError):
+            pipeline.order()
+        pipeline = Pipeline().add("a", self.request("a"), after=["missing"])
+        with pytest.raises(ValueError):
+            pipeline.order()
+        with pytest.raises(ValueError):
+            pipeline.add("a", self.request("a"))
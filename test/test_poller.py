@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from aiomothr import AsyncJobRequest, AsyncMothrClient
+from aiomothr.documents import status_query
+from asynctest import patch
+from gql.transport.exceptions import TransportQueryError
+
+
+def respond(statuses):
+    """Build a mock execute answering batch status queries from a dict"""
+
+    async def execute(document, variable_values):
+        return {
+            alias: {"status": statuses[job_id]}
+            for alias, job_id in variable_values.items()
+        }
+
+    return execute
+
+
+class TestBatchStatusPoller:
+    def test_status_query(self):
+        document = status_query(2)
+        operation = document.definitions[0]
+        assert [v.variable.name.value for v in operation.variable_definitions] == [
+            "j0",
+            "j1",
+        ]
+        assert [f.alias.value for f in operation.selection_set.selections] == [
+            "j0",
+            "j1",
+        ]
+        assert status_query(2) is document
+
+    @pytest.mark.asyncio
+    @patch("aiomothr.client.AsyncMothrClient.execute")
+    async def test_wait(self, mock_execute):
+        statuses = {f"job-{i}": "complete" for i in range(250)}
+        mock_execute.side_effect = respond(statuses)
+        client = AsyncMothrClient(batch_interval=0, batch_size=100)
+        results = await asyncio.gather(*[client.poller.wait(j) for j in statuses])
+        assert [r["status"] for r in results] == ["complete"] * 250
+        # One tick split into 3 chunks
+        assert mock_execute.call_count == 3
+        assert len(client.poller) == 0
+
+    @pytest.mark.asyncio
+    @patch("aiomothr.client.AsyncMothrClient.execute")
+    async def test_wait_running(self, mock_execute):
+        statuses = {"job-1": "running", "job-2": "failed"}
+        mock_execute.side_effect = respond(statuses)
+        client = AsyncMothrClient(batch_interval=0)
+        waiter = asyncio.ensure_future(client.poller.wait("job-1"))
+        assert (await client.poller.wait("job-2"))["status"] == "failed"
+        assert not waiter.done()
+        statuses["job-1"] = "complete"
+        assert (await waiter)["status"] == "complete"
+
+    @pytest.mark.asyncio
+    @patch("aiomothr.client.AsyncMothrClient.execute")
+    async def test_wait_not_found(self, mock_execute):
+        mock_execute.return_value = {"j0": None}
+        client = AsyncMothrClient(batch_interval=0)
+        with pytest.raises(ValueError):
+            await client.poller.wait("missing")
+
+    @pytest.mark.asyncio
+    @patch("aiomothr.client.AsyncMothrClient.execute")
+    async def test_wait_partial_error(self, mock_execute):
+        mock_execute.side_effect = TransportQueryError(
+            "job not found",
+            errors=[{"message": "job not found", "path": ["j1"]}],
+            data={"j0": {"status": "complete"}, "j1": None, "j2": {"status": "failed"}},
+        )
+        client = AsyncMothrClient(batch_interval=0)
+        results = await asyncio.gather(
+            *[client.poller.wait(j) for j in ("job-1", "missing", "job-2")],
+            return_exceptions=True,
+        )
+        assert results[0]["status"] == "complete"
+        assert isinstance(results[1], ValueError)
+        assert "job not found" in str(results[1])
+        assert results[2]["status"] == "failed"
+        assert mock_execute.call_count == 1
+
+    @pytest.mark.asyncio
+    @patch("aiomothr.client.AsyncMothrClient.execute")
+    async def test_wait_query_error(self, mock_execute):
+        mock_execute.side_effect = TransportQueryError("invalid query")
+        client = AsyncMothrClient(batch_interval=0)
+        with pytest.raises(TransportQueryError):
+            await client.poller.wait("job-1")
+
+    @pytest.mark.asyncio
+    @patch("aiomothr.client.AsyncMothrClient.execute")
+    async def test_run_job_batch(self, mock_execute):
+        poll = respond({"test": "complete"})
+
+        async def execute(document, variable_values):
+            if "request" in variable_values:
+                return {"submitJob": {"job": {"jobId": "test", "status": "submitted"}}}
+            return await poll(document, variable_values)
+
+        mock_execute.side_effect = execute
+        client = AsyncMothrClient(batch_interval=0)
+        request = AsyncJobRequest(client=client, service="test")
+        result = await request.run_job(batch=True)
+        assert result["status"] == "complete"
+        # The batch query returns the result, no additional query is needed
+        assert mock_execute.call_count == 2
@@ -0,0 +1,42 @@
+from itertools import islice
+
+import pytest
+from aiomothr.polling import BackoffPolling, PollingStrategy, polling_strategy
+
+
+class TestPolling:
+    def test_fixed(self):
+        strategy = polling_strategy(0.5)
+        assert isinstance(strategy, PollingStrategy)
+        assert list(islice(strategy.intervals(), 3)) == [0.5, 0.5, 0.5]
+        assert polling_strategy(strategy) is strategy
+
+    def test_backoff(self):
+        strategy = BackoffPolling(min_interval=1, max_interval=5, jitter=0)
+        assert list(islice(strategy.intervals(), 5)) == [1, 2, 4, 5, 5]
+
+    def test_backoff_grows(self):
+        strategy = BackoffPolling(min_interval=0.01)
+        intervals = list(islice(strategy.intervals(), 12))
+        assert intervals[0] > 0
+        assert all(b > a for a, b in zip(intervals, intervals[1:]))
+        assert intervals[-1] > 10
+        with pytest.raises(ValueError):
+            BackoffPolling(min_interval=0)
+        with pytest.raises(ValueError):
+            BackoffPolling(factor=0.5)
+
+    def test_backoff_jitter(self):
+        strategy = BackoffPolling(min_interval=1, jitter=0.5)
+        for interval in islice(strategy.intervals(), 100):
+            assert interval > 0
+
+    def test_from_history(self):
+        jobs = [
+            {"runTime": 10, "waitTime": 2},
+            {"runTime": 20, "waitTime": 4},
+            {"runTime": 30, "waitTime": None},
+        ]
+        strategy = BackoffPolling.from_history(jobs, min_interval=1, jitter=0)
+        assert strategy.expected_duration == 24
+        assert list(islice(strategy.intervals(), 3)) == [24, 1, 2]
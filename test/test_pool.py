@@ -0,0 +1,90 @@
+import pytest
+from aiomothr import AsyncJobPool, AsyncJobRequest, AsyncMothrClient
+from asynctest import patch
+from conftest import Tracker
+
+
+def job(client, service="echo"):
+    def factory(value):
+        return AsyncJobRequest(client=client, service=service).add_parameter(
+            value=str(value)
+        )
+
+    return factory
+
+
+class TestAsyncJobPool:
+    @pytest.mark.asyncio
+    async def test_submit(self):
+        tracker = Tracker()
+        client = AsyncMothrClient()
+        with patch.object(AsyncJobRequest, "run_job", tracker.run_job):
+            async with AsyncJobPool(max_jobs=3) as pool:
+                futures = [await pool.submit(job(client)(i)) for i in range(10)]
+            assert [f.result()["result"] for f in futures] == [
+                str(i) for i in range(10)
+            ]
+            assert tracker.peak["total"] == 3
+            assert len(pool) == 0
+
+    @pytest.mark.asyncio
+    async def test_limits(self):
+        tracker = Tracker()
+        client = AsyncMothrClient()
+        with patch.object(AsyncJobRequest, "run_job", tracker.run_job):
+            async with AsyncJobPool(
+                max_jobs=4, service_limits={"slow": 1}, push=True
+            ) as pool:
+                for i in range(4):
+                    await pool.submit(job(client, "slow")(i))
+                    await pool.submit(job(client, "fast")(i))
+            assert tracker.peak["slow"] == 1
+            assert tracker.peak["total"] <= 4
+            assert tracker.kwargs == {"push": True}
+
+    @pytest.mark.asyncio
+    async def test_map(self):
+        tracker = Tracker(delay=0)
+        client = AsyncMothrClient()
+        consumed = []
+
+        def values():
+            for i in range(100):
+                consumed.append(i)
+                yield i
+
+        with patch.object(AsyncJobRequest, "run_job", tracker.run_job):
+            pool = AsyncJobPool(max_jobs=5)
+            results = []
+            async for value, result in pool.map(job(client), values()):
+                results.append((value, result["result"]))
+                # Inputs are only taken as jobs complete, completed jobs are
+                # yielded at the latest one tick after freeing their slot
+                assert len(consumed) - len(results) <= 10
+            assert sorted(results) == [(i, str(i)) for i in range(100)]
+            assert tracker.peak["total"] <= 5
+
+    @pytest.mark.asyncio
+    async def test_map_failed(self):
+        tracker = Tracker(failed=("3",))
+        client = AsyncMothrClient()
+        with patch.object(AsyncJobRequest, "run_job", tracker.run_job):
+            pool = AsyncJobPool(max_jobs=2)
+            with pytest.raises(RuntimeError):
+                async for _ in pool.map(job(client), range(10)):
+                    pass
+            await pool.join()
+            assert len(pool) == 0
+            assert tracker.calls < 10
+
+    @pytest.mark.asyncio
+    async def test_as_completed(self):
+        tracker = Tracker(failed=("1",))
+        client = AsyncMothrClient()
+        with patch.object(AsyncJobRequest, "run_job", tracker.run_job):
+            pool = AsyncJobPool()
+            for i in range(3):
+                await pool.submit(job(client)(i))
+            completed = [f async for f in pool.as_completed()]
+            assert len(completed) == 3
+            assert sum(f.exception() is not None for f in completed) == 1
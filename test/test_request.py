@@ -1,6 +1,9 @@
+import asyncio
+
 import pytest
-from aiomothr import AsyncJobRequest, AsyncMothrClient
-from asynctest import CoroutineMock, MagicMock, patch
+from aiomothr import AsyncJobRequest, AsyncMothrClient, BackoffPolling, RetryPolicy
+from asynctest import CoroutineMock, patch
+from graphql import print_ast
 
 
 # For mocking async loops
@@ -17,8 +20,22 @@ class AsyncIterator:
         except StopIteration:
             raise StopAsyncIteration
 
+    async def aclose(self):
+        pass
+
 
 class TestJob:
+    @pytest.mark.asyncio
+    async def test_default_client(self):
+        with patch("aiomothr.client.AsyncMothrClient.__init__") as mock_init:
+            requests = [AsyncJobRequest(service="test") for _ in range(100)]
+            mock_init.assert_not_called()
+        clients = {id(r.client) for r in requests}
+        assert len(clients) == 1
+        client = AsyncMothrClient()
+        request = AsyncJobRequest(client=client, service="test")
+        assert request.client is client
+
     def setup_method(self, _):
         self.submit_response = {
             "submitJob": {"job": {"jobId": "test", "status": "submitted"}}
@@ -31,64 +48,197 @@ class TestJob:
         ]
 
     @pytest.mark.asyncio
-    @patch("gql.dsl.DSLSchema.mutate", new_callable=CoroutineMock)
-    @patch("gql.dsl.DSLSchema.query", new_callable=CoroutineMock)
-    async def test_run_job(self, mock_query, mock_mutate):
-        mock_mutate.return_value = self.submit_response
-        mock_query.side_effect = self.query_response
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_run_job(self, mock_execute):
+        mock_execute.side_effect = [self.submit_response] + self.query_response
         request = AsyncJobRequest(service="test")
         result = await request.run_job()
         assert result
 
     @pytest.mark.asyncio
-    @patch("gql.dsl.DSLSchema.mutate", new_callable=CoroutineMock)
-    @patch("gql.dsl.DSLSchema.query", new_callable=CoroutineMock)
-    async def test_run_job_fail(self, mock_query, mock_mutate):
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_run_job_fail(self, mock_execute):
         for i in [-1, -2]:
             self.query_response[i]["job"]["status"] = "failed"
             self.query_response[i]["job"]["error"] = "failed"
-        mock_mutate.return_value = self.submit_response
-        mock_query.side_effect = self.query_response
+        mock_execute.side_effect = [self.submit_response] + self.query_response
         request = AsyncJobRequest(service="test")
         with pytest.raises(RuntimeError):
             result = await request.run_job()
 
     @pytest.mark.asyncio
-    @patch("gql.dsl.DSLSchema.mutate", new_callable=CoroutineMock)
-    @patch("gql.dsl.DSLSchema.query", new_callable=CoroutineMock)
-    async def test_run_job_fail_return_failed(self, mock_query, mock_mutate):
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_run_job_fail_return_failed(self, mock_execute):
         for i in [-1, -2]:
             self.query_response[i]["job"]["status"] = "failed"
             self.query_response[i]["job"]["error"] = "failed"
-        mock_mutate.return_value = self.submit_response
-        mock_query.side_effect = self.query_response
+        mock_execute.side_effect = [self.submit_response] + self.query_response
         request = AsyncJobRequest(service="test")
         result = await request.run_job(return_failed=True)
         assert result["error"] == "failed"
 
     @pytest.mark.asyncio
-    @patch("aiomothr.request.Client")
-    async def test_subscribe(self, mock_client):
-        mock_client.return_value.__aenter__.return_value.subscribe.return_value = (
-            AsyncIterator([{"subscribeJobComplete": {"jobId": "test"}}])
+    @patch("aiomothr.subscriptions.SubscriptionManager.connect")
+    async def test_subscribe(self, mock_connect):
+        mock_connect.return_value.subscribe.return_value = AsyncIterator(
+            [{"subscribeJobComplete": {"jobId": "test"}}]
         )
         request = AsyncJobRequest(service="test")
         result = await request.subscribe()
         assert result["jobId"] == "test"
 
     @pytest.mark.asyncio
-    @patch("aiomothr.request.Client")
-    async def test_subscribe_messages(self, mock_client):
-        mock_client.return_value.__aenter__.return_value.subscribe.return_value = (
-            AsyncIterator(
-                [{"subscribeJobMessages": f"message {i+1}"} for i in range(10)]
-            )
+    @patch("aiomothr.subscriptions.SubscriptionManager.connect")
+    async def test_subscribe_messages(self, mock_connect):
+        mock_connect.return_value.subscribe.return_value = AsyncIterator(
+            [{"subscribeJobMessages": f"message {i+1}"} for i in range(10)]
         )
         request = AsyncJobRequest(service="test")
         messages = [m async for m in request.subscribe_messages()]
         assert len(messages) == 10
         assert messages[0] == "message 1"
 
+    @pytest.mark.asyncio
+    @patch("aiomothr.subscriptions.SubscriptionManager.connect")
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_run_job_push(self, mock_execute, mock_connect):
+        mock_execute.return_value = self.submit_response
+        mock_connect.return_value.subscribe.return_value = AsyncIterator(
+            [{"subscribeJobComplete": {"jobId": "test", "status": "complete"}}]
+        )
+        request = AsyncJobRequest(service="test")
+        result = await request.run_job(push=True)
+        assert result["status"] == "complete"
+        # Only the job submission is sent over HTTP
+        assert mock_execute.call_count == 1
+
+    @pytest.mark.asyncio
+    @patch("aiomothr.subscriptions.SubscriptionManager.connect")
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_run_job_push_no_busy_wait(self, mock_execute, mock_connect):
+        running = {"job": {"jobId": "test", "status": "running"}}
+        mock_execute.side_effect = [self.submit_response, running]
+
+        async def delayed(*args, **kwargs):
+            await asyncio.sleep(0.2)
+            yield {"subscribeJobComplete": {"jobId": "test", "status": "complete"}}
+
+        mock_connect.return_value.subscribe.side_effect = delayed
+        timeouts = []
+        wait = asyncio.wait
+
+        async def record_wait(futures, timeout=None):
+            # run_job waits on the job without a timeout
+            if timeout is not None:
+                timeouts.append(timeout)
+            return await wait(futures, timeout=timeout)
+
+        request = AsyncJobRequest(service="test")
+        with patch("aiomothr.request.asyncio.wait", record_wait):
+            result = await request.run_job(push=True, poll_frequency=0)
+        assert result["status"] == "complete"
+        assert min(timeouts) > 0
+        assert len(timeouts) < 10
+
+    @pytest.mark.asyncio
+    @patch("aiomothr.subscriptions.SubscriptionManager.connect")
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_run_job_push_fallback(self, mock_execute, mock_connect):
+        mock_execute.side_effect = [self.submit_response] + self.query_response
+        mock_connect.side_effect = OSError
+        client = AsyncMothrClient(subscription_retries=0)
+        request = AsyncJobRequest(client=client, service="test")
+        result = await request.run_job(push=True)
+        assert result["status"] == "complete"
+        assert mock_execute.call_count == 4
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_run_job_single_terminal_fetch(self, mock_execute):
+        mock_execute.side_effect = [self.submit_response] + self.query_response
+        request = AsyncJobRequest(service="test")
+        strategy = BackoffPolling(min_interval=0.001)
+        result = await request.run_job(poll_frequency=strategy)
+        assert result["status"] == "complete"
+        assert request.status == "complete"
+        # submitted, running, complete; the final poll returns the result
+        assert mock_execute.call_count == 4
+
+    async def execute_running(self, document, variable_values=None):
+        # Jobs run until they are cancelled
+        if "request" in variable_values:
+            return self.submit_response
+        if "cancelJob" in print_ast(document):
+            self.cancelled.append(variable_values["jobId"])
+            return {"cancelJob": {"jobId": "test", "status": "cancelled"}}
+        return {"job": {"jobId": "test", "status": "running"}}
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_cancel(self, mock_execute):
+        self.cancelled = []
+        mock_execute.side_effect = self.execute_running
+        request = AsyncJobRequest(service="test")
+        with pytest.raises(ValueError):
+            await request.cancel()
+        await request.submit()
+        job = await request.cancel()
+        assert job["status"] == "cancelled"
+        assert request.status == "cancelled"
+        assert self.cancelled == ["test"]
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_run_job_timeout(self, mock_execute):
+        self.cancelled = []
+        mock_execute.side_effect = self.execute_running
+        request = AsyncJobRequest(service="test")
+        with pytest.raises(asyncio.TimeoutError):
+            await request.run_job(poll_frequency=0.01, timeout=0.05)
+        assert self.cancelled == ["test"]
+        assert request.status == "cancelled"
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_run_job_task_cancelled(self, mock_execute):
+        self.cancelled = []
+        mock_execute.side_effect = self.execute_running
+        request = AsyncJobRequest(service="test")
+        task = asyncio.ensure_future(request.run_job(poll_frequency=0.01))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert self.cancelled == ["test"]
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_run_job_poll_timeout(self, mock_execute):
+        self.cancelled = []
+
+        async def execute(document, variable_values=None):
+            if "jobId" in variable_values and "cancelJob" not in print_ast(document):
+                raise asyncio.TimeoutError()
+            return await self.execute_running(document, variable_values)
+
+        mock_execute.side_effect = execute
+        client = AsyncMothrClient(retry_policy=RetryPolicy(retries=0))
+        request = AsyncJobRequest(client=client, service="test")
+        with pytest.raises(asyncio.TimeoutError):
+            await request.run_job(poll_frequency=0.01, timeout=10)
+        assert self.cancelled == []
+        assert request.status != "cancelled"
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_run_job_keep_abandoned(self, mock_execute):
+        self.cancelled = []
+        mock_execute.side_effect = self.execute_running
+        request = AsyncJobRequest(service="test")
+        with pytest.raises(asyncio.TimeoutError):
+            await request.run_job(timeout=0.05, cancel_abandoned=False)
+        assert self.cancelled == []
+
     def test_method_chaining(self):
         request = AsyncJobRequest(service="test")
         request.add_input(value="s3://bucket/test.txt").add_output(
@@ -0,0 +1,194 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiomothr import (
+    AsyncMothrClient,
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryBudget,
+    RetryPolicy,
+)
+from aiomothr.resilience import is_transient_error
+from asynctest import CoroutineMock, patch
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+from graphql import ExecutionResult
+
+
+def fast_policy(**kwargs):
+    kwargs.setdefault("min_delay", 0)
+    kwargs.setdefault("max_delay", 0)
+    return RetryPolicy(**kwargs)
+
+
+def connect_error():
+    return aiohttp.ClientConnectorError(None, OSError(111, "Connection refused"))
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResilience:
+    def test_is_transient_error(self):
+        assert is_transient_error(TransportServerError("502, message='Bad Gateway'"))
+        assert is_transient_error(asyncio.TimeoutError())
+        assert is_transient_error(aiohttp.ServerDisconnectedError())
+        assert not is_transient_error(TransportServerError("400, message='Bad'"))
+        assert not is_transient_error(TransportQueryError("job not found"))
+        assert not is_transient_error(CircuitOpenError())
+
+    @pytest.mark.asyncio
+    async def test_retry_query(self):
+        func = CoroutineMock(side_effect=[OSError, asyncio.TimeoutError, "ok"])
+        assert await fast_policy().run(func) == "ok"
+        assert func.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_retries_exhausted(self):
+        func = CoroutineMock(side_effect=OSError)
+        with pytest.raises(OSError):
+            await fast_policy(retries=2).run(func)
+        assert func.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_not_retried(self):
+        func = CoroutineMock(side_effect=TransportQueryError("job not found"))
+        with pytest.raises(TransportQueryError):
+            await fast_policy().run(func)
+        assert func.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_mutation(self):
+        # Only retried if the request could not have reached MOTHR
+        func = CoroutineMock(side_effect=[connect_error(), "ok"])
+        assert await fast_policy().run(func, idempotent=False) == "ok"
+        func = CoroutineMock(side_effect=[aiohttp.ServerDisconnectedError(), "ok"])
+        with pytest.raises(aiohttp.ServerDisconnectedError):
+            await fast_policy().run(func, idempotent=False)
+        assert func.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_timeout(self):
+        calls = []
+
+        async def func():
+            calls.append(1)
+            if len(calls) == 1:
+                await asyncio.sleep(1)
+            return "ok"
+
+        assert await fast_policy(timeout=0.01).run(func) == "ok"
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_cancel_completed(self):
+        func = CoroutineMock(return_value="ok")
+        run = asyncio.ensure_future(fast_policy().run(func))
+        # Cancelled after the request completed but before run resumed
+        await asyncio.sleep(0)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+
+    @pytest.mark.asyncio
+    async def test_deadline(self):
+        async def func():
+            await asyncio.sleep(1)
+
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        with pytest.raises(asyncio.TimeoutError):
+            await fast_policy(timeout=None, deadline=0.05, retries=100).run(func)
+        assert loop.time() - start < 0.5
+
+    @pytest.mark.asyncio
+    async def test_budget(self):
+        budget = RetryBudget(ratio=0.5, reserve=1)
+        func = CoroutineMock(side_effect=OSError)
+        with pytest.raises(OSError):
+            await fast_policy().run(func, budget=budget)
+        # The reserve and the deposit of the request only cover one retry
+        assert func.call_count == 2
+        assert budget.tokens == 0.5
+
+    def test_circuit_breaker(self):
+        clock = Clock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+        breaker.check()
+        breaker.record_failure()
+        breaker.check()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.check()
+        clock.now = 10
+        breaker.check()
+        # Only one trial request while half open
+        with pytest.raises(CircuitOpenError):
+            breaker.check()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        clock.now = 20
+        breaker.check()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        breaker.check()
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_client(self, mock_execute):
+        mock_execute.side_effect = [
+            TransportServerError("502, message='Bad Gateway'"),
+            {"job": {"status": "running"}},
+            aiohttp.ServerDisconnectedError(),
+        ]
+        client = AsyncMothrClient(
+            retry_policy=fast_policy(),
+            operation_policies={"submitJob": fast_policy(retries=0)},
+        )
+        resp = await client.execute_operation(
+            "Query", "job", ["status"], {"jobId": "1"}
+        )
+        assert resp == {"job": {"status": "running"}}
+        with pytest.raises(aiohttp.ServerDisconnectedError):
+            await client.execute_operation(
+                "Mutation", "submitJob", ["job.job_id"], {"request": {}}
+            )
+        assert mock_execute.call_count == 3
+        await client.close()
+
+    @pytest.mark.asyncio
+    @patch("aiomothr.transport.QueryTextTransport.execute", new_callable=CoroutineMock)
+    async def test_client_timeout(self, mock_execute):
+        mock_execute.return_value = ExecutionResult(data={"job": {"status": "running"}})
+        timeouts = []
+        wait_for = asyncio.wait_for
+
+        def record(aw, timeout):
+            timeouts.append(timeout)
+            return wait_for(aw, timeout)
+
+        client = AsyncMothrClient(retry_policy=fast_policy(timeout=30))
+        with patch("gql.client.asyncio.wait_for", record):
+            await client.execute_operation("Query", "job", ["status"], {"jobId": "1"})
+        # Not cut short by gql's default timeout of 10 seconds
+        assert timeouts == [None]
+        await client.close()
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_client_circuit_open(self, mock_execute):
+        mock_execute.side_effect = OSError
+        client = AsyncMothrClient(
+            retry_policy=fast_policy(retries=10),
+            circuit_breaker=CircuitBreaker(failure_threshold=3),
+        )
+        with pytest.raises(CircuitOpenError):
+            await client.execute_operation("Query", "job", ["status"], {"jobId": "1"})
+        assert mock_execute.call_count == 3
+        await client.close()
@@ -0,0 +1,159 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from aiomothr import AsyncJobRequest, AsyncMothrClient, ResultStore, SQLiteResultBackend
+from asynctest import patch
+
+
+class TestResultStore:
+    def test_lru(self):
+        store = ResultStore(maxsize=2)
+        store.set("a", ["status"], {"status": "complete"})
+        store.set("b", ["status"], {"status": "failed"})
+        assert store.get("a", ["status"]) == {"status": "complete"}
+        store.set("c", ["status"], {"status": "complete"})
+        assert store.get("b", ["status"]) is None
+        assert store.get("a", ["status"]) is not None
+        assert (store.hits, store.misses) == (2, 1)
+
+    def test_field_set(self):
+        store = ResultStore()
+        store.set("a", ["status", "result"], {"status": "complete", "result": "x"})
+        assert store.get("a", ["result", "status"])["result"] == "x"
+        assert store.get("a", ["status"]) is None
+
+    def test_max_bytes(self):
+        store = ResultStore(max_bytes=100)
+        store.set("a", ["result"], {"result": "x" * 60})
+        store.set("b", ["result"], {"result": "y" * 60})
+        assert len(store) == 1
+        assert store.get("b", ["result"]) is not None
+        assert store.size < 100
+
+    def test_invalidate(self):
+        store = ResultStore()
+        store.set("a", ["status"], {"status": "complete"})
+        store.set("a", ["result"], {"result": "x"})
+        store.set("b", ["status"], {"status": "complete"})
+        store.invalidate("a")
+        assert len(store) == 1
+        store.invalidate()
+        assert len(store) == 0
+
+    def test_sqlite(self, tmp_path):
+        path = str(tmp_path / "results.db")
+        store = ResultStore(maxsize=1, backend=SQLiteResultBackend(path))
+        store.set("a", ["status"], {"status": "complete"})
+        store.set("b", ["status"], {"status": "failed"})
+        # Evicted from memory, read back from the database
+        assert store.get("a", ["status"]) == {"status": "complete"}
+        store.close()
+        restarted = ResultStore(backend=SQLiteResultBackend(path))
+        assert restarted.get("b", ["status"]) == {"status": "failed"}
+        restarted.invalidate("b")
+        assert restarted.get("b", ["status"]) is None
+        restarted.close()
+
+    @pytest.mark.asyncio
+    async def test_sqlite_background(self, tmp_path):
+        backend = SQLiteResultBackend(str(tmp_path / "results.db"))
+        batches = []
+        write = backend._writer.write
+
+        def record(operations):
+            batches.append((threading.current_thread().name, len(operations)))
+            write(operations)
+
+        backend._writer.write = record
+        for i in range(100):
+            backend.set(str(i), "status", '{"status": "complete"}')
+        backend.delete("0")
+        assert batches == []
+        # Records not written yet are read from the pending writes
+        assert backend.get("1", "status") == '{"status": "complete"}'
+        assert backend.get("0", "status") is None
+        while len(backend._writer):
+            await asyncio.sleep(0.01)
+        # Written together, with a single commit, in the worker thread
+        ((thread, count),) = batches
+        assert thread.startswith("aiomothr-results")
+        assert count == 101
+        assert backend.get("99", "status") == '{"status": "complete"}'
+        assert backend.get("0", "status") is None
+        backend.close()
+
+
+    def test_sqlite_read_during_write(self, tmp_path):
+        backend = SQLiteResultBackend(str(tmp_path / "results.db"))
+        backend.set("a", "status", '{"status": "complete"}')
+        db = backend._connection()
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        executor = ThreadPoolExecutor(1)
+        # A batch being written by the worker thread, not committed yet
+        backend._lock.acquire()
+        try:
+            db.execute("INSERT INTO results VALUES ('b', 'status', 'failed')")
+            read = executor.submit(backend.get, "a", "status")
+            assert read.result(timeout=5) == '{"status": "complete"}'
+            assert backend.get("b", "status") is None
+        finally:
+            db.commit()
+            backend._lock.release()
+            executor.shutdown()
+        assert backend.get("b", "status") == "failed"
+        backend.close()
+
+
+class TestClientResults:
+    def setup_method(self, _):
+        self.client = AsyncMothrClient(
+            url="http://localhost:8080/query", result_cache_size=10
+        )
+        self.request = AsyncJobRequest(client=self.client, service="test")
+        self.request.job_id = "a"
+
+    @pytest.mark.asyncio
+    @patch.object(AsyncMothrClient, "execute_operation")
+    async def test_result(self, mock_operation):
+        mock_operation.return_value = {"job": {"jobId": "a", "status": "running"}}
+        assert (await self.request.result())["status"] == "running"
+        mock_operation.return_value = {"job": {"jobId": "a", "status": "complete"}}
+        assert (await self.request.result())["status"] == "complete"
+        assert (await self.request.result())["status"] == "complete"
+        assert mock_operation.call_count == 2
+
+    @pytest.mark.asyncio
+    @patch.object(AsyncMothrClient, "execute_operation")
+    async def test_fields_without_status(self, mock_operation):
+        mock_operation.return_value = {"job": {"result": "x"}}
+        await self.request.query_job(["result"])
+        self.request.status = "complete"
+        await self.request.query_job(["result"])
+        await self.request.query_job(["result"])
+        assert mock_operation.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_restart(self, tmp_path):
+        path = str(tmp_path / "results.db")
+        client = AsyncMothrClient(
+            url="http://localhost:8080/query", result_store_path=path
+        )
+        with patch.object(AsyncMothrClient, "execute_operation") as mock_operation:
+            mock_operation.return_value = {"job": {"jobId": "a", "status": "failed"}}
+            request = AsyncJobRequest(client=client, service="test")
+            request.job_id = "a"
+            await request.result()
+            await client.close()
+            client = AsyncMothrClient(
+                url="http://localhost:8080/query", result_store_path=path
+            )
+            request = AsyncJobRequest(client=client, service="test")
+            request.job_id = "a"
+            assert (await request.result())["status"] == "failed"
+            assert mock_operation.call_count == 1
+        await client.close()
+
+    def test_disabled(self):
+        assert AsyncMothrClient(url="http://localhost:8080/query").results is None
@@ -0,0 +1,17 @@
+from aiomothr import AsyncMothrClient
+from aiomothr.schema import build_schema_from_sdl, dsl_schema, load_schema
+from graphql import print_schema
+
+
+class TestSchema:
+    def test_precompiled_schema(self):
+        # schema.json must be regenerated with `python -m aiomothr.schema`
+        # whenever schema.graphql changes
+        assert print_schema(load_schema()) == print_schema(build_schema_from_sdl())
+
+    def test_shared_schema(self):
+        client_a = AsyncMothrClient()
+        client_b = AsyncMothrClient()
+        assert client_a.schema is client_b.schema is load_schema()
+        assert client_a.ds is client_b.ds is dsl_schema()
+        assert client_a.field_map["Job"]["parameters"]._type.name == "Parameter"
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+from aiomothr.subscriptions import SubscriptionManager
+from asynctest import CoroutineMock, MagicMock, patch
+from gql.transport.exceptions import TransportClosed
+
+
+class AsyncIterator:
+    def __init__(self, seq):
+        self.iter = iter(seq)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            item = next(self.iter)
+        except StopIteration:
+            raise StopAsyncIteration
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    async def aclose(self):
+        pass
+
+
+class TestSubscriptionManager:
+    @pytest.mark.asyncio
+    @patch("aiomothr.subscriptions.AsyncClientSession.subscribe")
+    @patch("aiomothr.subscriptions.WebsocketsTransport")
+    async def test_multiplexed(self, mock_transport, mock_subscribe):
+        mock_transport.return_value.connect = CoroutineMock()
+        mock_transport.return_value.close = CoroutineMock()
+        mock_subscribe.side_effect = lambda document, variable_values: AsyncIterator(
+            [{"subscribeJobComplete": {"jobId": variable_values["jobId"]}}]
+        )
+        manager = SubscriptionManager("ws://localhost:8080/query")
+        jobs = await asyncio.gather(
+            *[manager.job_complete(f"job-{i}") for i in range(10)]
+        )
+        assert [job["jobId"] for job in jobs] == [f"job-{i}" for i in range(10)]
+        assert mock_transport.call_count == 1
+        assert manager.generation == 1
+        await manager.close()
+        assert not manager.connected
+
+    @pytest.mark.asyncio
+    @patch("aiomothr.subscriptions.AsyncClientSession.subscribe")
+    @patch("aiomothr.subscriptions.WebsocketsTransport")
+    async def test_resubscribe(self, mock_transport, mock_subscribe):
+        mock_transport.return_value.connect = CoroutineMock()
+        mock_transport.return_value.close = CoroutineMock()
+        mock_subscribe.side_effect = [
+            AsyncIterator(["message 1", TransportClosed("closed")]),
+            AsyncIterator(["message 2"]),
+        ]
+        manager = SubscriptionManager("ws://localhost:8080/query", retry_delay=0)
+        messages = [m async for m in manager.subscribe(MagicMock())]
+        assert messages == ["message 1", "message 2"]
+        assert manager.generation == 2
+
+    @pytest.mark.asyncio
+    @patch("aiomothr.subscriptions.WebsocketsTransport")
+    async def test_max_retries(self, mock_transport):
+        mock_transport.return_value.connect = CoroutineMock(side_effect=OSError)
+        manager = SubscriptionManager(
+            "ws://localhost:8080/query", max_retries=2, retry_delay=0
+        )
+        with pytest.raises(OSError):
+            await manager.job_complete("test")
+        assert mock_transport.return_value.connect.call_count == 3
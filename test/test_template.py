@@ -0,0 +1,116 @@
+import warnings
+
+import pytest
+from aiomothr import AsyncJobPool, AsyncJobRequest, AsyncMothrClient, JobTemplate
+from asynctest import CoroutineMock, patch
+
+
+class TestJobTemplate:
+    def setup_method(self, _):
+        self.client = AsyncMothrClient(url="http://localhost:8080/query")
+        self.template = JobTemplate(
+            client=self.client,
+            service="test",
+            version="1.0",
+            queue="fast",
+            parameters=[
+                {"value": "--verbose"},
+                {"name": "-i", "type": "input"},
+                {"name": "-n"},
+            ],
+            output_metadata={"project": "sweep"},
+        )
+
+    def test_job_request(self):
+        template_request = self.template.request("s3://bucket/a.csv", "1")
+        request = AsyncJobRequest(
+            service="test", version="1.0", queue="fast"
+        ).add_parameter("--verbose")
+        request.add_input("s3://bucket/a.csv", name="-i")
+        request.add_parameter("1", name="-n")
+        request.add_output_metadata({"project": "sweep"})
+        assert template_request.job_request() == request.job_request()
+        assert template_request.req_args == request.req_args
+        assert template_request.client is self.client
+
+    def test_shared_arguments(self):
+        a, b = self.template.requests(
+            [("s3://bucket/a.csv", "1"), ("s3://bucket/b.csv", "2")]
+        )
+        assert a.parameters()[0] is b.parameters()[0]
+        assert a.parameters()[2] == {"type": "parameter", "name": "-n", "value": "1"}
+        assert b.parameters()[2]["value"] == "2"
+        assert a.job_request()["outputMetadata"] is b.job_request()["outputMetadata"]
+        assert not hasattr(a, "__dict__")
+
+    def test_single_variable(self):
+        template = JobTemplate(service="test", parameters=[{"name": "-n"}])
+        requests = list(template.requests(str(i) for i in range(3)))
+        assert [r.parameters()[0]["value"] for r in requests] == ["0", "1", "2"]
+
+    def test_validation(self):
+        with pytest.raises(ValueError):
+            JobTemplate(parameters=[])
+        with pytest.raises(ValueError):
+            JobTemplate(service="test", priority=1)
+        with pytest.raises(ValueError):
+            JobTemplate(service="test", version=1)
+        with pytest.raises(ValueError):
+            JobTemplate(service="test", parameters=[{"type": "flag"}])
+        with pytest.raises(ValueError):
+            JobTemplate(service="test", parameters=[{"value": "a", "flag": True}])
+        with pytest.raises(ValueError):
+            JobTemplate(service="test", output_metadata={"count": 1})
+        with pytest.warns(UserWarning):
+            JobTemplate(service="test", parameters=[{"type": "input", "value": "a"}])
+        with pytest.raises(ValueError):
+            self.template.request("s3://bucket/a.csv")
+
+    def test_uri_warning(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            self.template.request("s3://bucket/a.csv", "not-a-uri")
+        with pytest.warns(UserWarning):
+            self.template.request("not-a-uri", "1")
+
+    def test_add_parameter(self):
+        request = self.template.request("s3://bucket/a.csv", "1")
+        other = self.template.request("s3://bucket/b.csv", "2")
+        request.add_input("s3://bucket/c.csv", name="-j")
+        assert request.job_request()["parameters"][3:] == [
+            {"type": "input", "value": "s3://bucket/c.csv", "name": "-j"}
+        ]
+        assert len(request.req_args["parameters"]) == 4
+        assert len(other.job_request()["parameters"]) == 3
+        assert len(self.template.parameters) == 3
+        with pytest.warns(UserWarning):
+            request.add_output("not-a-uri")
+        with pytest.raises(TypeError):
+            request.add_output_metadata({"foo": "bar"})
+
+    @pytest.mark.asyncio
+    @patch("gql.client.AsyncClientSession.execute", new_callable=CoroutineMock)
+    async def test_run_in_pool(self, mock_execute):
+        submitted = []
+
+        async def execute(document, variable_values=None):
+            if "request" in variable_values:
+                submitted.append(variable_values["request"])
+                job_id = str(len(submitted))
+                return {"submitJob": {"job": {"jobId": job_id, "status": "submitted"}}}
+            return {"job": {"jobId": variable_values["jobId"], "status": "complete"}}
+
+        mock_execute.side_effect = execute
+        values = [(f"s3://bucket/{i}.csv", str(i)) for i in range(5)]
+        pool = AsyncJobPool(max_jobs=2, queue_limits={"fast": 1}, poll_frequency=0)
+        results = [
+            r async for r in pool.map(lambda v: self.template.request(*v), values)
+        ]
+        assert len(results) == 5
+        assert sorted(r["parameters"][2]["value"] for r in submitted) == [
+            "0",
+            "1",
+            "2",
+            "3",
+            "4",
+        ]